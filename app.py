@@ -5,22 +5,110 @@ Factory para crear la aplicación Flask.
 Configura la aplicación y registra los blueprints.
 """
 
-from flask import Flask
+import time
 
+from flask import Flask, g, request
+
+from config import MAX_TAMANO_PETICION
 from routes import main_bp
+from services import (
+    DescompresionPeticiones,
+    PrintService,
+    PeticionImpresion,
+    almacen_trabajos,
+    cola_impresion,
+    limpiador_temporales
+)
+from services.metricas import PETICIONES_HTTP, DURACION_HTTP
 
 
-def crear_app():
+def crear_app(reencolar_recuperados=True, iniciar_servicios=True):
     """
     Factory function para crear y configurar la aplicación Flask.
     
+    Args:
+        reencolar_recuperados (bool): Reencolar enseguida los trabajos que quedaron sin
+            terminar; la aplicación ASGI lo hace después, cuando la cola ya usa su bucle
+        iniciar_servicios (bool): Abrir el almacén, recuperar trabajos, barrer temporales y
+            arrancar los hilos; el proceso vigilante del recargador de Flask no debe hacerlo
+    
     Returns:
         Flask: Instancia configurada de la aplicación
     """
     # Crear instancia de Flask
     app = Flask(__name__)
     
+    # Rechazar con 413 los cuerpos más grandes que el máximo permitido
+    app.config['MAX_CONTENT_LENGTH'] = MAX_TAMANO_PETICION
+    
+    # Validar los archivos subidos mientras llegan y escribirlos directo en su archivo temporal
+    app.request_class = PeticionImpresion
+    
+    # Descomprimir mientras llegan los cuerpos enviados con Content-Encoding (gzip, zstd)
+    app.wsgi_app = DescompresionPeticiones(app.wsgi_app)
+    
     # Registrar blueprints
     app.register_blueprint(main_bp)
     
+    # Medir cantidad y duración de las peticiones para /metrics
+    registrar_metricas_http(app)
+    
+    if not iniciar_servicios:
+        return app
+    
+    # Abrir el almacén de trabajos y cargar los que quedaron sin terminar en la ejecución anterior
+    almacen_trabajos.iniciar()
+    almacen_trabajos.purgar()
+    rutas_recuperadas = cola_impresion.recuperar()
+    
+    # Borrar los temporales que haya dejado una ejecución anterior (salvo los de trabajos
+    # recuperados) y arrancar el hilo de limpieza
+    limpiador_temporales.barrer_huerfanos(excluir=rutas_recuperadas)
+    limpiador_temporales.iniciar()
+    
+    # Arrancar los trabajadores de la cola de impresión
+    cola_impresion.iniciar()
+    if reencolar_recuperados:
+        cola_impresion.reencolar_recuperados()
+    
+    # Mantener actualizado el inventario de impresoras en segundo plano
+    PrintService.obtener_inventario().iniciar_refresco()
+    
     return app
+
+
+def crear_app_asgi():
+    """
+    Factory alternativa que expone las mismas rutas como aplicación ASGI.
+    Los cuerpos se reciben con asyncio y los trabajos de impresión se atienden
+    con tareas de asyncio en el bucle del servidor.
+    
+    Returns:
+        AplicacionAsgi: Aplicación para un servidor ASGI (ej. uvicorn)
+    """
+    # Importación diferida: el modo WSGI no necesita el adaptador
+    from servidor_asgi import AplicacionAsgi
+    
+    return AplicacionAsgi(crear_app(reencolar_recuperados=False))
+
+
+def registrar_metricas_http(app):
+    """
+    Registra los hooks que cuentan las peticiones y miden su duración por ruta.
+    
+    Args:
+        app (Flask): Aplicación a instrumentar
+    """
+    @app.before_request
+    def iniciar_medicion():
+        g.inicio_peticion = time.perf_counter()
+    
+    @app.after_request
+    def registrar_medicion(respuesta):
+        # Se usa la regla de la ruta (ej. '/jobs/<job_id>') para no crear una serie por valor
+        ruta = request.url_rule.rule if request.url_rule is not None else "sin_ruta"
+        PETICIONES_HTTP.inc(ruta=ruta, metodo=request.method, codigo=respuesta.status_code)
+        inicio = g.get('inicio_peticion')
+        if inicio is not None:
+            DURACION_HTTP.observar(time.perf_counter() - inicio, ruta=ruta)
+        return respuesta
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ayudante de impresión de reemplazo para benchmarks.
+Imita al PowerShell que imprime TXT sin necesitar Windows ni una impresora:
+
+    python ayudante_impresion.py <archivo>      -> un trabajo por proceso (como subprocess.run)
+    python ayudante_impresion.py --persistente  -> protocolo JSON por líneas de ProcesoPersistente
+"""
+
+import json
+import sys
+import time
+
+# Tiempo simulado de envío al spooler, independiente del arranque del proceso
+DEMORA_IMPRESION = 0.002
+
+
+def imprimir(ruta_archivo):
+    """Lee el archivo completo y simula el envío a la impresora."""
+    with open(ruta_archivo, "rb") as f:
+        f.read()
+    time.sleep(DEMORA_IMPRESION)
+
+
+def bucle_persistente():
+    """Atiende peticiones JSON por stdin hasta que se cierre la entrada."""
+    for linea in sys.stdin:
+        peticion = json.loads(linea)
+        try:
+            imprimir(peticion["archivo"])
+            respuesta = {"id": peticion["id"], "ok": True}
+        except Exception as e:
+            respuesta = {"id": peticion["id"], "ok": False, "error": str(e)}
+        sys.stdout.write(json.dumps(respuesta) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--persistente":
+        bucle_persistente()
+    else:
+        imprimir(sys.argv[1])
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark del almacén de trabajos (SQLite WAL): throughput de altas y cambios
+de estado con varios trabajadores escribiendo a la vez, confirmando cada
+escritura por separado vs. agrupándolas en transacciones, y latencia de una
+consulta en bloque ("fallidos de una impresora en la última hora").
+
+    python benchmarks/bench_almacen.py --trabajos 20000 --trabajadores 8
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MAX_LOTE_ALMACEN  # noqa: E402
+from services.almacen_trabajos import AlmacenTrabajos  # noqa: E402
+from services.cola_impresion import (  # noqa: E402
+    TrabajoImpresion, ESTADO_IMPRIMIENDO, ESTADO_COMPLETADO, ESTADO_FALLIDO
+)
+
+IMPRESORAS = ["Zebra 1", "Zebra 2", "Zebra 3", "Laser"]
+
+
+def medir_escrituras(nombre, max_lote, trabajos, trabajadores):
+    """
+    Cada trabajador da de alta sus trabajos y los pasa por 'imprimiendo' y
+    'completado' (o 'fallido'): tres escrituras por trabajo.
+
+    Returns:
+        AlmacenTrabajos: Almacén con los trabajos escritos, para las consultas
+    """
+    directorio = tempfile.mkdtemp(prefix="almacen_bench_")
+    almacen = AlmacenTrabajos(os.path.join(directorio, "trabajos.db"), max_lote=max_lote)
+    almacen.iniciar()
+    por_trabajador = trabajos // trabajadores
+
+    def trabajador(indice):
+        for numero in range(por_trabajador):
+            trabajo = TrabajoImpresion(f"etiqueta_{indice}_{numero}.pdf", ".pdf", f"pedido_{numero}.pdf")
+            trabajo.impresora = IMPRESORAS[numero % len(IMPRESORAS)]
+            almacen.guardar(trabajo)
+            trabajo.estado = ESTADO_IMPRIMIENDO
+            trabajo.iniciado = time.time()
+            almacen.guardar(trabajo)
+            trabajo.estado = ESTADO_FALLIDO if numero % 20 == 0 else ESTADO_COMPLETADO
+            trabajo.metodo = "sumatra"
+            trabajo.finalizado = time.time()
+            almacen.guardar(trabajo)
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=trabajador, args=(indice,)) for indice in range(trabajadores)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    encolado = time.perf_counter() - inicio
+    almacen.vaciar()
+    total = time.perf_counter() - inicio
+
+    estadisticas = almacen.estadisticas()
+    escrituras = estadisticas["escrituras"]
+    print(f"{nombre:<22} {escrituras / total:9.0f} escrituras/s   "
+          f"{estadisticas['transacciones']:6d} transacciones   "
+          f"guardar() {encolado / escrituras * 1e6:6.1f} µs/llamada")
+    return almacen
+
+
+def medir_consultas(almacen, repeticiones=200):
+    """Latencia de las consultas en bloque que usan los índices."""
+    hace_una_hora = time.time() - 3600
+    consultas = {
+        "fallidos de una impresora (1 h)": lambda: almacen.consultar("fallido", "Zebra 1", desde=hace_una_hora),
+        "completados de una impresora": lambda: almacen.consultar("completado", "Laser"),
+        "últimos 100": lambda: almacen.consultar(limite=100),
+    }
+    for nombre, consulta in consultas.items():
+        duraciones = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = consulta()
+            duraciones.append((time.perf_counter() - inicio) * 1000)
+        print(f"  {nombre:<34} p50 {statistics.median(duraciones):6.2f} ms   ({len(resultado)} trabajos)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trabajos", type=int, default=10000, help="Trabajos por variante")
+    parser.add_argument("--trabajadores", type=int, default=8, help="Hilos escribiendo en paralelo")
+    args = parser.parse_args()
+
+    medir_escrituras("una por transacción", 1, args.trabajos, args.trabajadores)
+    almacen = medir_escrituras(f"agrupadas (hasta {MAX_LOTE_ALMACEN})", MAX_LOTE_ALMACEN,
+                               args.trabajos, args.trabajadores)
+    print("Consultas en bloque:")
+    medir_consultas(almacen)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de arranque: tiempo de importar la aplicación (`import app`) y tiempo
+desde que se lanza `python middleware.py` hasta el primer 200 de GET /.
+Cada medición usa un intérprete nuevo, así que incluye la carga real de módulos.
+Con --max-importacion / --max-arranque termina con código 1 si la mediana supera
+el límite (milisegundos), para detectar regresiones en CI.
+
+    python benchmarks/bench_arranque.py --repeticiones 5 --max-importacion 1500 --max-arranque 5000
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODIGO_IMPORTACION = (
+    "import sys, time\n"
+    f"sys.path.insert(0, {RAIZ!r})\n"
+    "inicio = time.perf_counter()\n"
+    "import app\n"
+    "print(time.perf_counter() - inicio)\n"
+)
+
+
+def entorno_aislado():
+    """
+    Returns:
+        dict: Variables de entorno con un almacén temporal, para no tocar el trabajos.db real
+    """
+    entorno = dict(os.environ)
+    entorno["MIDDLEWARE_ALMACEN"] = os.path.join(tempfile.mkdtemp(prefix="almacen_bench_"), "trabajos.db")
+    entorno.setdefault("PYTHONIOENCODING", "utf-8")
+    return entorno
+
+
+def puerto_libre():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def medir_importacion():
+    """
+    Returns:
+        float: Milisegundos que tarda `import app` en un intérprete nuevo
+    """
+    salida = subprocess.run(
+        [sys.executable, "-c", CODIGO_IMPORTACION],
+        env=entorno_aislado(), capture_output=True, text=True, check=True
+    ).stdout
+    return float(salida.strip().splitlines()[-1]) * 1000
+
+
+def medir_primer_200(timeout):
+    """
+    Lanza el servidor y consulta GET / hasta obtener un 200.
+
+    Returns:
+        float: Milisegundos desde el lanzamiento del proceso hasta el primer 200
+    """
+    puerto = puerto_libre()
+    entorno = entorno_aislado()
+    entorno["MIDDLEWARE_IP"] = "127.0.0.1"
+    entorno["MIDDLEWARE_PUERTO"] = str(puerto)
+
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, "middleware.py")],
+        env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - inicio < timeout:
+            if proceso.poll() is not None:
+                raise Exception(f"El servidor terminó al iniciar:\n{proceso.stderr.read().decode(errors='replace')}")
+            try:
+                conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=1)
+                conexion.request("GET", "/")
+                if conexion.getresponse().status == 200:
+                    return (time.perf_counter() - inicio) * 1000
+            except OSError:
+                pass
+            finally:
+                conexion.close()
+            time.sleep(0.005)
+        raise Exception(f"El servidor no respondió 200 en {timeout} segundos.")
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(10)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def resumir(nombre, duraciones, limite):
+    """
+    Returns:
+        bool: True si la mediana no supera el límite (o no hay límite)
+    """
+    mediana = statistics.median(duraciones)
+    excedido = limite is not None and mediana > limite
+    print(f"{nombre:<32} mediana {mediana:7.0f} ms   mín {min(duraciones):7.0f} ms   máx {max(duraciones):7.0f} ms"
+          + (f"   (límite {limite:.0f} ms{': EXCEDIDO' if excedido else ''})" if limite is not None else ""))
+    return not excedido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5, help="Mediciones de cada tipo")
+    parser.add_argument("--timeout", type=float, default=30, help="Segundos máximos esperando el primer 200")
+    parser.add_argument("--max-importacion", type=float, help="Mediana máxima de 'import app' (ms)")
+    parser.add_argument("--max-arranque", type=float, help="Mediana máxima hasta el primer 200 (ms)")
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]} en {sys.platform}, backend "
+          f"'{os.environ.get('MIDDLEWARE_BACKEND', 'windows')}'")
+    importacion = [medir_importacion() for _ in range(args.repeticiones)]
+    arranque = [medir_primer_200(args.timeout) for _ in range(args.repeticiones)]
+
+    correcto = resumir("import app", importacion, args.max_importacion)
+    correcto = resumir("lanzamiento hasta el primer 200", arranque, args.max_arranque) and correcto
+    if not correcto:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+
+"""
+Prueba de carga de los endpoints principales: POST /print-pdf, GET /printers y
+POST /impresora/predeterminada. Cada endpoint recibe las peticiones indicadas
+desde varios clientes en paralelo y se informa peticiones/s y latencias p50,
+p95 y p99. El backend simulado reemplaza a la impresora, por lo que corre en
+cualquier sistema.
+
+Modos:
+  --modo proceso   la aplicación Flask en el mismo proceso (sin red)
+  --modo http      un servidor Waitress lanzado aparte, por HTTP real
+  --url URL        un servidor ya en marcha (no cambia su configuración)
+
+Los PDF enviados se generan con los tamaños de --tamanos (KB:porcentaje) y con
+contenido distinto para que no se traten como reintentos; con --archivo se envía
+siempre ese archivo. Con --guardar se escriben los resultados en JSON y con
+--comparar se comparan con los de una ejecución anterior: termina con código 1
+si algún endpoint empeora más que --tolerancia por ciento.
+
+    python benchmarks/bench_carga.py --modo http --peticiones 500 --concurrencia 8 --guardar base.json
+    python benchmarks/bench_carga.py --modo http --peticiones 500 --concurrencia 8 --comparar base.json
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MIDDLEWARE_BACKEND", "simulado")
+os.environ.setdefault("MIDDLEWARE_ALMACEN", os.path.join(tempfile.mkdtemp(prefix="almacen_bench_"), "trabajos.db"))
+
+from bench_arranque import RAIZ, entorno_aislado, puerto_libre  # noqa: E402
+from config import SIMULADO_IMPRESORAS  # noqa: E402
+
+ENDPOINTS = ("print-pdf", "printers", "predeterminada")
+
+# Servidor lanzado en modo http: backend simulado con la latencia pedida y sin límites de
+# admisión, porque todas las peticiones llegan desde la misma IP
+CODIGO_SERVIDOR = (
+    "import sys\n"
+    f"sys.path.insert(0, {RAIZ!r})\n"
+    "from app import crear_app\n"
+    "from servidor import servir_produccion\n"
+    "from services import PrintService, BackendSimulado, control_admision\n"
+    "PrintService.usar_backend(BackendSimulado(latencia_base=float(sys.argv[2]), latencia_por_pagina=float(sys.argv[3])))\n"
+    "control_admision.max_en_vuelo = control_admision.max_por_cliente = float('inf')\n"
+    "servir_produccion(crear_app(), '127.0.0.1', int(sys.argv[1]))\n"
+)
+
+# PDF mínimo de una página; el comentario final le da el tamaño y lo hace único
+PDF_BASE = (
+    b"%PDF-1.4\n"
+    b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+    b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n"
+    b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 288 432] >> endobj\n"
+    b"trailer << /Root 1 0 R >>\n"
+)
+
+
+def interpretar_tamanos(texto):
+    """
+    Args:
+        texto (str): Tamaños en KB con su porcentaje, ej. '5:70,60:25,500:5'
+
+    Returns:
+        list: Pares (KB, peso)
+    """
+    tamanos = []
+    for parte in texto.split(","):
+        kb, _, peso = parte.partition(":")
+        tamanos.append((int(kb), float(peso or 1)))
+    return tamanos
+
+
+def generar_pdf(numero, tamano_kb):
+    relleno = max(tamano_kb * 1024 - len(PDF_BASE), 0)
+    marca = f"% {numero} {uuid.uuid4().hex}\n".encode()
+    return PDF_BASE + marca + b"%" + b"x" * relleno + b"\n%%EOF\n"
+
+
+def cuerpo_multipart(nombre_archivo, contenido):
+    """
+    Returns:
+        tuple: (cuerpo, content_type) de un formulario con el campo 'file'
+    """
+    limite = uuid.uuid4().hex
+    cuerpo = (
+        f"--{limite}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{nombre_archivo}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode("utf-8") + contenido + f"\r\n--{limite}--\r\n".encode()
+    return cuerpo, f"multipart/form-data; boundary={limite}"
+
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    indice = max(int(round(p / 100 * len(ordenados) + 0.5)) - 1, 0)
+    return ordenados[min(indice, len(ordenados) - 1)]
+
+
+class ClienteProceso:
+    """Envía las peticiones a la aplicación Flask del mismo proceso."""
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def enviar(self, metodo, ruta, cuerpo=None, content_type=None):
+        respuesta = self._cliente.open(ruta, method=metodo, data=cuerpo, content_type=content_type)
+        return respuesta.status_code
+
+    def cerrar(self):
+        pass
+
+
+class ClienteHttp:
+    """Envía las peticiones por una conexión HTTP persistente (keep-alive)."""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self._host, self._puerto = partes.hostname, partes.port or 80
+        self._conexion = None
+
+    def enviar(self, metodo, ruta, cuerpo=None, content_type=None):
+        if self._conexion is None:
+            self._conexion = http.client.HTTPConnection(self._host, self._puerto, timeout=60)
+        cabeceras = {"Content-Type": content_type} if content_type else {}
+        try:
+            self._conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = self._conexion.getresponse()
+            respuesta.read()
+        except (OSError, http.client.HTTPException):
+            # El servidor cerró la conexión: se cuenta como error y se abre otra
+            self.cerrar()
+            return 0
+        if respuesta.getheader("Connection", "").lower() == "close":
+            self.cerrar()
+        return respuesta.status
+
+    def cerrar(self):
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+
+
+def preparar_peticiones(endpoint, cantidad, tamanos, archivo, impresora):
+    """
+    Genera las peticiones antes de medir, para no contar la creación de los archivos.
+
+    Returns:
+        list: Tuplas (metodo, ruta, cuerpo, content_type)
+    """
+    if endpoint == "printers":
+        return [("GET", "/printers", None, None)] * cantidad
+    if endpoint == "predeterminada":
+        cuerpo = json.dumps({"nombre": impresora}).encode("utf-8")
+        return [("POST", "/impresora/predeterminada", cuerpo, "application/json")] * cantidad
+
+    if archivo:
+        with open(archivo, "rb") as f:
+            contenido = f.read()
+        cuerpo, content_type = cuerpo_multipart(os.path.basename(archivo), contenido)
+        return [("POST", "/print-pdf", cuerpo, content_type)] * cantidad
+
+    aleatorio = random.Random(0)
+    kbs = aleatorio.choices([kb for kb, _ in tamanos], weights=[peso for _, peso in tamanos], k=cantidad)
+    peticiones = []
+    for numero, kb in enumerate(kbs):
+        cuerpo, content_type = cuerpo_multipart(f"etiqueta_{numero}.pdf", generar_pdf(numero, kb))
+        peticiones.append(("POST", "/print-pdf", cuerpo, content_type))
+    return peticiones
+
+
+def medir(endpoint, crear_cliente, peticiones, concurrencia):
+    """
+    Envía las peticiones desde varios hilos.
+
+    Returns:
+        dict: Throughput, latencias (ms) y códigos de respuesta del endpoint
+    """
+    latencias, codigos = [], {}
+    candado = threading.Lock()
+    siguiente = iter(peticiones)
+
+    def trabajador():
+        cliente = crear_cliente()
+        try:
+            while True:
+                with candado:
+                    peticion = next(siguiente, None)
+                if peticion is None:
+                    return
+                metodo, ruta, cuerpo, content_type = peticion
+                t0 = time.perf_counter()
+                codigo = cliente.enviar(metodo, ruta, cuerpo, content_type)
+                latencia = (time.perf_counter() - t0) * 1000
+                with candado:
+                    latencias.append(latencia)
+                    codigos[codigo] = codigos.get(codigo, 0) + 1
+        finally:
+            cliente.cerrar()
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+
+    bytes_enviados = sum(len(cuerpo or b"") for _, _, cuerpo, _ in peticiones)
+    latencias.sort()
+    exitosas = sum(cantidad for codigo, cantidad in codigos.items() if 200 <= codigo < 300)
+    return {
+        "peticiones": len(peticiones),
+        "exitosas": exitosas,
+        "errores": len(peticiones) - exitosas,
+        "codigos": {str(codigo): cantidad for codigo, cantidad in sorted(codigos.items())},
+        "peticiones_por_segundo": len(peticiones) / total,
+        "kb_por_peticion": bytes_enviados / len(peticiones) / 1024,
+        "p50_ms": percentil(latencias, 50),
+        "p95_ms": percentil(latencias, 95),
+        "p99_ms": percentil(latencias, 99),
+        "media_ms": statistics.mean(latencias),
+        "maxima_ms": latencias[-1],
+    }
+
+
+def mostrar(endpoint, resultado):
+    print(f"{endpoint:<16} {resultado['peticiones_por_segundo']:8.1f} pet/s   "
+          f"p50 {resultado['p50_ms']:7.2f} ms   p95 {resultado['p95_ms']:7.2f} ms   "
+          f"p99 {resultado['p99_ms']:7.2f} ms   {resultado['kb_por_peticion']:7.1f} KB/petición   "
+          f"errores {resultado['errores']} {resultado['codigos']}")
+
+
+def comparar(resultados, anteriores, tolerancia):
+    """
+    Compara peticiones/s y p95 con una ejecución anterior.
+
+    Returns:
+        bool: True si ningún endpoint empeoró más que la tolerancia (en %)
+    """
+    correcto = True
+    print(f"\nComparación con la ejecución del {anteriores.get('fecha', '?')} (tolerancia {tolerancia:.0f} %):")
+    for endpoint, actual in resultados.items():
+        anterior = anteriores.get("resultados", {}).get(endpoint)
+        if anterior is None:
+            print(f"{endpoint:<16} sin datos anteriores")
+            continue
+        cambio_throughput = (actual["peticiones_por_segundo"] / anterior["peticiones_por_segundo"] - 1) * 100
+        cambio_p95 = (actual["p95_ms"] / anterior["p95_ms"] - 1) * 100 if anterior["p95_ms"] else 0.0
+        regresion = (cambio_throughput < -tolerancia or cambio_p95 > tolerancia
+                     or actual["errores"] > anterior["errores"])
+        correcto = correcto and not regresion
+        print(f"{endpoint:<16} pet/s {cambio_throughput:+7.1f} %   p95 {cambio_p95:+7.1f} %   "
+              f"errores {anterior['errores']} -> {actual['errores']}{'   REGRESIÓN' if regresion else ''}")
+    return correcto
+
+
+@contextlib.contextmanager
+def servidor_http(latencia_base, latencia_pagina, timeout=30):
+    """
+    Lanza el servidor con el backend simulado y espera a que responda.
+
+    Yields:
+        str: URL base del servidor
+    """
+    puerto = puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, "-c", CODIGO_SERVIDOR, str(puerto), str(latencia_base), str(latencia_pagina)],
+        env=entorno_aislado(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        limite = time.perf_counter() + timeout
+        while ClienteHttp(f"http://127.0.0.1:{puerto}").enviar("GET", "/") != 200:
+            if proceso.poll() is not None:
+                raise Exception(f"El servidor terminó al iniciar:\n{proceso.stderr.read().decode(errors='replace')}")
+            if time.perf_counter() > limite:
+                raise Exception(f"El servidor no respondió 200 en {timeout} segundos.")
+            time.sleep(0.05)
+        yield f"http://127.0.0.1:{puerto}"
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(30)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+@contextlib.contextmanager
+def aplicacion_en_proceso(latencia_base, latencia_pagina):
+    """
+    Yields:
+        callable: Crea un cliente de la aplicación Flask del mismo proceso
+    """
+    from app import crear_app
+    from services import PrintService, BackendSimulado, cola_impresion, control_admision
+
+    PrintService.usar_backend(BackendSimulado(latencia_base=latencia_base, latencia_por_pagina=latencia_pagina))
+    control_admision.max_en_vuelo = control_admision.max_por_cliente = float("inf")
+    # Los mensajes de cada trabajo se descartan para no medir la consola
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = crear_app()
+        yield lambda: ClienteProceso(app)
+        cola_impresion.detener(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=("proceso", "http"), default="proceso", help="Cómo se sirve la aplicación")
+    parser.add_argument("--url", help="Servidor ya en marcha (ej. http://192.168.1.10:5000); ignora --modo")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Separados por coma: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--peticiones", type=int, default=300, help="Peticiones por endpoint")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Clientes enviando peticiones en paralelo")
+    parser.add_argument("--tamanos", default="5:70,60:25,500:5", help="Tamaños de los PDF en KB con su porcentaje")
+    parser.add_argument("--archivo", help="Enviar este archivo a /print-pdf en lugar de PDFs generados")
+    parser.add_argument("--impresora", help="Nombre para /impresora/predeterminada (con --url es obligatorio)")
+    parser.add_argument("--latencia-base", type=float, default=0.0, help="Segundos fijos por trabajo del backend simulado")
+    parser.add_argument("--latencia-pagina", type=float, default=0.0,
+                        help="Segundos por página del backend simulado (0 mide solo el middleware)")
+    parser.add_argument("--guardar", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="Resultados JSON de una ejecución anterior")
+    parser.add_argument("--tolerancia", type=float, default=10, help="Empeoramiento máximo aceptado (%%)")
+    args = parser.parse_args()
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"Endpoint desconocido: '{endpoint}'. Usa: {', '.join(ENDPOINTS)}")
+    impresora = args.impresora or (None if args.url else SIMULADO_IMPRESORAS[0])
+    if "predeterminada" in endpoints and impresora is None:
+        # No se cambia la impresora predeterminada de un servidor real sin que se pida
+        print("Se omite /impresora/predeterminada: indica --impresora para medirlo contra --url.")
+        endpoints.remove("predeterminada")
+
+    modo = "url" if args.url else args.modo
+    print(f"Python {sys.version.split()[0]} en {sys.platform}, modo '{modo}', "
+          f"{args.peticiones} peticiones por endpoint, concurrencia {args.concurrencia}")
+    tamanos = interpretar_tamanos(args.tamanos)
+    resultados = {}
+    with contextlib.ExitStack() as pila:
+        if args.url:
+            crear_cliente = lambda: ClienteHttp(args.url)  # noqa: E731
+        elif args.modo == "http":
+            url = pila.enter_context(servidor_http(args.latencia_base, args.latencia_pagina))
+            crear_cliente = lambda: ClienteHttp(url)  # noqa: E731
+        else:
+            crear_cliente = pila.enter_context(aplicacion_en_proceso(args.latencia_base, args.latencia_pagina))
+        for endpoint in endpoints:
+            peticiones = preparar_peticiones(endpoint, args.peticiones, tamanos, args.archivo, impresora)
+            resultados[endpoint] = medir(endpoint, crear_cliente, peticiones, args.concurrencia)
+    for endpoint, resultado in resultados.items():
+        mostrar(endpoint, resultado)
+
+    datos = {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "plataforma": platform.platform(),
+        "modo": modo,
+        "parametros": {
+            "peticiones": args.peticiones,
+            "concurrencia": args.concurrencia,
+            "tamanos": args.archivo or args.tamanos,
+            "latencia_base": args.latencia_base,
+            "latencia_pagina": args.latencia_pagina,
+        },
+        "resultados": resultados,
+    }
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en '{args.guardar}'.")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anteriores = json.load(f)
+        if anteriores.get("parametros") != datos["parametros"] or anteriores.get("modo") != modo:
+            print("Aviso: la ejecución anterior usó otros parámetros; la comparación es orientativa.")
+        if not comparar(resultados, anteriores, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
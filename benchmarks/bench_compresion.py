@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de subidas comprimidas: latencia de punta a punta de POST /print-pdf
+enviando el archivo sin comprimir vs. con Content-Encoding gzip (y zstd si el
+paquete 'zstandard' está instalado en el cliente y el servidor), a través de
+un proxy local que limita el ancho de banda para simular enlaces lentos (VPN
+de las sucursales). La latencia incluye comprimir en el cliente, transmitir y
+descomprimir en el servidor hasta la respuesta 202.
+
+    python benchmarks/bench_compresion.py --velocidades 1,10,100 --repeticiones 5
+"""
+
+import argparse
+import gzip
+import http.client
+import io
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_carga import cuerpo_multipart, servidor_http  # noqa: E402
+from bench_plantillas import PLANTILLA, datos_etiqueta  # noqa: E402
+from services.plantillas import compilar_plantilla  # noqa: E402
+
+
+class EnlaceLimitado:
+    """
+    Proxy TCP local que reenvía las conexiones al servidor a una velocidad
+    máxima en cada sentido, como un enlace lento.
+    """
+
+    def __init__(self, puerto_destino, bits_por_segundo):
+        self.puerto_destino = puerto_destino
+        self.bytes_por_segundo = bits_por_segundo / 8
+        self._escucha = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._escucha.bind(("127.0.0.1", 0))
+        self._escucha.listen(64)
+        self.puerto = self._escucha.getsockname()[1]
+        threading.Thread(target=self._aceptar, daemon=True).start()
+
+    def _aceptar(self):
+        while True:
+            try:
+                cliente, _ = self._escucha.accept()
+            except OSError:
+                return
+            servidor = socket.create_connection(("127.0.0.1", self.puerto_destino))
+            threading.Thread(target=self._reenviar, args=(cliente, servidor), daemon=True).start()
+            threading.Thread(target=self._reenviar, args=(servidor, cliente), daemon=True).start()
+
+    def _reenviar(self, origen, destino):
+        # Bloques de unos 5 ms de transmisión, espaciados para no superar la velocidad
+        tamano_bloque = max(int(self.bytes_por_segundo / 200), 1024)
+        siguiente = time.perf_counter()
+        try:
+            while True:
+                datos = origen.recv(tamano_bloque)
+                if not datos:
+                    break
+                siguiente = max(siguiente, time.perf_counter()) + len(datos) / self.bytes_por_segundo
+                espera = siguiente - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                destino.sendall(datos)
+        except OSError:
+            pass
+        finally:
+            for conexion in (origen, destino):
+                try:
+                    conexion.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                conexion.close()
+
+    def cerrar(self):
+        self._escucha.close()
+
+
+def compresores():
+    """
+    Returns:
+        dict: Codificación -> función que comprime el cuerpo (None para enviarlo sin comprimir)
+    """
+    disponibles = {"sin comprimir": None, "gzip": lambda datos: gzip.compress(datos, 6)}
+    try:
+        import zstandard
+        compresor = zstandard.ZstdCompressor(level=3)
+        disponibles["zstd"] = compresor.compress
+    except ImportError:
+        pass
+    return disponibles
+
+
+def documentos(etiquetas_catalogo):
+    """
+    Returns:
+        dict: Nombre del caso -> (nombre del archivo, contenido)
+    """
+    plantilla = compilar_plantilla("bench", PLANTILLA)
+    etiqueta = plantilla.renderizar(datos_etiqueta(1))
+
+    # Importación diferida: pypdf solo hace falta para armar el catálogo
+    from pypdf import PdfReader, PdfWriter
+    escritor = PdfWriter()
+    for numero in range(etiquetas_catalogo):
+        escritor.add_page(PdfReader(io.BytesIO(plantilla.renderizar(datos_etiqueta(numero)))).pages[0])
+    salida = io.BytesIO()
+    escritor.write(salida)
+
+    zpl = "".join(
+        f"^XA^FO40,40^A0N,40,40^FDPedido {numero:08d}^FS^FO40,100^FDCliente {numero}^FS"
+        f"^FO40,150^FDAv. Siempre Viva 742, Springfield^FS^FO40,220^BCN,100,Y,N^FD{numero:012d}^FS^XZ\n"
+        for numero in range(2000)
+    )
+    return {
+        "etiqueta PDF": ("etiqueta.pdf", etiqueta),
+        f"catálogo PDF ({etiquetas_catalogo} pág.)": ("catalogo.pdf", salida.getvalue()),
+        "ZPL/TXT (2000 etiquetas)": ("etiquetas.txt", zpl.encode("utf-8")),
+    }
+
+
+def enviar(puerto, nombre_archivo, contenido, comprimir, codificacion):
+    """
+    Sube el archivo (con un sufijo único para que no se trate como reintento).
+
+    Returns:
+        tuple: (milisegundos de punta a punta, bytes enviados)
+    """
+    unico = f"\n% {uuid.uuid4().hex}\n".encode()
+    inicio = time.perf_counter()
+    cuerpo, content_type = cuerpo_multipart(nombre_archivo, contenido + unico)
+    cabeceras = {"Content-Type": content_type}
+    if comprimir is not None:
+        cuerpo = comprimir(cuerpo)
+        cabeceras["Content-Encoding"] = codificacion
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=300)
+    try:
+        conexion.request("POST", "/print-pdf", body=cuerpo, headers=cabeceras)
+        respuesta = conexion.getresponse()
+        texto = respuesta.read()
+    finally:
+        conexion.close()
+    if respuesta.status != 202:
+        raise Exception(f"{codificacion}: respuesta {respuesta.status}: {texto.decode(errors='replace')}")
+    return (time.perf_counter() - inicio) * 1000, len(cuerpo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--velocidades", default="1,10,100", help="Velocidades del enlace en Mbit/s, separadas por coma")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Subidas por combinación (se informa la mediana)")
+    parser.add_argument("--etiquetas-catalogo", type=int, default=100, help="Páginas del PDF de catálogo")
+    args = parser.parse_args()
+
+    casos = documentos(args.etiquetas_catalogo)
+    codificaciones = compresores()
+    print(f"Python {sys.version.split()[0]} en {sys.platform}; codificaciones: {', '.join(codificaciones)}")
+    print(f"{'documento':<28} {'enlace':>10} {'codificación':<14} {'enviado':>10} {'p50':>10} {'mejora':>8}")
+
+    with servidor_http(0, 0) as url:
+        puerto_servidor = int(url.rsplit(":", 1)[1])
+        for mbits in (float(valor) for valor in args.velocidades.split(",")):
+            enlace = EnlaceLimitado(puerto_servidor, mbits * 1_000_000)
+            try:
+                for caso, (nombre_archivo, contenido) in casos.items():
+                    base = None
+                    for codificacion, comprimir in codificaciones.items():
+                        mediciones = [enviar(enlace.puerto, nombre_archivo, contenido, comprimir, codificacion)
+                                      for _ in range(args.repeticiones)]
+                        mediana = statistics.median(latencia for latencia, _ in mediciones)
+                        base = base or mediana
+                        print(f"{caso:<28} {mbits:>6g} Mb/s {codificacion:<14} "
+                              f"{mediciones[0][1] / 1024:>7.1f} KB {mediana:>7.0f} ms {base / mediana:>7.1f}x")
+            finally:
+                enlace.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: subir cada etiqueta como PDF ya generado vs. enviar solo los datos
+a una plantilla registrada (POST /templates/<nombre>/print).
+Usa la aplicación Flask en el mismo proceso con el backend simulado, por lo que
+corre en cualquier sistema. Mide desde la primera petición hasta que todos los
+trabajos terminan de imprimirse.
+
+    python benchmarks/bench_plantillas.py --etiquetas 500 --tamano-pdf 60
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MIDDLEWARE_BACKEND", "simulado")
+os.environ.setdefault("MIDDLEWARE_ALMACEN", os.path.join(tempfile.mkdtemp(prefix="almacen_bench_"), "trabajos.db"))
+
+from app import crear_app  # noqa: E402
+from services import PrintService, BackendSimulado, cola_impresion, control_admision, registro_plantillas  # noqa: E402
+from services.cola_impresion import ESTADO_COMPLETADO, ESTADO_FALLIDO  # noqa: E402
+from services.plantillas import compilar_plantilla  # noqa: E402
+
+PLANTILLA = {
+    "formato": "pdf",
+    "ancho": 100,
+    "alto": 60,
+    "elementos": [
+        {"tipo": "rectangulo", "x": 2, "y": 2, "ancho": 96, "alto": 56},
+        {"tipo": "texto", "texto": "Pedido ${pedido}", "x": 5, "y": 12, "tamano": 16, "negrita": True},
+        {"tipo": "texto", "texto": "${destinatario}", "x": 5, "y": 22, "tamano": 11},
+        {"tipo": "texto", "texto": "${direccion}", "x": 5, "y": 29, "tamano": 11},
+        {"tipo": "linea", "x1": 2, "y1": 34, "x2": 98, "y2": 34},
+        {"tipo": "texto", "texto": "Bultos: ${bultos}", "x": 5, "y": 42, "tamano": 11},
+    ]
+}
+
+
+def datos_etiqueta(numero):
+    return {
+        "pedido": f"{numero:08d}",
+        "destinatario": f"Cliente {numero}",
+        "direccion": "Av. Siempre Viva 742, Springfield",
+        "bultos": str(numero % 5 + 1),
+    }
+
+
+def pdf_del_cliente(numero, tamano_kb):
+    """PDF de la misma etiqueta, con relleno para simular las fuentes incrustadas de un PDF real."""
+    pdf = compilar_plantilla("cliente", PLANTILLA).renderizar(datos_etiqueta(numero))
+    relleno = max(tamano_kb * 1024 - len(pdf), 0)
+    return pdf + b"%" + b"x" * relleno + b"\n"
+
+
+def esperar_trabajos(ids):
+    """Espera a que terminen todos los trabajos y devuelve cuántos fallaron."""
+    pendientes = set(ids)
+    fallidos = 0
+    while pendientes:
+        for job_id in list(pendientes):
+            trabajo = cola_impresion.obtener(job_id)
+            if trabajo is None or trabajo.estado in (ESTADO_COMPLETADO, ESTADO_FALLIDO):
+                pendientes.discard(job_id)
+                fallidos += trabajo is not None and trabajo.estado == ESTADO_FALLIDO
+        time.sleep(0.01)
+    return fallidos
+
+
+def medir(nombre, app, enviar, etiquetas, clientes):
+    """Envía las etiquetas desde varios hilos y muestra throughput y latencias."""
+    latencias, ids, bytes_enviados = [], [], []
+    candado = threading.Lock()
+    siguiente = iter(range(etiquetas))
+
+    def cliente():
+        conexion = app.test_client()
+        while True:
+            with candado:
+                numero = next(siguiente, None)
+            if numero is None:
+                return
+            t0 = time.perf_counter()
+            respuesta, tamano = enviar(conexion, numero)
+            latencia = (time.perf_counter() - t0) * 1000
+            if respuesta.status_code != 202:
+                raise Exception(f"{nombre}: respuesta {respuesta.status_code}: {respuesta.get_data(as_text=True)}")
+            with candado:
+                latencias.append(latencia)
+                ids.append(respuesta.get_json()["job_id"])
+                bytes_enviados.append(tamano)
+
+    # Los mensajes de cada trabajo se descartan para no medir la consola
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=cliente) for _ in range(clientes)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        fallidos = esperar_trabajos(ids)
+        total = time.perf_counter() - inicio
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95) - 1]
+    print(f"{nombre:<16} {etiquetas / total:8.1f} etiquetas/s   "
+          f"p50 {statistics.median(latencias):7.2f} ms   p95 {p95:7.2f} ms   "
+          f"{statistics.mean(bytes_enviados) / 1024:7.1f} KB/petición   fallidos {fallidos}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etiquetas", type=int, default=300, help="Etiquetas por variante")
+    parser.add_argument("--clientes", type=int, default=4, help="Hilos enviando peticiones en paralelo")
+    parser.add_argument("--tamano-pdf", type=int, default=60, help="KB de cada PDF generado por el cliente")
+    parser.add_argument("--latencia-pagina", type=float, default=0.0,
+                        help="Segundos por página del backend simulado (0 mide solo el middleware)")
+    args = parser.parse_args()
+
+    PrintService.usar_backend(BackendSimulado(latencia_base=0, latencia_por_pagina=args.latencia_pagina))
+    registro_plantillas.directorio = tempfile.mkdtemp(prefix="plantillas_bench_")
+    # Todas las etiquetas salen del mismo cliente: sin límite de admisión para medir el throughput
+    control_admision.max_en_vuelo = control_admision.max_por_cliente = float("inf")
+    app = crear_app()
+    app.test_client().put("/templates/envio", json=PLANTILLA)
+
+    # Los PDF se generan antes de medir: en la estación también existen antes de subirlos
+    pdfs = [pdf_del_cliente(numero, args.tamano_pdf) for numero in range(args.etiquetas)]
+
+    def subir_pdf(conexion, numero):
+        respuesta = conexion.post("/print-pdf", data={"file": (io.BytesIO(pdfs[numero]), f"etiqueta_{numero}.pdf")},
+                                  content_type="multipart/form-data")
+        return respuesta, len(pdfs[numero])
+
+    def enviar_datos(conexion, numero):
+        cuerpo = json.dumps({"datos": datos_etiqueta(numero)}).encode("utf-8")
+        respuesta = conexion.post("/templates/envio/print", data=cuerpo, content_type="application/json")
+        return respuesta, len(cuerpo)
+
+    medir("PDF subido", app, subir_pdf, args.etiquetas, args.clientes)
+    medir("plantilla", app, enviar_datos, args.etiquetas, args.clientes)
+    print(f"Caché de plantillas: {registro_plantillas.estadisticas()}")
+
+
+if __name__ == "__main__":
+    main()
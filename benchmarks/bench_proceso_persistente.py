@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: proceso por trabajo vs. proceso auxiliar persistente para imprimir TXT.
+Usa ayudante_impresion.py en lugar de PowerShell, por lo que corre en cualquier sistema.
+
+    python benchmarks/bench_proceso_persistente.py --trabajos 200
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TIMEOUT_POWERSHELL  # noqa: E402
+from services.backends.proceso_persistente import ProcesoPersistente  # noqa: E402
+
+AYUDANTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ayudante_impresion.py")
+
+
+def medir(nombre, funcion, ruta_archivo, trabajos):
+    """Ejecuta la función una vez por trabajo y muestra las latencias."""
+    latencias = []
+    inicio = time.perf_counter()
+    for _ in range(trabajos):
+        t0 = time.perf_counter()
+        funcion(ruta_archivo)
+        latencias.append((time.perf_counter() - t0) * 1000)
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95) - 1]
+    print(f"{nombre:<22} {trabajos / total:9.1f} trabajos/s   "
+          f"p50 {statistics.median(latencias):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trabajos", type=int, default=100, help="Trabajos por variante")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("Etiqueta de prueba\n" * 20)
+        ruta_archivo = f.name
+
+    def proceso_por_trabajo(ruta):
+        resultado = subprocess.run(
+            [sys.executable, AYUDANTE, ruta],
+            capture_output=True, text=True, timeout=TIMEOUT_POWERSHELL, check=False
+        )
+        if resultado.returncode != 0:
+            raise Exception(resultado.stderr.strip())
+
+    persistente = ProcesoPersistente(
+        [sys.executable, AYUDANTE, "--persistente"],
+        timeout=TIMEOUT_POWERSHELL,
+        nombre="ayudante persistente"
+    )
+
+    try:
+        medir("proceso por trabajo", proceso_por_trabajo, ruta_archivo, args.trabajos)
+        medir("proceso persistente", lambda ruta: persistente.enviar({"archivo": ruta, "impresora": "bench"}),
+              ruta_archivo, args.trabajos)
+        print(f"Estadísticas del proceso persistente: {persistente.estadisticas()}")
+    finally:
+        persistente.cerrar()
+        os.remove(ruta_archivo)
+
+
+if __name__ == '__main__':
+    main()
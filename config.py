@@ -5,7 +5,10 @@ Configuración de la aplicación Flask.
 Contiene todas las constantes y configuraciones centralizadas.
 """
 
+import os
 import socket
+import tempfile
+import threading
 
 # --- CONFIGURACIÓN PRINCIPAL ---
 # IMPORTANTE: Aquí debes poner el nombre exacto de tu impresora como aparece en Windows.
@@ -15,8 +18,70 @@ NOMBRE_IMPRESORA = "Brother <MODELO DE IMPRESORA>"
 
 # Configuración del servidor
 HOST = "0.0.0.0"  # Se configurará dinámicamente
-PORT = 5000
-DEBUG = True
+PORT = int(os.environ.get("MIDDLEWARE_PUERTO", 5000))
+# IP en la que escuchar; si no se indica (variable de entorno MIDDLEWARE_IP) se detecta al iniciar
+IP_SERVIDOR = os.environ.get("MIDDLEWARE_IP")
+TIMEOUT_DETECCION_IP = 1   # Segundos máximos detectando la IP local antes de usar 127.0.0.1
+DEBUG = False  # Servidor de desarrollo de Flask con depurador; también se activa con 'python middleware.py --debug'
+
+# Servidor de producción (Waitress)
+SERVIDOR_HILOS = 8                          # Hilos que atienden peticiones HTTP
+SERVIDOR_BACKLOG = 1024                     # Conexiones pendientes de aceptar en el socket
+SERVIDOR_CONEXIONES_MAXIMAS = 200           # Conexiones simultáneas máximas
+SERVIDOR_KEEPALIVE = 120                    # Segundos que se mantiene abierta una conexión inactiva
+ASGI_CONEXIONES_MAXIMAS = 5000              # Conexiones simultáneas máximas en el modo ASGI (--asgi)
+MAX_TAMANO_PETICION = 50 * 1024 * 1024      # Bytes máximos del cuerpo de una petición
+TIMEOUT_DRENADO = 30                        # Segundos esperando trabajos en curso al detener el servidor
+
+# Tamaño de bloque al escribir archivos recibidos en disco
+TAMANO_BLOQUE_ESCRITURA = 64 * 1024
+
+# Validación de los archivos subidos mientras se reciben
+MAX_TAMANO_ARCHIVO = 20 * 1024 * 1024       # Bytes máximos de cada documento (se responde 413 si se supera)
+BYTES_FIRMA = 1024                          # Bytes iniciales que se inspeccionan antes de escribir en disco
+
+# Cuerpos de petición comprimidos (cabecera Content-Encoding: gzip, o zstd si está instalado
+# 'zstandard'): se descomprimen mientras llegan, con límites contra bombas de descompresión
+MAX_TAMANO_DESCOMPRIMIDO = MAX_TAMANO_PETICION   # Bytes máximos del cuerpo ya descomprimido
+MAX_RATIO_DESCOMPRESION = 200                    # Bytes descomprimidos máximos por byte recibido
+MIN_BYTES_RATIO_DESCOMPRESION = 1024 * 1024      # La relación se controla a partir de este tamaño
+
+# Subidas por partes reanudables (POST /uploads): cada parte se agrega al archivo temporal y
+# la subida se retoma desde el último byte confirmado tras un corte de red
+TTL_SESION_SUBIDA = 60 * 60                 # Segundos sin recibir partes tras los que se descarta una sesión
+MAX_SESIONES_SUBIDA = 100                   # Sesiones abiertas a la vez
+MAX_TAMANO_PARTE = 8 * 1024 * 1024          # Bytes máximos de cada parte (PUT /uploads/<id>)
+
+# Concurrencia propia de algunas impresoras (las no listadas usan TRABAJADORES_IMPRESION)
+CONCURRENCIA_IMPRESORAS = {
+    # "Brother PT-P950NW": 1,
+}
+
+# Grupos de impresoras equivalentes: un trabajo enviado al grupo va a la impresora
+# activa menos cargada. Se eligen con el campo de formulario 'printer'.
+GRUPOS_IMPRESORAS = {
+    # "etiquetas": ["Brother PT-P950NW", "Brother PT-P950NW (2)"],
+}
+
+# Idempotencia y deduplicación de envíos
+TTL_IDEMPOTENCIA = 24 * 60 * 60        # Segundos que se recuerda una cabecera Idempotency-Key
+DEDUPLICAR_POR_CONTENIDO = True        # Tratar como reintento un archivo idéntico sin Idempotency-Key
+TTL_DEDUPLICACION_CONTENIDO = 60       # Segundos en los que un contenido idéntico se considera reintento
+MAX_ENTRADAS_IDEMPOTENCIA = 10000      # Entradas máximas del índice (se descartan las menos usadas)
+ESPERA_ORIGINAL_IDEMPOTENCIA = 30      # Segundos que un reintento espera a que termine de encolarse el original
+
+# Impresión por lotes (POST /print-batch)
+MAX_DOCUMENTOS_LOTE = 100                  # Documentos máximos por lote
+MAX_TAMANO_ZIP_LOTE = 100 * 1024 * 1024    # Bytes descomprimidos máximos de un ZIP de lote
+COMBINAR_DOCUMENTOS_LOTE = True            # Unir documentos consecutivos del mismo tipo en un solo envío
+
+# Plantillas de etiquetas (se registran una vez y se imprimen enviando solo los datos)
+DIRECTORIO_PLANTILLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plantillas")
+MAX_PLANTILLAS_COMPILADAS = 64   # Plantillas compiladas que se mantienen en memoria (LRU)
+
+# Backend de impresión: 'windows' (spooler real) o 'simulado' (pruebas de carga sin impresora).
+# Puede sobrescribirse con la variable de entorno MIDDLEWARE_BACKEND.
+BACKEND_IMPRESION = os.environ.get("MIDDLEWARE_BACKEND", "windows")
 
 # Archivos soportados
 EXTENSIONES_SOPORTADAS = ['.pdf', '.txt']
@@ -31,24 +96,139 @@ RUTAS_SUMATRA = [
 # Configuración de timeouts
 TIMEOUT_POWERSHELL = 10
 TIMEOUT_SUMATRA = 15
-TIMEOUT_LIMPIEZA = 5
+TIMEOUT_LIMPIEZA = 5             # Gracia antes de borrar un archivo impreso con el método de respaldo
+
+# Circuito de los métodos principales de impresión (PowerShell, SumatraPDF)
+UMBRAL_FALLOS_CIRCUITO = 3       # Fallos o timeouts seguidos tras los que se pasa directo al respaldo
+ESPERA_SONDEO_CIRCUITO = 30      # Segundos entre sondeos del método mientras se lo evita
+
+# Limpieza de archivos temporales (un único hilo para todos los trabajos)
+MAX_REINTENTOS_LIMPIEZA = 3      # Reintentos si el archivo sigue abierto por otro proceso
+ESPERA_REINTENTO_LIMPIEZA = 2    # Segundos entre reintentos (crece con cada intento)
+# Directorio propio de esta instancia (una por puerto) para los archivos temporales: el barrido de
+# huérfanos al iniciar no toca los de otra instancia. Se puede cambiar con MIDDLEWARE_TEMPORALES.
+DIRECTORIO_TEMPORAL = os.environ.get(
+    "MIDDLEWARE_TEMPORALES",
+    os.path.join(tempfile.gettempdir(), f"middleware-impresion-{PORT}")
+)
+
+# Impresión de TXT con un PowerShell de larga duración por impresora en lugar de uno por trabajo.
+# TIMEOUT_POWERSHELL se aplica a cada trabajo; si se supera, el proceso se mata y se relanza.
+TXT_POWERSHELL_PERSISTENTE = True
 
+# Cola de impresión asíncrona (una cola por impresora)
+TRABAJADORES_IMPRESION = 2       # Hilos por impresora que le envían trabajos en paralelo
+CAPACIDAD_COLA_IMPRESION = 500   # Trabajos pendientes máximos por impresora antes de rechazar nuevos
+MAX_TRABAJOS_HISTORIAL = 1000    # Trabajos terminados que se conservan para consultar su estado
 
-def obtener_ip_local():
+# Prioridades de los trabajos (campo 'priority'), de la más a la menos urgente. Se atiende
+# siempre la más alta, pero cada ENVEJECIMIENTO_PRIORIDAD segundos de espera un trabajo sube una
+# clase, así los masivos nunca quedan esperando para siempre.
+PRIORIDADES = ("urgente", "normal", "masivo")
+PRIORIDAD_PREDETERMINADA = "normal"
+PRIORIDAD_MASIVA = "masivo"       # Sus trabajos se imprimen por tramos, cediendo el lugar entre tramos
+ENVEJECIMIENTO_PRIORIDAD = 60
+PAGINAS_POR_TRAMO = 20            # Páginas máximas de cada tramo de un trabajo masivo
+
+# Control de admisión: trabajos en vuelo (en cola o imprimiéndose). Al superar un límite se
+# responde 429 con Retry-After. Cada cliente se identifica por su IP o, si envía una clave de
+# CLAVES_CLIENTES en la cabecera CABECERA_CLAVE_CLIENTE, por el nombre asociado a la clave.
+MAX_TRABAJOS_EN_VUELO = 1000     # Entre todos los clientes
+MAX_TRABAJOS_POR_CLIENTE = 100   # De un mismo cliente
+MAX_REINTENTAR_EN = 60           # Segundos máximos sugeridos en Retry-After
+CABECERA_CLAVE_CLIENTE = "X-Api-Key"
+CLAVES_CLIENTES = {
+    # "clave-secreta-deposito": "deposito",
+}
+# Peso de cada cliente (nombre o IP) en el reparto de las impresoras; los no listados pesan 1
+PESOS_CLIENTES = {
+    # "deposito": 2,
+}
+
+# Eventos de los trabajos en tiempo real (GET /events, Server-Sent Events)
+CAPACIDAD_SUSCRIPTOR_EVENTOS = 256     # Eventos sin leer por cliente; si se llena se descartan los más viejos
+INTERVALO_LATIDO_EVENTOS = 15          # Segundos sin eventos tras los que se envía un latido
+MAX_SUSCRIPTORES_EVENTOS = 4           # Con Waitress cada cliente conectado ocupa uno de los SERVIDOR_HILOS
+MAX_SUSCRIPTORES_EVENTOS_ASGI = 1000   # En el modo ASGI los clientes no ocupan hilos
+
+# Perfilado a demanda: una petición de impresión con la cabecera CABECERA_PERFILADO ('cprofile' o
+# 'muestreo') y la clave de administración se perfila entera, incluida la impresión de su trabajo.
+# Los perfiles se descargan de GET /admin/profiles. Sin clave (variable de entorno
+# MIDDLEWARE_CLAVE_ADMIN) no se aceptan perfiles a pedido ni se exponen los endpoints.
+CLAVE_ADMIN = os.environ.get("MIDDLEWARE_CLAVE_ADMIN")
+CABECERA_CLAVE_ADMIN = "X-Admin-Key"
+CABECERA_PERFILADO = "X-Profile"
+TASA_MUESTREO_PERFILES = 0.0       # Probabilidad (0 a 1) de perfilar una petición al azar
+MODO_PERFIL_MUESTREO = "muestreo"  # Modo de los perfiles tomados al azar
+MAX_PERFILES = 20                  # Perfiles que se conservan en memoria (se descartan los más viejos)
+MAX_ETAPAS_PERFIL = 500            # Etapas máximas registradas por perfil
+INTERVALO_MUESTREO_PILA = 0.005    # Segundos entre muestras de la pila en el modo 'muestreo'
+
+# Almacén de trabajos (SQLite en modo WAL): historial consultable y recuperación tras un reinicio.
+# Puede sobrescribirse con la variable de entorno MIDDLEWARE_ALMACEN.
+RUTA_ALMACEN_TRABAJOS = os.environ.get(
+    "MIDDLEWARE_ALMACEN",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "trabajos.db")
+)
+MAX_LOTE_ALMACEN = 500              # Escrituras máximas agrupadas en una misma transacción
+RETENCION_ALMACEN_TRABAJOS = 7 * 24 * 3600   # Segundos que se conservan los trabajos terminados
+INTERVALO_PURGA_ALMACEN = 60 * 60   # Segundos entre purgas de los trabajos vencidos mientras el servidor sigue activo
+MAX_RESULTADOS_CONSULTA = 1000      # Trabajos máximos devueltos por GET /jobs
+
+# Caché del inventario de impresoras (GET /printers)
+TTL_INVENTARIO_IMPRESORAS = 30       # Segundos durante los que el inventario se considera vigente
+INTERVALO_REFRESCO_INVENTARIO = 20   # Segundos entre refrescos en segundo plano (0 para desactivar)
+
+# Sesiones WMI persistentes (backend de Windows)
+HILOS_SESIONES_WMI = 2             # Hilos con COM inicializado y una conexión WMI abierta cada uno
+TIMEOUT_OPERACION_WMI = 30         # Segundos máximos de espera por una operación WMI
+INTERVALO_VERIFICACION_WMI = 60    # Segundos entre verificaciones de salud de cada sesión
+
+# Backend simulado (solo se usa con BACKEND_IMPRESION = "simulado")
+SIMULADO_IMPRESORAS = ["Impresora Simulada 1", "Impresora Simulada 2"]
+SIMULADO_LATENCIA_BASE = 0.05        # Segundos fijos por trabajo
+SIMULADO_LATENCIA_POR_PAGINA = 0.2   # Segundos adicionales por página
+SIMULADO_TASA_FALLOS = 0.0           # Probabilidad (0 a 1) de que falle un envío
+SIMULADO_CAPACIDAD_SPOOL = 4         # Trabajos que el spool de cada impresora procesa a la vez
+SIMULADO_TIMEOUT_SPOOL = 5           # Segundos esperando lugar en el spool antes de fallar
+
+
+def obtener_ip_local(timeout=TIMEOUT_DETECCION_IP):
     """
     Detecta automáticamente la dirección IP local de la máquina.
     Esto permite que el servidor sea accesible desde otros dispositivos en la misma red.
+    Si se configuró IP_SERVIDOR se usa esa sin detectar nada.
+
+    Args:
+        timeout (float): Segundos máximos de espera; el arranque nunca se demora más que esto
     """
-    try:
-        # Se crea un socket temporal para determinar la IP de la interfaz de red principal.
-        # Se conecta a un servidor DNS público (de Google) para forzar al sistema operativo
-        # a elegir la interfaz de red correcta, pero no se envía ningún dato.
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            s.connect(("8.8.8.8", 80))
-            ip_local = s.getsockname()[0]
-            return ip_local
-    except Exception as e:
-        # Si por alguna razón no se puede detectar la IP (ej. no hay conexión a red),
-        # se usa '127.0.0.1' (localhost) como valor predeterminado.
-        print(f"ADVERTENCIA: No se pudo detectar la IP local. Usando '127.0.0.1'. Error: {e}")
-        return "127.0.0.1"
+    if IP_SERVIDOR:
+        return IP_SERVIDOR
+
+    resultado = {}
+
+    def detectar():
+        try:
+            # Se crea un socket temporal para determinar la IP de la interfaz de red principal.
+            # Se conecta a un servidor DNS público (de Google) para forzar al sistema operativo
+            # a elegir la interfaz de red correcta, pero no se envía ningún dato.
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.setblocking(False)
+                s.connect(("8.8.8.8", 80))
+                resultado["ip"] = s.getsockname()[0]
+        except Exception as e:
+            resultado["error"] = e
+
+    # La detección corre en otro hilo para acotar la espera aunque la pila de red no responda
+    hilo = threading.Thread(target=detectar, name="deteccion-ip", daemon=True)
+    hilo.start()
+    hilo.join(timeout)
+
+    ip_local = resultado.get("ip")
+    if ip_local and ip_local != "0.0.0.0":
+        return ip_local
+    # Si por alguna razón no se puede detectar la IP (ej. no hay conexión a red),
+    # se usa '127.0.0.1' (localhost) como valor predeterminado.
+    error = resultado.get("error", f"sin respuesta en {timeout} segundo(s)")
+    print(f"ADVERTENCIA: No se pudo detectar la IP local. Usando '127.0.0.1'. Error: {error}")
+    return "127.0.0.1"
@@ -5,14 +5,30 @@ Middleware de impresión Flask.
 Punto de entrada principal de la aplicación.
 """
 
-from app import crear_app
-from config import obtener_ip_local, NOMBRE_IMPRESORA, PORT
+import argparse
+import os
+
+from app import crear_app, crear_app_asgi
+from config import obtener_ip_local, NOMBRE_IMPRESORA, PORT, DEBUG
+from servidor import servir_produccion, servir_desarrollo
 
 # --- PUNTO DE ENTRADA DE LA APLICACIÓN ---
 # Este bloque solo se ejecuta cuando el script se corre directamente (ej. 'python middleware.py').
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Middleware de impresión")
+    parser.add_argument("--debug", action="store_true",
+                        help="Usar el servidor de desarrollo de Flask con depurador y recarga automática")
+    parser.add_argument("--asgi", action="store_true",
+                        help="Servir la aplicación como ASGI con uvicorn (asyncio) en lugar de Waitress")
+    args = parser.parse_args()
+    modo_debug = args.debug or DEBUG
+    
+    # Con recarga automática este script corre dos veces: el proceso vigilante solo relanza al
+    # hijo (WERKZEUG_RUN_MAIN), que es el que recupera los trabajos y atiende las peticiones
+    iniciar_servicios = args.asgi or not modo_debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    
     # Crear la aplicación usando el factory pattern
-    aplicacion = crear_app()
+    aplicacion = crear_app_asgi() if args.asgi else crear_app(iniciar_servicios=iniciar_servicios)
     
     # Se obtiene la IP local para que el servidor sea accesible en la red.
     ip_local = obtener_ip_local()
@@ -24,9 +40,16 @@ if __name__ == '__main__':
     print(f"🖨️  Impresora configurada: '{NOMBRE_IMPRESORA}'")
     print("📡 Para detener el servidor, presiona CTRL+C")
     
-    # Se inicia el servidor Flask.
+    # Se inicia el servidor.
     # host=ip_local -> Hace que el servidor sea visible en tu red local.
     # port=PORT -> El puerto en el que escuchará el servidor.
-    # debug=True -> Activa el modo de depuración, que reinicia el servidor al detectar cambios en el código.
-    aplicacion.run(host=ip_local, port=PORT, debug=True)
-
+    # Por defecto se usa el servidor de producción (Waitress); con --debug, el de desarrollo de Flask
+    # y con --asgi, uvicorn.
+    if args.asgi:
+        # Importación diferida: uvicorn es una dependencia opcional
+        from servidor_asgi import servir_asgi
+        servir_asgi(aplicacion, ip_local, PORT)
+    elif modo_debug:
+        servir_desarrollo(aplicacion, ip_local, PORT)
+    else:
+        servir_produccion(aplicacion, ip_local, PORT)
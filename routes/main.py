@@ -4,15 +4,68 @@
 Rutas de la aplicación Flask (blueprints).
 Contiene todos los endpoints de la API.
 """
+
+import functools
+import hashlib
+import os
+import re
+
                                                #--------
-from flask import Blueprint, request, Response, jsonify #<---- agregado por gabriel
+from flask import Blueprint, request, Response, jsonify, make_response, url_for #<---- agregado por gabriel
 
-from services import PrintService
+from config import MAX_RESULTADOS_CONSULTA, MAX_SUSCRIPTORES_EVENTOS, PRIORIDAD_MASIVA
+from services import (
+    PrintService,
+    TrabajoImpresion,
+    TrabajoPdfMasivo,
+    almacen_trabajos,
+    SaturacionServicio,
+    circuitos_impresion,
+    cola_impresion,
+    control_admision,
+    crear_lote,
+    difusor_eventos,
+    encolar_idempotente,
+    etapa,
+    extraer_zip,
+    identificar_cliente,
+    indice_idempotencia,
+    limpiador_temporales,
+    registro_compresion,
+    registro_perfiles,
+    registro_plantillas,
+    sesiones_subida
+)
+from services.cola_impresion import ESTADOS_TRABAJO
+from services.eventos import flujo_eventos
+from services.metricas import registro_metricas, DURACION_ETAPA
+from services.perfilado import FORMATOS_PERFIL
 from utils import ValidationUtils
 
 # Crear blueprint para las rutas principales
 main_bp = Blueprint('main', __name__)
 
+# Cabecera Content-Range de cada parte de una subida: 'bytes inicio-fin/total'
+PATRON_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+def perfilable(vista):
+    """
+    Decorador de los endpoints de impresión: si la petición se perfila (cabecera
+    X-Profile con la clave de administración, o muestreo al azar), la vista se
+    ejecuta con su traza activa y perfilada; si no, se ejecuta tal cual.
+    """
+    @functools.wraps(vista)
+    def envoltorio(*args, **kwargs):
+        traza = registro_perfiles.decidir(request.headers, request.path)
+        if traza is None:
+            return vista(*args, **kwargs)
+        with traza.activar(), traza.perfilar("peticion"):
+            respuesta = make_response(vista(*args, **kwargs))
+        respuesta.headers['X-Profile-Id'] = traza.id
+        return respuesta
+    return envoltorio
+
 
 @main_bp.route('/', methods=['GET'])
 def estado_salud():
@@ -46,6 +99,18 @@ def listar_impresoras():
         return Response(f"Error: {str(e)}", status=500)
 
 
+@main_bp.route('/printers/queues', methods=['GET'])
+def estado_colas():
+    """
+    Endpoint que devuelve, por impresora, la profundidad de su cola y los
+    trabajos en curso, junto con los grupos de impresoras configurados.
+    """
+    return jsonify({
+        "colas": cola_impresion.estado_colas(),
+        "grupos": cola_impresion.grupos
+    }), 200
+
+
 @main_bp.route('/impresora/predeterminada', methods=['POST'])
 def establecer_predeterminada():
     """
@@ -78,40 +143,613 @@ def establecer_predeterminada():
 
 
 @main_bp.route('/print-pdf', methods=['POST'])
+@perfilable
 def imprimir_pdf():
     """
-    Endpoint principal que recibe un archivo y lo manda a imprimir.
+    Endpoint principal que recibe un archivo y lo encola para imprimir.
+    Responde 202 de inmediato con el identificador del trabajo; el estado
+    se consulta en /jobs/<job_id>.
     """
     try:
-        # 1. Verificación del sistema operativo
+        # 1. Verificación del sistema operativo y admisión (antes de recibir el archivo)
         ValidationUtils.validar_sistema_operativo()
+        cliente = cliente_actual()
+        control_admision.verificar(cliente)
         
-        # 2. Depuración: Muestra los encabezados de la petición entrante
-        print("\n--- ENCABEZADOS DE LA PETICIÓN ENTRANTE ---")
-        print(request.headers)
+        # 2. Validación de la petición, el archivo y la prioridad
+        with etapa("validar"):
+            archivo = ValidationUtils.validar_peticion(request)
+            ValidationUtils.validar_archivo(archivo)
+            prioridad = ValidationUtils.validar_prioridad(request.form.get('priority'))
         
-        # 3. Validación de la petición y archivo
-        archivo = ValidationUtils.validar_peticion(request)
-        ValidationUtils.validar_archivo(archivo)
-        
-        # 4. Procesar impresión
-        PrintService.procesar_impresion(archivo)
-        
-        # 5. Respuesta exitosa
-        return Response("Archivo enviado a impresión", status=200)
+        # 3. Guardar el archivo y encolar el trabajo (salvo que sea un reintento).
+        #    Un PDF masivo grande se imprime por tramos para intercalar trabajos urgentes.
+        ruta_archivo, huella = PrintService.guardar_archivo_temporal(archivo)
+        return encolar_archivo(ruta_archivo, huella, archivo.filename, request.form.get('printer'), cliente, prioridad)
         
     except Exception as e:
         # Manejo de errores
         print(f"ERROR: {str(e)}")
+        return respuesta_error(e)
+
+
+def encolar_archivo(ruta_archivo, huella, nombre_archivo, destino, cliente, prioridad, conservar_archivo=False):
+    """
+    Encola un archivo ya guardado (salvo que sea un reintento) y construye la
+    respuesta. Un PDF masivo se imprime por tramos para intercalar trabajos urgentes;
+    se divide recién en el trabajador, después de descartar reintentos y duplicados.
+    
+    Args:
+        ruta_archivo (str): Archivo temporal; pasa a ser del trabajo o se elimina
+        huella (str): Hash SHA-256 del contenido
+        nombre_archivo (str): Nombre original del archivo
+        destino (str): Impresora o grupo de destino
+        cliente (str): Cliente que envía el archivo
+        prioridad (str): Prioridad del trabajo
+        conservar_archivo (bool): No eliminar el archivo si no se puede encolar
+        
+    Returns:
+        tuple: Respuesta JSON y código de estado (202, o 200 si es un duplicado)
+    """
+    _, extension = os.path.splitext(nombre_archivo)
+    if prioridad == PRIORIDAD_MASIVA and extension.lower() == '.pdf':
+        nuevo = TrabajoPdfMasivo.desde_pdf(ruta_archivo, nombre_archivo, destino, cliente)
+    else:
+        nuevo = TrabajoImpresion(ruta_archivo, extension.lower(), nombre_archivo, destino, cliente, prioridad)
+    try:
+        trabajo, duplicado = encolar_idempotente(
+            nuevo,
+            clave_cliente=request.headers.get('Idempotency-Key'),
+            huella=huella
+        )
+    except Exception:
+        if not conservar_archivo:
+            for ruta_temporal in nuevo.archivos_temporales():
+                PrintService.programar_limpieza(ruta_temporal)
+        raise
+    
+    # Trabajo aceptado, o el trabajo original si es un duplicado
+    if duplicado:
+        for ruta_temporal in nuevo.archivos_temporales():
+            PrintService.programar_limpieza(ruta_temporal)
+        return respuesta_duplicado(trabajo)
+    
+    return respuesta_aceptado(trabajo, "Archivo encolado para impresión")
+
+
+@main_bp.route('/print-batch', methods=['POST'])
+@perfilable
+def imprimir_lote():
+    """
+    Endpoint que recibe varios documentos (campo 'files') o un ZIP y los encola
+    como un único lote. Los documentos consecutivos del mismo tipo se combinan
+    en un solo envío a la impresora, respetando el orden recibido.
+    """
+    documentos_guardados = []
+    try:
+        # 1. Verificación del sistema operativo y admisión (antes de recibir los archivos)
+        ValidationUtils.validar_sistema_operativo()
+        cliente = cliente_actual()
+        control_admision.verificar(cliente)
+        
+        # 2. Validación de la petición, de cada archivo y de la prioridad
+        with etapa("validar"):
+            archivos = ValidationUtils.validar_peticion_lote(request)
+            prioridad = ValidationUtils.validar_prioridad(request.form.get('priority'))
         
-        # Determinar código de estado basado en el tipo de error
-        if "no soportado" in str(e).lower():
-            status_code = 415  # Unsupported Media Type
-        elif "no se recibió" in str(e).lower() or "vacío" in str(e).lower():
-            status_code = 400  # Bad Request
-        elif "solo es compatible" in str(e).lower():
-            status_code = 400  # Bad Request
+        # 3. Guardar los documentos en orden (extrayendo el ZIP si corresponde)
+        huella_lote = None
+        if len(archivos) == 1 and ValidationUtils.es_zip(archivos[0]):
+            documentos_guardados = extraer_zip(archivos[0])
         else:
-            status_code = 500  # Internal Server Error
-            
-        return Response(f"Error: {str(e)}", status=status_code)
+            with etapa("validar"):
+                for archivo in archivos:
+                    ValidationUtils.validar_archivo(archivo)
+            huellas = []
+            for archivo in archivos:
+                _, extension = os.path.splitext(archivo.filename)
+                ruta_archivo, huella = PrintService.guardar_archivo_temporal(archivo)
+                documentos_guardados.append((archivo.filename, ruta_archivo, extension.lower()))
+                huellas.append(huella)
+            huella_lote = hashlib.sha256("".join(huellas).encode("ascii")).hexdigest()
+        
+        # 4. Encolar el lote (salvo que sea un reintento)
+        lote, duplicado = encolar_idempotente(
+            crear_lote(documentos_guardados, request.form.get('printer'), cliente, prioridad),
+            clave_cliente=request.headers.get('Idempotency-Key'),
+            huella=huella_lote
+        )
+        if duplicado:
+            for _, ruta_archivo, _ in documentos_guardados:
+                PrintService.programar_limpieza(ruta_archivo)
+            return respuesta_duplicado(lote)
+        
+        # 5. Respuesta: lote aceptado, con un resultado por documento
+        return respuesta_aceptado(
+            lote,
+            f"Lote de {len(lote.documentos)} documento(s) encolado para impresión",
+            documentos=[documento.a_dict() for documento in lote.documentos]
+        )
+        
+    except Exception as e:
+        print(f"ERROR en /print-batch: {str(e)}")
+        for _, ruta_archivo, _ in documentos_guardados:
+            PrintService.programar_limpieza(ruta_archivo)
+        return respuesta_error(e)
+
+
+@main_bp.route('/uploads', methods=['POST'])
+def crear_subida():
+    """
+    Endpoint que abre una sesión de subida por partes. Recibe un JSON con
+    'filename' y 'size' (bytes) y, opcionalmente, 'sha256', 'printer' y 'priority'.
+    Las partes se envían luego con PUT /uploads/<upload_id>.
+    """
+    cuerpo = request.get_json(silent=True)
+    if not isinstance(cuerpo, dict) or not cuerpo.get('filename'):
+        return Response("Error: El JSON debe contener 'filename' y 'size' (bytes) del archivo a subir.", status=400)
+    
+    try:
+        ValidationUtils.validar_sistema_operativo()
+        prioridad = ValidationUtils.validar_prioridad(cuerpo.get('priority'))
+        if cuerpo.get('printer'):
+            # Un destino inválido se rechaza antes de subir el archivo, no al cerrarlo
+            cola_impresion.resolver_destino(cuerpo['printer'])
+        sesion = sesiones_subida.crear(
+            cuerpo['filename'], cuerpo.get('size'), cliente_actual(),
+            destino=cuerpo.get('printer'), prioridad=prioridad, sha256=cuerpo.get('sha256')
+        )
+        return respuesta_sesion(sesion, 201)
+    
+    except Exception as e:
+        print(f"ERROR en /uploads: {str(e)}")
+        return respuesta_error(e)
+
+
+@main_bp.route('/uploads/<upload_id>', methods=['GET'])
+def estado_subida(upload_id):
+    """
+    Endpoint que informa cuántos bytes de la subida se confirmaron (también en
+    la cabecera Upload-Offset, útil con HEAD); la siguiente parte empieza ahí.
+    """
+    try:
+        return respuesta_sesion(sesiones_subida.obtener(upload_id), 200)
+    except Exception as e:
+        return respuesta_error(e)
+
+
+@main_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def recibir_parte(upload_id):
+    """
+    Endpoint que recibe una parte de la subida. El cuerpo son los bytes indicados
+    en Content-Range ('bytes inicio-fin/total') y la cabecera X-Content-Sha256 lleva
+    el SHA-256 de la parte. La parte se escribe directamente en el archivo temporal.
+    """
+    try:
+        rango = PATRON_CONTENT_RANGE.fullmatch(request.headers.get('Content-Range', '').strip())
+        if rango is None:
+            raise Exception("Falta el campo 'Content-Range' con el formato 'bytes inicio-fin/total'.")
+        sha256_parte = request.headers.get('X-Content-Sha256')
+        if not sha256_parte:
+            raise Exception("Falta el campo 'X-Content-Sha256' con el SHA-256 de la parte.")
+        
+        inicio, fin, total = (int(valor) for valor in rango.groups())
+        sesion = sesiones_subida.recibir_parte(upload_id, inicio, fin, total, request.stream, sha256_parte)
+        return respuesta_sesion(sesion, 200)
+    
+    except Exception as e:
+        print(f"ERROR en /uploads/{upload_id}: {str(e)}")
+        return respuesta_error(e)
+
+
+@main_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def cancelar_subida(upload_id):
+    """
+    Endpoint que descarta una sesión de subida y lo recibido hasta el momento.
+    """
+    try:
+        sesiones_subida.cancelar(upload_id)
+        return Response(status=204)
+    except Exception as e:
+        return respuesta_error(e)
+
+
+@main_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@perfilable
+def completar_subida(upload_id):
+    """
+    Endpoint que cierra una subida completa y la encola como cualquier archivo de
+    /print-pdf (responde igual: 202, Idempotency-Key, deduplicación por contenido).
+    Acepta opcionalmente un JSON con el 'sha256' del archivo completo. Si el
+    trabajo no se puede encolar, la sesión y su archivo se conservan para reintentar.
+    """
+    try:
+        ValidationUtils.validar_sistema_operativo()
+        cliente = cliente_actual()
+        control_admision.verificar(cliente)
+        
+        cuerpo = request.get_json(silent=True) or {}
+        with etapa("validar"):
+            sesion = sesiones_subida.retirar(upload_id, cuerpo.get('sha256') if isinstance(cuerpo, dict) else None,
+                                             confirmar=False)
+        try:
+            respuesta = encolar_archivo(sesion.ruta, sesion.huella(), sesion.nombre_archivo, sesion.destino,
+                                        sesion.cliente, sesion.prioridad, conservar_archivo=True)
+        except Exception:
+            sesiones_subida.devolver(sesion)
+            raise
+        sesiones_subida.confirmar(sesion)
+        return respuesta
+    
+    except Exception as e:
+        print(f"ERROR en /uploads/{upload_id}/complete: {str(e)}")
+        return respuesta_error(e)
+
+
+def respuesta_sesion(sesion, codigo):
+    """
+    Construye la respuesta con el estado de una sesión de subida.
+    
+    Args:
+        sesion (SesionSubida): Sesión de subida
+        codigo (int): Código de estado
+        
+    Returns:
+        tuple: Respuesta JSON (con cabeceras Upload-Offset y Location) y código de estado
+    """
+    datos = sesion.a_dict(sesiones_subida.ttl)
+    datos["url"] = url_for('main.estado_subida', upload_id=sesion.id)
+    respuesta = jsonify(datos)
+    respuesta.headers['Upload-Offset'] = str(sesion.recibido)
+    respuesta.headers['Location'] = datos["url"]
+    return respuesta, codigo
+
+
+@main_bp.route('/templates', methods=['GET'])
+def listar_plantillas():
+    """
+    Endpoint que devuelve los nombres de las plantillas de etiquetas registradas.
+    """
+    return jsonify({"plantillas": registro_plantillas.listar()}), 200
+
+
+@main_bp.route('/templates/<nombre>', methods=['PUT'])
+def registrar_plantilla(nombre):
+    """
+    Endpoint para registrar (o reemplazar) una plantilla de etiqueta.
+    Recibe un JSON con el formato ('txt' o 'pdf') y su contenido o elementos.
+    """
+    definicion = request.get_json(silent=True)
+    if not definicion:
+        return Response("Error: La petición debe contener un cuerpo JSON.", status=400)
+    
+    try:
+        existia = registro_plantillas.registrar(nombre, definicion)
+        return jsonify({"mensaje": f"Plantilla '{nombre}' registrada.", "plantilla": nombre}), 200 if existia else 201
+    
+    except Exception as e:
+        print(f"ERROR en /templates/{nombre}: {str(e)}")
+        return Response(f"Error: {str(e)}", status=codigo_estado_error(e))
+
+
+@main_bp.route('/templates/<nombre>', methods=['DELETE'])
+def eliminar_plantilla(nombre):
+    """
+    Endpoint para eliminar una plantilla de etiqueta registrada.
+    """
+    try:
+        if not registro_plantillas.eliminar(nombre):
+            return jsonify({"error": f"No existe la plantilla '{nombre}'."}), 404
+        return jsonify({"mensaje": f"Plantilla '{nombre}' eliminada."}), 200
+    
+    except Exception as e:
+        print(f"ERROR en /templates/{nombre}: {str(e)}")
+        return Response(f"Error: {str(e)}", status=codigo_estado_error(e))
+
+
+@main_bp.route('/templates/<nombre>/print', methods=['POST'])
+@perfilable
+def imprimir_plantilla(nombre):
+    """
+    Endpoint que genera una etiqueta a partir de una plantilla registrada y los
+    datos recibidos en JSON, y la encola como cualquier otro archivo.
+    """
+    # 1. Validar que la petición contiene los datos de la etiqueta
+    cuerpo = request.get_json(silent=True)
+    if not isinstance(cuerpo, dict) or not isinstance(cuerpo.get('datos'), dict):
+        return Response("Error: El JSON debe contener la clave 'datos' con los campos de la etiqueta.", status=400)
+    
+    try:
+        ValidationUtils.validar_sistema_operativo()
+        cliente = cliente_actual()
+        control_admision.verificar(cliente)
+        with etapa("validar"):
+            prioridad = ValidationUtils.validar_prioridad(cuerpo.get('priority'))
+        
+        # 2. Generar la etiqueta y guardarla como archivo temporal
+        with DURACION_ETAPA.medir(etapa="plantilla"):
+            contenido, extension = registro_plantillas.renderizar(nombre, cuerpo['datos'])
+        ruta_archivo, huella = PrintService.guardar_contenido_temporal(contenido, extension)
+        
+        # 3. Encolar el trabajo (salvo que sea un reintento)
+        try:
+            trabajo, duplicado = encolar_idempotente(
+                TrabajoImpresion(ruta_archivo, extension, f"{nombre}{extension}", cuerpo.get('printer'), cliente,
+                                 prioridad),
+                clave_cliente=request.headers.get('Idempotency-Key'),
+                huella=huella
+            )
+        except Exception:
+            PrintService.programar_limpieza(ruta_archivo)
+            raise
+        
+        if duplicado:
+            PrintService.programar_limpieza(ruta_archivo)
+            return respuesta_duplicado(trabajo)
+        
+        return respuesta_aceptado(trabajo, f"Etiqueta '{nombre}' encolada para impresión")
+    
+    except Exception as e:
+        print(f"ERROR en /templates/{nombre}/print: {str(e)}")
+        return respuesta_error(e)
+
+
+@main_bp.route('/metrics', methods=['GET'])
+def metricas():
+    """
+    Endpoint de métricas en formato de texto de Prometheus: peticiones HTTP,
+    latencia por etapa de impresión, activaciones del respaldo, operaciones
+    WMI y profundidad de las colas.
+    """
+    return Response(registro_metricas.exportar(), status=200, mimetype="text/plain; version=0.0.4")
+
+
+@main_bp.route('/stats', methods=['GET'])
+def estadisticas():
+    """
+    Endpoint que devuelve contadores internos del middleware.
+    """
+    return jsonify({
+        "idempotencia": indice_idempotencia.estadisticas(),
+        "limpieza": limpiador_temporales.estadisticas(),
+        "plantillas": registro_plantillas.estadisticas(),
+        "circuitos": circuitos_impresion.estadisticas(),
+        "almacen": almacen_trabajos.estadisticas(),
+        "eventos": difusor_eventos.estadisticas(),
+        "admision": control_admision.estadisticas(),
+        "subidas": sesiones_subida.estadisticas(),
+        "compresion": registro_compresion.estadisticas(),
+        "perfiles": registro_perfiles.estadisticas()
+    }), 200
+
+
+@main_bp.route('/admin/profiles', methods=['GET'])
+def listar_perfiles():
+    """
+    Endpoint de administración que devuelve los perfiles guardados (del más
+    reciente al más viejo) con la duración de cada etapa. Requiere la cabecera
+    X-Admin-Key; sin clave configurada responde 404.
+    """
+    try:
+        verificar_admin()
+        return jsonify({"perfiles": registro_perfiles.listar()}), 200
+    
+    except Exception as e:
+        return Response(f"Error: {str(e)}", status=codigo_estado_error(e))
+
+
+@main_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+def descargar_perfil(profile_id):
+    """
+    Endpoint de administración que descarga un perfil. El parámetro 'formato'
+    elige entre 'texto' (resumen legible, predeterminado), 'pstats' (archivo
+    para pstats o snakeviz) y 'colapsado' (pilas muestreadas para un flame graph).
+    """
+    try:
+        verificar_admin()
+        formato = request.args.get('formato', FORMATOS_PERFIL[0])
+        contenido, tipo = registro_perfiles.obtener(profile_id).exportar(formato)
+        extension = {"pstats": "prof", "colapsado": "folded"}.get(formato, "txt")
+        return Response(contenido, status=200, mimetype=tipo, headers={
+            'Content-Disposition': f'attachment; filename="perfil-{profile_id}.{extension}"'
+        })
+    
+    except Exception as e:
+        return Response(f"Error: {str(e)}", status=codigo_estado_error(e))
+
+
+def verificar_admin():
+    """
+    Raises:
+        Exception: Si los endpoints de administración están deshabilitados o falta la clave
+    """
+    if not registro_perfiles.clave_admin:
+        raise Exception("El recurso no existe: los endpoints de administración no están habilitados.")
+    if not registro_perfiles.es_admin(request.headers):
+        raise Exception("Acceso no autorizado: falta la clave de administración o no es correcta.")
+
+
+def respuesta_aceptado(trabajo, mensaje, **extra):
+    """
+    Construye la respuesta 202 para un trabajo recién encolado.
+    
+    Args:
+        trabajo (TrabajoImpresion): Trabajo encolado
+        mensaje (str): Mensaje para el cliente
+        **extra: Campos adicionales de la respuesta
+        
+    Returns:
+        tuple: Respuesta JSON (con cabecera Location) y código de estado 202
+    """
+    url_estado = url_for('main.estado_trabajo', job_id=trabajo.id)
+    respuesta = jsonify(dict({
+        "mensaje": mensaje,
+        "job_id": trabajo.id,
+        "impresora": trabajo.impresora,
+        "estado": trabajo.estado,
+        "url_estado": url_estado
+    }, **extra))
+    respuesta.headers['Location'] = url_estado
+    return respuesta, 202
+
+
+def respuesta_duplicado(original):
+    """
+    Construye la respuesta para un envío que repite uno reciente: devuelve el
+    trabajo original sin volver a imprimir.
+    
+    Args:
+        original (dict): Datos públicos del trabajo original (ver encolar_idempotente)
+        
+    Returns:
+        tuple: Respuesta JSON y código de estado 200
+    """
+    datos = dict(original)
+    datos["duplicado"] = True
+    datos["url_estado"] = url_for('main.estado_trabajo', job_id=original["job_id"])
+    
+    respuesta = jsonify(datos)
+    respuesta.headers['Idempotent-Replayed'] = 'true'
+    respuesta.headers['Location'] = datos["url_estado"]
+    return respuesta, 200
+
+
+def codigo_estado_error(e):
+    """
+    Determina el código de estado HTTP según el mensaje de error.
+    
+    Args:
+        e (Exception): Error producido al procesar la petición
+        
+    Returns:
+        int: Código de estado HTTP
+    """
+    mensaje = str(e).lower()
+    
+    if "no soportado" in mensaje:
+        return 415  # Unsupported Media Type
+    elif "no se recibió" in mensaje or "vacío" in mensaje:
+        return 400  # Bad Request
+    elif "falta el campo" in mensaje:
+        return 400  # Bad Request
+    elif "solo es compatible" in mensaje or "no es válid" in mensaje or "no son válid" in mensaje:
+        return 400  # Bad Request
+    elif "excede" in mensaje:
+        return 413  # Payload Too Large
+    elif "no existe" in mensaje:
+        return 404  # Not Found
+    elif "no autorizado" in mensaje:
+        return 403  # Forbidden
+    elif "ya se usó con otro contenido" in mensaje:
+        return 422  # Unprocessable Entity
+    elif "saturado" in mensaje or "está llena" in mensaje:
+        return 429  # Too Many Requests
+    elif "se esperaba el byte" in mensaje or "ya está recibiendo" in mensaje or "está incompleta" in mensaje:
+        return 409  # Conflict
+    elif "todavía se está encolando" in mensaje:
+        return 409  # Conflict
+    elif "no está disponible" in mensaje:
+        return 503  # Service Unavailable
+    elif "no hay impresoras disponibles" in mensaje:
+        return 503  # Service Unavailable
+    else:
+        return 500  # Internal Server Error
+
+
+def respuesta_error(e):
+    """
+    Construye la respuesta de error de una petición de impresión. Los rechazos
+    por saturación incluyen la cabecera Retry-After.
+    
+    Args:
+        e (Exception): Error producido al procesar la petición
+        
+    Returns:
+        Response: Respuesta de texto con el código de estado correspondiente
+    """
+    respuesta = Response(f"Error: {str(e)}", status=codigo_estado_error(e))
+    if isinstance(e, SaturacionServicio):
+        respuesta.headers['Retry-After'] = str(e.reintentar_en)
+    return respuesta
+
+
+def cliente_actual():
+    """
+    Returns:
+        str: Cliente de la petición en curso (nombre de su clave de API o su IP)
+    """
+    return identificar_cliente(request.headers, request.remote_addr)
+
+
+@main_bp.route('/jobs/<job_id>', methods=['GET'])
+def estado_trabajo(job_id):
+    """
+    Endpoint que devuelve el estado de un trabajo de impresión encolado.
+    """
+    # Los trabajos que ya salieron del historial en memoria (o de antes de un reinicio) se buscan en el almacén
+    datos = cola_impresion.estado_trabajo(job_id)
+    if datos is None:
+        return jsonify({"error": f"No existe el trabajo '{job_id}'."}), 404
+    
+    if request.args.get('transiciones') == '1':
+        datos["transiciones"] = almacen_trabajos.transiciones(job_id)
+    return jsonify(datos), 200
+
+
+@main_bp.route('/jobs', methods=['GET'])
+def consultar_trabajos():
+    """
+    Endpoint que busca trabajos en el almacén por estado, impresora y fecha de
+    creación (ej. /jobs?estado=fallido&impresora=Zebra&desde=1700000000).
+    """
+    try:
+        estado = request.args.get('estado')
+        if estado is not None and estado not in ESTADOS_TRABAJO:
+            raise Exception(f"El estado '{estado}' no es válido. Valores posibles: {', '.join(ESTADOS_TRABAJO)}.")
+        try:
+            desde = float(request.args['desde']) if 'desde' in request.args else None
+            hasta = float(request.args['hasta']) if 'hasta' in request.args else None
+            limite = int(request.args.get('limite', 100))
+        except ValueError:
+            raise Exception("Los parámetros 'desde', 'hasta' y 'limite' no son válidos: deben ser numéricos.")
+        limite = max(1, min(limite, MAX_RESULTADOS_CONSULTA))
+        
+        trabajos = almacen_trabajos.consultar(estado, request.args.get('impresora'), desde, hasta, limite)
+        return jsonify({"trabajos": trabajos, "cantidad": len(trabajos)}), 200
+        
+    except Exception as e:
+        print(f"ERROR en /jobs: {str(e)}")
+        return Response(f"Error: {str(e)}", status=codigo_estado_error(e))
+
+
+@main_bp.route('/events', methods=['GET'])
+def eventos_trabajos():
+    """
+    Endpoint de Server-Sent Events con los cambios de estado de los trabajos
+    (encolado, imprimiendo, respaldo, completado, fallido). Con ?job_id= envía
+    primero el estado actual del trabajo y cierra el stream cuando termina; con
+    ?printer= (o su alias ?impresora=) solo envía los trabajos de esa impresora;
+    sin filtros, todos.
+    """
+    try:
+        job_id = request.args.get('job_id')
+        impresora = request.args.get('printer') or request.args.get('impresora')
+        suscripcion = difusor_eventos.suscribir(job_id, impresora, maximo=MAX_SUSCRIPTORES_EVENTOS)
+        
+        # El estado inicial se lee después de suscribirse para no perder un cambio intermedio
+        inicial = None
+        if job_id:
+            inicial = cola_impresion.estado_trabajo(job_id)
+            if inicial is None:
+                suscripcion.cancelar()
+                raise Exception(f"No existe el trabajo '{job_id}'.")
+        
+    except Exception as e:
+        print(f"ERROR en /events: {str(e)}")
+        return Response(f"Error: {str(e)}", status=codigo_estado_error(e))
+    
+    return Response(
+        flujo_eventos(suscripcion, inicial),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
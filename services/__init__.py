@@ -4,7 +4,39 @@
 Inicializador del paquete de servicios.
 """
 
+from .backends import BackendImpresion, BackendSimulado, crear_backend
+from .inventario import CacheInventario
+from .limpieza import LimpiadorTemporales, limpiador_temporales
+from .admision import ControlAdmision, SaturacionServicio, control_admision, identificar_cliente
+from .almacen_trabajos import AlmacenTrabajos, almacen_trabajos
+from .eventos import DifusorEventos, difusor_eventos
+from .circuitos import RegistroCircuitos, circuitos_impresion
 from .print_service import PrintService
+from .cola_impresion import ColaImpresion, TrabajoImpresion, cola_impresion
+from .idempotencia import IndiceIdempotencia, encolar_idempotente, indice_idempotencia
+from .lotes import TrabajoLote, TrabajoPdfMasivo, crear_lote, dividir_pdf, extraer_zip
+from .subidas import ArchivoEntrante, PeticionImpresion
+from .compresion import DescompresionPeticiones, RegistroCompresion, registro_compresion
+from .sesiones_subida import RegistroSesionesSubida, SesionSubida, sesiones_subida
+from .plantillas import RegistroPlantillas, registro_plantillas
+from .perfilado import RegistroPerfiles, Traza, registro_perfiles, etapa
 
 # Hacer disponibles las clases principales del paquete
-__all__ = ['PrintService']
+__all__ = [
+    'PrintService',
+    'BackendImpresion', 'BackendSimulado', 'crear_backend',
+    'CacheInventario',
+    'LimpiadorTemporales', 'limpiador_temporales',
+    'ControlAdmision', 'SaturacionServicio', 'control_admision', 'identificar_cliente',
+    'AlmacenTrabajos', 'almacen_trabajos',
+    'DifusorEventos', 'difusor_eventos',
+    'RegistroCircuitos', 'circuitos_impresion',
+    'ColaImpresion', 'TrabajoImpresion', 'cola_impresion',
+    'IndiceIdempotencia', 'encolar_idempotente', 'indice_idempotencia',
+    'TrabajoLote', 'TrabajoPdfMasivo', 'crear_lote', 'dividir_pdf', 'extraer_zip',
+    'ArchivoEntrante', 'PeticionImpresion',
+    'DescompresionPeticiones', 'RegistroCompresion', 'registro_compresion',
+    'RegistroSesionesSubida', 'SesionSubida', 'sesiones_subida',
+    'RegistroPlantillas', 'registro_plantillas',
+    'RegistroPerfiles', 'Traza', 'registro_perfiles', 'etapa',
+]
@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+
+"""
+Control de admisión y reparto justo de las impresoras entre clientes.
+Limita los trabajos en vuelo (en cola o imprimiéndose) en total y por cliente,
+y rechaza enseguida con 429 y un Retry-After estimado cuando se superan, en
+lugar de aceptar trabajo sin límite. Las colas de impresora entregan los
+trabajos por clase de prioridad y, dentro de cada una, por encolamiento justo
+ponderado (WFQ), de modo que un cliente que envía cientos de trabajos no deja
+esperando a los demás.
+"""
+
+import heapq
+import itertools
+import math
+import queue
+import threading
+import time
+
+from config import (
+    MAX_TRABAJOS_EN_VUELO,
+    MAX_TRABAJOS_POR_CLIENTE,
+    CABECERA_CLAVE_CLIENTE,
+    CLAVES_CLIENTES,
+    PESOS_CLIENTES,
+    MAX_REINTENTAR_EN,
+    PRIORIDADES,
+    PRIORIDAD_PREDETERMINADA,
+    ENVEJECIMIENTO_PRIORIDAD
+)
+from .metricas import registro_metricas
+
+# Peso relativo de las estimaciones nuevas en los promedios móviles
+ALFA_PROMEDIO = 0.2
+
+RECHAZOS_ADMISION = registro_metricas.contador(
+    "middleware_admision_rechazos_total",
+    "Trabajos rechazados con 429 por motivo (global, cliente, cola_llena).",
+    ("motivo",)
+)
+
+
+class SaturacionServicio(Exception):
+    """Rechazo por saturación; reintentar_en indica los segundos sugeridos (cabecera Retry-After)."""
+
+    def __init__(self, mensaje, reintentar_en):
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en
+
+
+def identificar_cliente(cabeceras, ip):
+    """
+    Identifica al cliente de una petición: por su clave de API si es una de
+    CLAVES_CLIENTES y, si no, por su IP. Las claves desconocidas se ignoran para
+    que nadie evite su límite inventando claves.
+
+    Args:
+        cabeceras (Mapping): Cabeceras de la petición
+        ip (str): Dirección IP del cliente
+
+    Returns:
+        str: Identificador del cliente
+    """
+    clave = cabeceras.get(CABECERA_CLAVE_CLIENTE)
+    if clave and clave in CLAVES_CLIENTES:
+        return CLAVES_CLIENTES[clave]
+    return ip or "desconocido"
+
+
+class ControlAdmision:
+    """Cuenta los trabajos en vuelo por cliente y decide si se admite uno nuevo."""
+
+    def __init__(self, max_en_vuelo=MAX_TRABAJOS_EN_VUELO, max_por_cliente=MAX_TRABAJOS_POR_CLIENTE,
+                 pesos=None, max_reintentar_en=MAX_REINTENTAR_EN):
+        """
+        Args:
+            max_en_vuelo (int): Trabajos en vuelo máximos entre todos los clientes
+            max_por_cliente (int): Trabajos en vuelo máximos de un mismo cliente
+            pesos (dict): Peso de cada cliente en el reparto (1 si no figura)
+            max_reintentar_en (int): Segundos máximos sugeridos en Retry-After
+        """
+        self.max_en_vuelo = max_en_vuelo
+        self.max_por_cliente = max_por_cliente
+        self.pesos = dict(PESOS_CLIENTES if pesos is None else pesos)
+        self.max_reintentar_en = max_reintentar_en
+        self._candado = threading.Lock()
+        self._en_vuelo = {}
+        self._admitidos = {}
+        # Intervalo medio entre finalizaciones mientras hay trabajos en vuelo
+        self._intervalo_medio = None
+        self._ultima_salida = None
+        self._ocupado_desde = None
+        self._espera_media = {}
+        self._contadores = {
+            "admitidos": 0, "rechazados_global": 0, "rechazados_cliente": 0, "rechazados_cola_llena": 0,
+            "espera_maxima": 0.0
+        }
+
+    def peso(self, cliente):
+        """
+        Returns:
+            float: Peso del cliente en el reparto de las impresoras
+        """
+        return self.pesos.get(cliente, 1)
+
+    def verificar(self, cliente):
+        """
+        Comprueba sin reservar nada si se admitiría un trabajo del cliente, para
+        rechazar la petición antes de recibir y guardar sus archivos.
+
+        Raises:
+            SaturacionServicio: Si se superó el límite global o el del cliente
+        """
+        with self._candado:
+            self._comprobar(cliente)
+
+    def admitir(self, trabajo):
+        """
+        Reserva un lugar para el trabajo. Los trabajos sin cliente (recuperados
+        tras un reinicio) se cuentan pero nunca se rechazan.
+
+        Raises:
+            SaturacionServicio: Si se superó el límite global o el del cliente
+        """
+        cliente = trabajo.cliente
+        with self._candado:
+            self._comprobar(cliente)
+            if not self._admitidos:
+                self._ocupado_desde = time.monotonic()
+            self._admitidos[trabajo.id] = cliente
+            self._en_vuelo[cliente] = self._en_vuelo.get(cliente, 0) + 1
+            self._contadores["admitidos"] += 1
+
+    def _comprobar(self, cliente):
+        if cliente is None:
+            return
+        total = len(self._admitidos)
+        if total >= self.max_en_vuelo:
+            self._rechazar("global")
+            raise SaturacionServicio(
+                f"El servicio está saturado: hay {total} trabajos en vuelo (máximo {self.max_en_vuelo}). "
+                "Intenta nuevamente más tarde.",
+                self._estimar_espera(total - self.max_en_vuelo + 1)
+            )
+        del_cliente = self._en_vuelo.get(cliente, 0)
+        if del_cliente >= self.max_por_cliente:
+            self._rechazar("cliente")
+            raise SaturacionServicio(
+                f"El servicio está saturado para el cliente '{cliente}': tiene {del_cliente} trabajos en vuelo "
+                f"(máximo {self.max_por_cliente}). Intenta nuevamente más tarde.",
+                self._estimar_espera(del_cliente - self.max_por_cliente + 1, cliente)
+            )
+
+    def _rechazar(self, motivo):
+        self._contadores[f"rechazados_{motivo}"] += 1
+        RECHAZOS_ADMISION.inc(motivo=motivo)
+
+    def _estimar_espera(self, necesarios, cliente=None):
+        """
+        Segundos hasta que terminen `necesarios` trabajos. Para un cliente se
+        considera que recibe la parte de las impresoras que le da su peso.
+
+        Returns:
+            int: Segundos sugeridos para Retry-After
+        """
+        intervalo = self._intervalo_medio or 1.0
+        if cliente is not None:
+            peso = self.peso(cliente)
+            suma_pesos = sum(self.peso(activo) for activo in self._en_vuelo if activo is not None)
+            intervalo *= max(suma_pesos, peso) / peso
+        return int(min(max(math.ceil(necesarios * intervalo), 1), self.max_reintentar_en))
+
+    def rechazo_cola_llena(self, trabajo, pendientes):
+        """
+        Libera el lugar de un trabajo que no entró en la cola de su impresora.
+
+        Args:
+            trabajo (TrabajoImpresion): Trabajo rechazado
+            pendientes (int): Trabajos esperando en esa cola
+
+        Returns:
+            SaturacionServicio: Error a lanzar, con el tiempo estimado para reintentar
+        """
+        self._quitar(trabajo)
+        with self._candado:
+            self._rechazar("cola_llena")
+            reintentar_en = self._estimar_espera(1)
+        return SaturacionServicio(
+            f"La cola de impresión de '{trabajo.impresora}' está llena ({pendientes} trabajos pendientes). "
+            "Intenta nuevamente más tarde.",
+            reintentar_en
+        )
+
+    def registrar_espera(self, trabajo):
+        """Registra cuánto esperó en cola un trabajo que empieza a imprimirse."""
+        espera = trabajo.iniciado - trabajo.creado
+        with self._candado:
+            anterior = self._espera_media.get(trabajo.cliente)
+            self._espera_media[trabajo.cliente] = (
+                espera if anterior is None else anterior + ALFA_PROMEDIO * (espera - anterior)
+            )
+            self._contadores["espera_maxima"] = max(self._contadores["espera_maxima"], espera)
+
+    def liberar(self, trabajo):
+        """Libera el lugar de un trabajo terminado (no hace nada si no se había admitido)."""
+        if not self._quitar(trabajo):
+            return
+        ahora = time.monotonic()
+        with self._candado:
+            referencia = max(self._ultima_salida or 0.0, self._ocupado_desde or 0.0)
+            intervalo = ahora - referencia
+            self._intervalo_medio = (
+                intervalo if self._intervalo_medio is None
+                else self._intervalo_medio + ALFA_PROMEDIO * (intervalo - self._intervalo_medio)
+            )
+            self._ultima_salida = ahora
+
+    def _quitar(self, trabajo):
+        with self._candado:
+            if trabajo.id not in self._admitidos:
+                return False
+            cliente = self._admitidos.pop(trabajo.id)
+            self._en_vuelo[cliente] -= 1
+            if not self._en_vuelo[cliente]:
+                del self._en_vuelo[cliente]
+                self._espera_media.pop(cliente, None)
+            return True
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Trabajos en vuelo, rechazos por motivo y espera en cola de cada cliente activo
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+            estadisticas.update({
+                "en_vuelo": len(self._admitidos),
+                "max_en_vuelo": self.max_en_vuelo,
+                "max_por_cliente": self.max_por_cliente,
+                "intervalo_medio_segundos": self._intervalo_medio,
+                "clientes": {
+                    str(cliente): {
+                        "en_vuelo": cantidad,
+                        "peso": self.peso(cliente),
+                        "espera_media_segundos": self._espera_media.get(cliente)
+                    }
+                    for cliente, cantidad in self._en_vuelo.items()
+                }
+            })
+        return estadisticas
+
+
+class _ReparticionJusta:
+    """
+    Trabajos pendientes de una clase de prioridad, en orden de encolamiento justo
+    ponderado: a cada trabajo se le asigna un tiempo virtual de finalización que
+    avanza 1/peso por cada trabajo del mismo cliente, y se entrega el menor.
+    Aparte se lleva el instante de encolado de cada uno, para saber cuánto lleva
+    esperando el más antiguo.
+    """
+
+    def __init__(self):
+        self._monticulo = []
+        # (encolado, secuencia) de los pendientes; los ya entregados se descartan al llegar a la cima
+        self._antiguedad = []
+        self._entregados = set()
+        self._fin_cliente = {}
+        self._virtual = 0.0
+        self._secuencia = itertools.count()
+
+    def __len__(self):
+        return len(self._monticulo)
+
+    def poner(self, trabajo, peso, encolado):
+        """
+        Args:
+            trabajo (TrabajoImpresion): Trabajo a encolar
+            peso (float): Peso de su cliente
+            encolado (float): Instante (time.monotonic) en que entró a la cola por primera vez
+        """
+        cliente = trabajo.cliente
+        # Un cliente que recién llega no acumula crédito por el tiempo que no envió nada
+        inicio = max(self._virtual, self._fin_cliente.get(cliente, 0.0))
+        fin = inicio + 1.0 / peso
+        self._fin_cliente[cliente] = fin
+        secuencia = next(self._secuencia)
+        heapq.heappush(self._monticulo, (fin, secuencia, encolado, trabajo))
+        heapq.heappush(self._antiguedad, (encolado, secuencia))
+
+    def encolado_mas_antiguo(self):
+        """
+        Returns:
+            float: Instante (time.monotonic) en que se encoló el trabajo que más lleva esperando
+        """
+        while self._antiguedad[0][1] in self._entregados:
+            self._entregados.discard(heapq.heappop(self._antiguedad)[1])
+        return self._antiguedad[0][0]
+
+    def sacar(self):
+        """
+        Returns:
+            tuple: (trabajo, instante en que se encoló)
+        """
+        fin, secuencia, encolado, trabajo = heapq.heappop(self._monticulo)
+        self._entregados.add(secuencia)
+        self._virtual = fin
+        if self._fin_cliente.get(trabajo.cliente) == fin:
+            # Era el último trabajo pendiente del cliente
+            del self._fin_cliente[trabajo.cliente]
+        return trabajo, encolado
+
+
+class ColaJusta(queue.Queue):
+    """
+    queue.Queue que entrega primero los trabajos de la clase de prioridad más
+    alta y, dentro de cada clase, por encolamiento justo ponderado entre clientes.
+    Cada `envejecimiento` segundos de espera un trabajo sube una clase, de modo
+    que los de prioridad baja nunca esperan indefinidamente.
+    """
+
+    def __init__(self, maxsize=0, peso=lambda cliente: 1, clases=PRIORIDADES,
+                 envejecimiento=ENVEJECIMIENTO_PRIORIDAD):
+        """
+        Args:
+            maxsize (int): Trabajos pendientes máximos
+            peso (callable): Devuelve el peso de un cliente
+            clases (tuple): Prioridades de la más a la menos urgente
+            envejecimiento (float): Segundos de espera tras los que un trabajo sube una clase
+        """
+        self._peso = peso
+        self._niveles = {clase: nivel for nivel, clase in enumerate(clases)}
+        self._envejecimiento = envejecimiento
+        super().__init__(maxsize)
+
+    def devolver(self, trabajo, encolado=None):
+        """
+        Vuelve a poner un trabajo ya admitido (por ejemplo, el resto de un trabajo
+        masivo tras imprimir un tramo) aunque la cola esté llena.
+
+        Args:
+            trabajo (TrabajoImpresion): Trabajo a devolver
+            encolado (float): Instante (time.monotonic) en que se encoló originalmente;
+                se conserva para que siga envejeciendo en lugar de volver a empezar
+        """
+        with self.mutex:
+            self._poner(trabajo, time.monotonic() if encolado is None else encolado)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _init(self, maxsize):
+        self._clases = [_ReparticionJusta() for _ in self._niveles]
+
+    def _qsize(self):
+        return sum(len(clase) for clase in self._clases)
+
+    def _put(self, trabajo):
+        self._poner(trabajo, time.monotonic())
+
+    def _poner(self, trabajo, encolado):
+        nivel = self._niveles.get(trabajo.prioridad, self._niveles.get(PRIORIDAD_PREDETERMINADA, 0))
+        self._clases[nivel].poner(trabajo, self._peso(trabajo.cliente), encolado)
+
+    def _get(self):
+        # Prioridad efectiva de cada clase: su nivel menos lo que subió por esperar su trabajo más antiguo
+        ahora = time.monotonic()
+        elegida, mejor = None, None
+        for nivel, clase in enumerate(self._clases):
+            if not clase:
+                continue
+            efectiva = nivel - (ahora - clase.encolado_mas_antiguo()) / self._envejecimiento
+            # Ante empate gana la clase más urgente
+            if mejor is None or efectiva < mejor:
+                elegida, mejor = clase, efectiva
+        trabajo, encolado = elegida.sacar()
+        # Si vuelve a la cola entre tramos, lo hace con este instante (ver devolver)
+        trabajo.encolado = encolado
+        return trabajo
+
+
+# Instancia compartida por toda la aplicación
+control_admision = ControlAdmision()
+
+registro_metricas.medidor(
+    "middleware_admision_en_vuelo",
+    "Trabajos admitidos que todavía no terminaron (en cola o imprimiéndose).",
+    (),
+    lambda: [((), control_admision.estadisticas()["en_vuelo"])]
+)
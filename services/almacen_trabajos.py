@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+"""
+Almacén persistente de trabajos de impresión (SQLite en modo WAL).
+Registra cada trabajo y sus cambios de estado para poder consultarlos en bloque
+y reanudar los que quedaron sin terminar tras un reinicio o un cierre
+inesperado. Las escrituras las hace un único hilo que agrupa en una sola
+transacción todo lo que se acumuló mientras confirmaba la anterior, por lo que
+el almacén no frena a los trabajadores de la cola.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from config import RUTA_ALMACEN_TRABAJOS, MAX_LOTE_ALMACEN, RETENCION_ALMACEN_TRABAJOS, INTERVALO_PURGA_ALMACEN
+from .metricas import registro_metricas
+
+# Columnas de la tabla de trabajos, en el orden de a_registro()
+COLUMNAS = (
+    "job_id", "tipo", "archivo", "destino", "impresora", "estado", "metodo", "error",
+    "creado", "iniciado", "finalizado", "ruta_archivo", "extension", "documentos", "prioridad"
+)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    job_id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    archivo TEXT,
+    destino TEXT,
+    impresora TEXT,
+    estado TEXT NOT NULL,
+    metodo TEXT,
+    error TEXT,
+    creado REAL NOT NULL,
+    iniciado REAL,
+    finalizado REAL,
+    ruta_archivo TEXT,
+    extension TEXT,
+    documentos TEXT,
+    prioridad TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_impresora_estado ON trabajos (impresora, estado, creado);
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado);
+CREATE INDEX IF NOT EXISTS idx_trabajos_creado ON trabajos (creado);
+CREATE INDEX IF NOT EXISTS idx_trabajos_terminado ON trabajos (COALESCE(finalizado, creado));
+CREATE TABLE IF NOT EXISTS transiciones (
+    job_id TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    instante REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transiciones_trabajo ON transiciones (job_id, instante);
+"""
+
+# Campos que se devuelven al cliente (el resto solo sirve para reanudar el trabajo)
+CAMPOS_PUBLICOS = ("job_id", "archivo", "destino", "impresora", "prioridad", "estado", "metodo", "error",
+                   "creado", "iniciado", "finalizado")
+CAMPOS_PUBLICOS_DOCUMENTO = ("indice", "archivo", "estado", "metodo", "error")
+
+
+class AlmacenTrabajos:
+    """Registro de trabajos en SQLite con un hilo escritor que agrupa las transacciones."""
+
+    def __init__(self, ruta=RUTA_ALMACEN_TRABAJOS, max_lote=MAX_LOTE_ALMACEN,
+                 retencion=RETENCION_ALMACEN_TRABAJOS, intervalo_purga=INTERVALO_PURGA_ALMACEN):
+        """
+        Args:
+            ruta (str): Archivo de la base de datos
+            max_lote (int): Escrituras máximas por transacción
+            retencion (float): Segundos que se conservan los trabajos terminados
+            intervalo_purga (float): Segundos entre purgas hechas por el hilo escritor
+        """
+        self.ruta = ruta
+        self.max_lote = max_lote
+        self.retencion = retencion
+        self.intervalo_purga = intervalo_purga
+        self._operaciones = queue.Queue()
+        self._hilo = None
+        self._candado = threading.Lock()
+        self._local = threading.local()
+        self._contadores = {"escrituras": 0, "transacciones": 0, "errores": 0, "perdidas": 0, "purgados": 0}
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL no pierde datos si el proceso se cae (solo ante un corte de energía)
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        return conexion
+
+    def iniciar(self):
+        """Crea las tablas si no existen y arranca el hilo escritor."""
+        with self._candado:
+            if self._hilo is not None:
+                return
+            conexion = self._conectar()
+            try:
+                conexion.executescript(ESQUEMA)
+                # Bases creadas antes de que existieran las prioridades
+                columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(trabajos)")}
+                if "prioridad" not in columnas:
+                    conexion.execute("ALTER TABLE trabajos ADD COLUMN prioridad TEXT")
+            finally:
+                conexion.close()
+            self._hilo = threading.Thread(target=self._bucle_escritor, name="almacen-trabajos", daemon=True)
+            self._hilo.start()
+        print(f"Almacén de trabajos: {self.ruta}")
+
+    def guardar(self, trabajo, transicion=True):
+        """
+        Programa la escritura del estado actual de un trabajo. No espera a que se confirme.
+
+        Args:
+            trabajo (TrabajoImpresion): Trabajo a registrar
+            transicion (bool): Registrar también el cambio de estado en el historial
+        """
+        if self._hilo is None:
+            return
+        registro = trabajo.a_registro()
+        fila = tuple(
+            json.dumps(registro[columna]) if columna == "documentos" and registro[columna] is not None
+            else registro[columna]
+            for columna in COLUMNAS
+        )
+        self._operaciones.put(("guardar", fila, (trabajo.id, trabajo.estado, time.time()) if transicion else None))
+
+    def eliminar(self, job_id):
+        """Programa la eliminación de un trabajo (por ejemplo, si no se pudo encolar)."""
+        if self._hilo is not None:
+            self._operaciones.put(("eliminar", job_id, None))
+
+    def vaciar(self, timeout=None):
+        """
+        Espera a que se confirmen todas las escrituras programadas hasta ahora.
+
+        Args:
+            timeout (float): Segundos máximos de espera (None para esperar sin límite)
+
+        Returns:
+            bool: True si se confirmaron dentro del tiempo
+        """
+        if self._hilo is None:
+            return True
+        confirmado = threading.Event()
+        self._operaciones.put(("aviso", confirmado, None))
+        return confirmado.wait(timeout)
+
+    def _bucle_escritor(self):
+        """
+        Confirma en una transacción todas las escrituras acumuladas, hasta max_lote.
+        Cada intervalo_purga segundos elimina además los trabajos vencidos, así la
+        retención se cumple aunque el servidor no se reinicie.
+        """
+        conexion = self._conectar()
+        proxima_purga = time.monotonic() + self.intervalo_purga
+        while True:
+            if time.monotonic() >= proxima_purga:
+                self._purgar_periodicamente(conexion)
+                proxima_purga = time.monotonic() + self.intervalo_purga
+            try:
+                operaciones = [self._operaciones.get(timeout=max(proxima_purga - time.monotonic(), 0))]
+            except queue.Empty:
+                continue
+            while len(operaciones) < self.max_lote:
+                try:
+                    operaciones.append(self._operaciones.get_nowait())
+                except queue.Empty:
+                    break
+
+            avisos = [dato for tipo, dato, _ in operaciones if tipo == "aviso"]
+            escrituras = [operacion for operacion in operaciones if operacion[0] != "aviso"]
+            if escrituras:
+                self._escribir(conexion, escrituras)
+            for confirmado in avisos:
+                confirmado.set()
+
+    def _escribir(self, conexion, escrituras):
+        """
+        Confirma un grupo de escrituras en una transacción. Si falla (por ejemplo,
+        la base bloqueada por otro proceso) se reintenta una vez; si vuelve a
+        fallar, los cambios se pierden y se cuentan en "perdidas".
+        """
+        for intento in range(2):
+            try:
+                self._confirmar(conexion, escrituras)
+                resultado = "transacciones"
+                break
+            except Exception as e:
+                if conexion.in_transaction:
+                    conexion.execute("ROLLBACK")
+                print(f"ADVERTENCIA: No se pudieron guardar {len(escrituras)} cambio(s) de trabajos"
+                      f"{' (se reintenta)' if intento == 0 else ''}. Error: {e}")
+                with self._candado:
+                    self._contadores["errores"] += 1
+        else:
+            resultado = "perdidas"
+
+        with self._candado:
+            if resultado == "transacciones":
+                self._contadores["transacciones"] += 1
+                self._contadores["escrituras"] += len(escrituras)
+            else:
+                self._contadores["perdidas"] += len(escrituras)
+
+    @staticmethod
+    def _confirmar(conexion, escrituras):
+        marcadores = ", ".join("?" for _ in COLUMNAS)
+        conexion.execute("BEGIN")
+        for tipo, dato, transicion in escrituras:
+            if tipo == "guardar":
+                conexion.execute(f"INSERT OR REPLACE INTO trabajos ({', '.join(COLUMNAS)}) VALUES ({marcadores})", dato)
+                if transicion is not None:
+                    conexion.execute("INSERT INTO transiciones (job_id, estado, instante) VALUES (?, ?, ?)", transicion)
+            else:
+                conexion.execute("DELETE FROM trabajos WHERE job_id = ?", (dato,))
+                conexion.execute("DELETE FROM transiciones WHERE job_id = ?", (dato,))
+        conexion.execute("COMMIT")
+
+    def _lector(self):
+        """
+        Returns:
+            sqlite3.Connection: Conexión de lectura del hilo actual (con WAL no bloquea al escritor)
+        """
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = self._conectar()
+            conexion.row_factory = sqlite3.Row
+            self._local.conexion = conexion
+        return conexion
+
+    @staticmethod
+    def _a_registro(fila):
+        registro = dict(fila)
+        if registro["documentos"] is not None:
+            registro["documentos"] = json.loads(registro["documentos"])
+        return registro
+
+    @staticmethod
+    def _a_dict_publico(registro):
+        datos = {campo: registro[campo] for campo in CAMPOS_PUBLICOS}
+        if registro["documentos"] is not None:
+            datos["documentos"] = [
+                {campo: documento[campo] for campo in CAMPOS_PUBLICOS_DOCUMENTO}
+                for documento in registro["documentos"]
+            ]
+        return datos
+
+    def obtener(self, job_id):
+        """
+        Args:
+            job_id (str): Identificador del trabajo
+
+        Returns:
+            dict: Datos públicos del trabajo, o None si no está registrado
+        """
+        if self._hilo is None:
+            return None
+        fila = self._lector().execute("SELECT * FROM trabajos WHERE job_id = ?", (job_id,)).fetchone()
+        return self._a_dict_publico(self._a_registro(fila)) if fila is not None else None
+
+    def transiciones(self, job_id):
+        """
+        Returns:
+            list: Cambios de estado del trabajo en orden ({'estado', 'instante'})
+        """
+        if self._hilo is None:
+            return []
+        filas = self._lector().execute(
+            "SELECT estado, instante FROM transiciones WHERE job_id = ? ORDER BY instante, rowid", (job_id,)
+        ).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def consultar(self, estado=None, impresora=None, desde=None, hasta=None, limite=100):
+        """
+        Busca trabajos por estado, impresora y fecha de creación usando los índices.
+
+        Args:
+            estado (str): Estado de los trabajos, o None para todos
+            impresora (str): Impresora de los trabajos, o None para todas
+            desde (float): Creados a partir de este instante (epoch), o None
+            hasta (float): Creados antes de este instante (epoch), o None
+            limite (int): Trabajos máximos a devolver
+
+        Returns:
+            list: Datos públicos de los trabajos, del más reciente al más antiguo
+        """
+        if self._hilo is None:
+            return []
+        condiciones, parametros = [], []
+        for condicion, valor in (("estado = ?", estado), ("impresora = ?", impresora),
+                                 ("creado >= ?", desde), ("creado < ?", hasta)):
+            if valor is not None:
+                condiciones.append(condicion)
+                parametros.append(valor)
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        filas = self._lector().execute(
+            f"SELECT * FROM trabajos {donde} ORDER BY creado DESC LIMIT ?", parametros + [limite]
+        ).fetchall()
+        return [self._a_dict_publico(self._a_registro(fila)) for fila in filas]
+
+    def interrumpidos(self):
+        """
+        Returns:
+            list: Registros completos de los trabajos que quedaron en cola o imprimiéndose
+        """
+        if self._hilo is None:
+            return []
+        filas = self._lector().execute(
+            "SELECT * FROM trabajos WHERE estado IN ('en_cola', 'imprimiendo') ORDER BY creado"
+        ).fetchall()
+        return [self._a_registro(fila) for fila in filas]
+
+    def _purgar_periodicamente(self, conexion):
+        try:
+            eliminados = self._purgar(conexion, self.retencion)
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudieron purgar los trabajos vencidos del almacén. Error: {e}")
+            return
+        if eliminados:
+            print(f"Almacén de trabajos: se purgaron {eliminados} trabajo(s) vencidos.")
+
+    def purgar(self, antiguedad=None):
+        """
+        Elimina los trabajos terminados hace más de `antiguedad` segundos.
+
+        Args:
+            antiguedad (float): Segundos de retención (None para usar la configurada)
+
+        Returns:
+            int: Trabajos eliminados
+        """
+        if self._hilo is None:
+            return 0
+        return self._purgar(self._lector(), self.retencion if antiguedad is None else antiguedad)
+
+    def _purgar(self, conexion, antiguedad):
+        limite = time.time() - antiguedad
+        conexion.execute("BEGIN")
+        try:
+            conexion.execute(
+                "DELETE FROM transiciones WHERE job_id IN "
+                "(SELECT job_id FROM trabajos WHERE estado IN ('completado', 'fallido') "
+                "AND COALESCE(finalizado, creado) < ?)", (limite,)
+            )
+            eliminados = conexion.execute(
+                "DELETE FROM trabajos WHERE estado IN ('completado', 'fallido') AND COALESCE(finalizado, creado) < ?",
+                (limite,)
+            ).rowcount
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+        with self._candado:
+            self._contadores["purgados"] += eliminados
+        return eliminados
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Escrituras pendientes, confirmadas y perdidas, transacciones, errores y trabajos purgados
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+        estadisticas["pendientes"] = self._operaciones.qsize()
+        return estadisticas
+
+
+# Instancia compartida por toda la aplicación
+almacen_trabajos = AlmacenTrabajos()
+
+registro_metricas.medidor(
+    "middleware_almacen_pendientes",
+    "Cambios de trabajos a la espera de guardarse en el almacén.",
+    (),
+    lambda: [((), almacen_trabajos.estadisticas()["pendientes"])]
+)
+
+registro_metricas.medidor(
+    "middleware_almacen_escrituras_perdidas",
+    "Cambios de trabajos que no se pudieron guardar en el almacén tras reintentar.",
+    (),
+    lambda: [((), almacen_trabajos.estadisticas()["perdidas"])]
+)
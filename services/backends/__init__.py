@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""
+Inicializador del paquete de backends de impresión.
+Cada backend implementa cómo se envían los trabajos y cómo se administran
+las impresoras; PrintService delega en el backend configurado.
+"""
+
+from config import BACKEND_IMPRESION
+
+from .base import BackendImpresion
+from .simulado import BackendSimulado
+
+
+def crear_backend(nombre=BACKEND_IMPRESION):
+    """
+    Crea la instancia del backend de impresión indicado.
+    El backend de Windows se importa solo cuando se solicita, para que el resto
+    de la aplicación pueda cargarse en sistemas sin pywin32/WMI.
+    
+    Args:
+        nombre (str): Nombre del backend ('windows' o 'simulado')
+        
+    Returns:
+        BackendImpresion: Instancia del backend
+        
+    Raises:
+        Exception: Si el nombre de backend no es conocido
+    """
+    if nombre == "windows":
+        from .windows import BackendWindows
+        return BackendWindows()
+    if nombre == "simulado":
+        return BackendSimulado()
+    raise Exception(f"Backend de impresión desconocido: '{nombre}'.")
+
+
+# Hacer disponibles las clases principales del paquete
+__all__ = ['BackendImpresion', 'BackendSimulado', 'crear_backend']
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Interfaz común de los backends de impresión.
+"""
+
+import asyncio
+import functools
+
+from config import NOMBRE_IMPRESORA
+
+
+async def ejecutar_en_hilo(funcion, *args):
+    """
+    Ejecuta una función bloqueante en el pool de hilos del bucle de eventos.
+    
+    Returns:
+        object: Lo que devuelva la función
+    """
+    bucle = asyncio.get_running_loop()
+    return await bucle.run_in_executor(None, functools.partial(funcion, *args))
+
+
+async def ejecutar_proceso_async(comando, timeout):
+    """
+    Lanza un proceso con asyncio y espera su fin sin bloquear ningún hilo.
+    
+    Args:
+        comando (list): Programa y argumentos
+        timeout (float): Segundos máximos de espera; al vencer se mata el proceso
+        
+    Returns:
+        tuple: (código de salida, salida de error decodificada)
+        
+    Raises:
+        Exception: Si el proceso no termina dentro del tiempo
+    """
+    proceso = await asyncio.create_subprocess_exec(
+        *comando,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, salida_error = await asyncio.wait_for(proceso.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proceso.kill()
+        await proceso.wait()
+        raise Exception(f"El proceso '{comando[0]}' no terminó en {timeout} segundos.")
+    return proceso.returncode, salida_error.decode(errors="replace").strip()
+
+
+class BackendImpresion:
+    """
+    Interfaz que deben implementar los backends de impresión.
+    
+    Los métodos de impresión reciben la ruta de un archivo ya guardado en disco
+    y lanzan una excepción si el envío falla, para que PrintService pueda
+    recurrir al método de respaldo.
+    """
+    
+    # Nombre con el que se selecciona el backend en la configuración
+    nombre = None
+    
+    def impresora_predeterminada(self):
+        """
+        Returns:
+            str: Impresora a la que van los trabajos sin destino explícito
+        """
+        return NOMBRE_IMPRESORA
+    
+    def imprimir_txt(self, ruta_archivo, impresora):
+        """
+        Envía un archivo de texto plano a la impresora.
+        
+        Args:
+            ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino
+            
+        Raises:
+            Exception: Si hay error en la impresión
+        """
+        raise NotImplementedError
+    
+    def imprimir_pdf(self, ruta_archivo, impresora):
+        """
+        Envía un archivo PDF a la impresora.
+        
+        Args:
+            ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino
+            
+        Raises:
+            Exception: Si hay error en la impresión
+        """
+        raise NotImplementedError
+    
+    def imprimir_con_respaldo(self, ruta_archivo, impresora):
+        """
+        Método de respaldo cuando falla el método principal.
+        
+        Args:
+            ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino
+        """
+        raise NotImplementedError
+    
+    # Versiones asíncronas, usadas por la aplicación ASGI (crear_app_asgi). Por defecto
+    # ejecutan el método bloqueante en un hilo; los backends que lanzan procesos las
+    # reemplazan por subprocesos de asyncio para no ocupar un hilo por impresión.
+    
+    async def imprimir_txt_async(self, ruta_archivo, impresora):
+        await ejecutar_en_hilo(self.imprimir_txt, ruta_archivo, impresora)
+    
+    async def imprimir_pdf_async(self, ruta_archivo, impresora):
+        await ejecutar_en_hilo(self.imprimir_pdf, ruta_archivo, impresora)
+    
+    async def imprimir_con_respaldo_async(self, ruta_archivo, impresora):
+        await ejecutar_en_hilo(self.imprimir_con_respaldo, ruta_archivo, impresora)
+    
+    def sondear(self, metodo):
+        """
+        Comprueba, sin imprimir, si un método principal parece disponible. Se usa
+        para decidir cuándo volver a probarlo tras fallos repetidos.
+        
+        Args:
+            metodo (str): 'powershell' o 'sumatra'
+            
+        Returns:
+            bool: True si el método parece disponible
+        """
+        return True
+    
+    def listar_impresoras(self):
+        """
+        Returns:
+            list: Diccionarios con 'name' y 'port' de las impresoras activas
+        """
+        raise NotImplementedError
+    
+    def establecer_predeterminada(self, nombre_impresora):
+        """
+        Establece la impresora predeterminada del sistema.
+        
+        Args:
+            nombre_impresora (str): Nombre exacto de la impresora
+            
+        Returns:
+            bool: True si se estableció, False si no se encontró la impresora
+        """
+        raise NotImplementedError
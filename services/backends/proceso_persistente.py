@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+Proceso auxiliar persistente.
+Mantiene vivo un proceso hijo que recibe comandos por stdin y responde por
+stdout (una línea JSON por mensaje), para que cada trabajo cueste un
+intercambio de mensajes en lugar de lanzar un proceso nuevo.
+"""
+
+import json
+import queue
+import subprocess
+import threading
+
+
+class ProcesoPersistente:
+    """
+    Supervisa un proceso auxiliar de larga duración.
+
+    Protocolo: por cada petición se escribe una línea JSON con un campo 'id'
+    y el proceso responde una línea JSON con el mismo 'id', un campo 'ok' y,
+    si falló, un campo 'error'. Si el proceso termina o no responde dentro
+    del timeout, se mata y se vuelve a lanzar en la siguiente petición.
+    """
+
+    def __init__(self, comando, timeout, nombre="proceso auxiliar"):
+        """
+        Args:
+            comando (list): Comando y argumentos que lanzan el proceso auxiliar
+            timeout (float): Segundos máximos de espera por cada respuesta
+            nombre (str): Nombre descriptivo para los mensajes
+        """
+        self.comando = comando
+        self.timeout = timeout
+        self.nombre = nombre
+        self._proceso = None
+        self._respuestas = None
+        self._siguiente_id = 0
+        self._candado = threading.Lock()
+        self._contadores = {"peticiones": 0, "reinicios": 0, "timeouts": 0}
+
+    def _iniciar(self):
+        """Lanza el proceso auxiliar y el hilo que lee sus respuestas."""
+        if self._proceso is not None:
+            self._contadores["reinicios"] += 1
+            print(f"Reiniciando {self.nombre}...")
+
+        self._proceso = subprocess.Popen(
+            self.comando,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1
+        )
+        self._respuestas = queue.Queue()
+        threading.Thread(
+            target=self._leer_respuestas,
+            args=(self._proceso, self._respuestas),
+            name=f"lector-{self.nombre}",
+            daemon=True
+        ).start()
+
+    @staticmethod
+    def _leer_respuestas(proceso, respuestas):
+        """
+        Lee las líneas JSON del proceso hasta que se cierre su salida.
+
+        Args:
+            proceso (subprocess.Popen): Proceso auxiliar
+            respuestas (queue.Queue): Cola donde se dejan las respuestas
+        """
+        for linea in proceso.stdout:
+            try:
+                respuestas.put(json.loads(linea))
+            except ValueError:
+                # Líneas que no son del protocolo (avisos del propio intérprete)
+                continue
+        respuestas.put(None)
+
+    def _detener_proceso(self):
+        """Mata el proceso auxiliar actual."""
+        if self._proceso is not None and self._proceso.poll() is None:
+            self._proceso.kill()
+            self._proceso.wait()
+
+    def enviar(self, mensaje):
+        """
+        Envía una petición al proceso auxiliar y espera su respuesta.
+
+        Args:
+            mensaje (dict): Datos de la petición (sin el campo 'id')
+
+        Returns:
+            dict: Respuesta del proceso auxiliar
+
+        Raises:
+            Exception: Si el proceso no responde a tiempo, termina inesperadamente
+                o informa un error
+        """
+        with self._candado:
+            if self._proceso is None or self._proceso.poll() is not None:
+                self._iniciar()
+
+            self._siguiente_id += 1
+            peticion = dict(mensaje, id=self._siguiente_id)
+            self._contadores["peticiones"] += 1
+
+            try:
+                self._proceso.stdin.write(json.dumps(peticion) + "\n")
+                self._proceso.stdin.flush()
+            except OSError as e:
+                self._detener_proceso()
+                raise Exception(f"El {self.nombre} no acepta peticiones: {e}")
+
+            while True:
+                try:
+                    respuesta = self._respuestas.get(timeout=self.timeout)
+                except queue.Empty:
+                    # Misma política que subprocess.run(timeout=...): se mata el proceso
+                    self._contadores["timeouts"] += 1
+                    self._detener_proceso()
+                    raise Exception(f"El {self.nombre} no respondió en {self.timeout} segundos.")
+
+                if respuesta is None:
+                    self._detener_proceso()
+                    raise Exception(f"El {self.nombre} terminó inesperadamente.")
+                if respuesta.get("id") == peticion["id"]:
+                    break
+
+        if not respuesta.get("ok"):
+            raise Exception(respuesta.get("error") or f"El {self.nombre} informó un error.")
+        return respuesta
+
+    def cerrar(self):
+        """Cierra la entrada del proceso auxiliar y lo termina."""
+        with self._candado:
+            if self._proceso is None:
+                return
+            try:
+                self._proceso.stdin.close()
+                self._proceso.wait(timeout=self.timeout)
+            except (OSError, subprocess.TimeoutExpired):
+                self._detener_proceso()
+            self._proceso = None
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Peticiones enviadas, reinicios del proceso y timeouts
+        """
+        with self._candado:
+            return dict(self._contadores)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pool de sesiones WMI persistentes.
+Cada hilo del pool inicializa COM una sola vez y mantiene abierta su propia
+conexión WMI; las operaciones de administración de impresoras se despachan a
+esos hilos en lugar de conectarse y desconectarse en cada petición.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as TimeoutFuturo
+
+from config import (
+    HILOS_SESIONES_WMI,
+    TIMEOUT_OPERACION_WMI,
+    INTERVALO_VERIFICACION_WMI
+)
+from ..metricas import DURACION_WMI
+
+
+class PoolSesionesWMI:
+    """Grupo de hilos con COM inicializado y una conexión WMI de larga duración cada uno."""
+
+    def __init__(self, num_hilos=HILOS_SESIONES_WMI, timeout=TIMEOUT_OPERACION_WMI,
+                 intervalo_verificacion=INTERVALO_VERIFICACION_WMI):
+        self.num_hilos = num_hilos
+        self.timeout = timeout
+        self.intervalo_verificacion = intervalo_verificacion
+        self._tareas = queue.Queue()
+        self._hilos = []
+        self._candado = threading.Lock()
+        self._contadores = {"operaciones": 0, "reconexiones": 0, "errores": 0}
+        # Módulos de pywin32/WMI, importados en el primer uso
+        self._wmi = None
+        self._pythoncom = None
+
+    def _asegurar_hilos(self):
+        """
+        Importa WMI y arranca los hilos del pool en el primer uso.
+
+        Raises:
+            Exception: Si pywin32 o WMI no están instalados
+        """
+        with self._candado:
+            if self._hilos:
+                return
+            # Importación diferida: cargar pywin32/WMI es lento y solo existe en Windows
+            try:
+                import pythoncom
+                import wmi
+            except ImportError as e:
+                raise Exception(f"WMI no está disponible (requiere pywin32 y WMI en Windows): {e}")
+            self._wmi = wmi
+            self._pythoncom = pythoncom
+            for indice in range(self.num_hilos):
+                hilo = threading.Thread(
+                    target=self._bucle_sesion,
+                    name=f"sesion-wmi-{indice}",
+                    daemon=True
+                )
+                hilo.start()
+                self._hilos.append(hilo)
+
+    def ejecutar(self, operacion):
+        """
+        Ejecuta una operación sobre una sesión WMI ya conectada.
+
+        Args:
+            operacion (callable): Función que recibe la conexión WMI y devuelve un resultado
+
+        Returns:
+            El resultado de la operación
+
+        Raises:
+            Exception: Si la operación falla o supera TIMEOUT_OPERACION_WMI
+        """
+        self._asegurar_hilos()
+        futuro = Future()
+        inicio = time.perf_counter()
+        self._tareas.put((operacion, futuro))
+        resultado = "error"
+        try:
+            valor = futuro.result(timeout=self.timeout)
+            resultado = "ok"
+            return valor
+        except TimeoutFuturo:
+            resultado = "timeout"
+            raise Exception(f"La operación WMI superó el tiempo máximo de {self.timeout} segundos.")
+        finally:
+            DURACION_WMI.observar(time.perf_counter() - inicio, resultado=resultado)
+
+    def _conectar(self):
+        """
+        Returns:
+            wmi._wmi_namespace: Nueva conexión WMI para el hilo actual
+        """
+        return self._wmi.WMI()
+
+    def _sesion_sana(self, conexion):
+        """
+        Verifica con una consulta mínima que la conexión siga respondiendo.
+
+        Args:
+            conexion: Conexión WMI a verificar
+
+        Returns:
+            bool: True si la conexión responde
+        """
+        try:
+            conexion.query("SELECT Name FROM Win32_OperatingSystem")
+            return True
+        except Exception as e:
+            print(f"ADVERTENCIA: La sesión WMI no responde, se reconectará. Error: {e}")
+            return False
+
+    def _bucle_sesion(self):
+        """Mantiene una sesión WMI y atiende operaciones hasta que termine el proceso."""
+        # COM se inicializa una sola vez por hilo y se mantiene durante toda su vida.
+        self._pythoncom.CoInitialize()
+        conexion = None
+        ultima_verificacion = 0.0
+
+        try:
+            while True:
+                try:
+                    operacion, futuro = self._tareas.get(timeout=self.intervalo_verificacion)
+                except queue.Empty:
+                    # Sin trabajo: aprovechar para verificar la sesión ociosa
+                    if conexion is not None and not self._sesion_sana(conexion):
+                        conexion = None
+                    ultima_verificacion = time.monotonic()
+                    continue
+
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+
+                # Verificar la sesión antes de usarla si hace tiempo que no se comprueba
+                if conexion is not None and time.monotonic() - ultima_verificacion > self.intervalo_verificacion:
+                    if not self._sesion_sana(conexion):
+                        conexion = None
+                    ultima_verificacion = time.monotonic()
+
+                try:
+                    if conexion is None:
+                        conexion = self._conectar()
+                        ultima_verificacion = time.monotonic()
+                    resultado = operacion(conexion)
+                except Exception as e:
+                    # Reintentar una vez con una conexión nueva por si la sesión quedó rota
+                    print(f"ADVERTENCIA: Falló la operación WMI, reintentando con una sesión nueva. Error: {e}")
+                    with self._candado:
+                        self._contadores["reconexiones"] += 1
+                    try:
+                        conexion = self._conectar()
+                        ultima_verificacion = time.monotonic()
+                        resultado = operacion(conexion)
+                    except Exception as e2:
+                        conexion = None
+                        with self._candado:
+                            self._contadores["errores"] += 1
+                        futuro.set_exception(e2)
+                        continue
+
+                with self._candado:
+                    self._contadores["operaciones"] += 1
+                futuro.set_result(resultado)
+        finally:
+            self._pythoncom.CoUninitialize()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Operaciones atendidas, reconexiones y errores del pool
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+        estadisticas["pendientes"] = self._tareas.qsize()
+        return estadisticas
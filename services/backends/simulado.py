@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+Backend de impresión simulado.
+No envía nada a una impresora real: modela la latencia por página, los fallos
+y la capacidad limitada del spool, para poder medir el rendimiento de la capa
+HTTP y de la cola en cualquier sistema operativo.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+
+from config import (
+    SIMULADO_IMPRESORAS,
+    SIMULADO_LATENCIA_BASE,
+    SIMULADO_LATENCIA_POR_PAGINA,
+    SIMULADO_TASA_FALLOS,
+    SIMULADO_CAPACIDAD_SPOOL,
+    SIMULADO_TIMEOUT_SPOOL
+)
+from .base import BackendImpresion
+
+
+# Líneas que entran en una página de texto plano
+LINEAS_POR_PAGINA = 60
+
+# Marcador de página dentro de un PDF ("/Type /Page" pero no "/Type /Pages")
+_PATRON_PAGINA_PDF = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+class BackendSimulado(BackendImpresion):
+    """Backend que simula un spooler con latencia, fallos y capacidad configurables."""
+
+    nombre = "simulado"
+
+    def __init__(self, impresoras=None, latencia_base=SIMULADO_LATENCIA_BASE,
+                 latencia_por_pagina=SIMULADO_LATENCIA_POR_PAGINA,
+                 tasa_fallos=SIMULADO_TASA_FALLOS,
+                 capacidad_spool=SIMULADO_CAPACIDAD_SPOOL,
+                 timeout_spool=SIMULADO_TIMEOUT_SPOOL, semilla=None, metodos_caidos=()):
+        self.impresoras = list(impresoras if impresoras is not None else SIMULADO_IMPRESORAS)
+        self.predeterminada = self.impresoras[0] if self.impresoras else None
+        self.latencia_base = latencia_base
+        self.latencia_por_pagina = latencia_por_pagina
+        self.tasa_fallos = tasa_fallos
+        self.timeout_spool = timeout_spool
+        self.capacidad_spool = capacidad_spool
+        # Métodos que fallan siempre (ej. {'sumatra'} simula SumatraPDF desinstalado)
+        self.metodos_caidos = set(metodos_caidos)
+        self._spools = {}
+        self._spools_async = {}
+        self._aleatorio = random.Random(semilla)
+        self._candado = threading.Lock()
+        self._contadores = {"trabajos": 0, "paginas": 0, "fallos": 0, "spool_lleno": 0}
+
+    @staticmethod
+    def contar_paginas(ruta_archivo):
+        """
+        Estima la cantidad de páginas de un archivo.
+
+        Args:
+            ruta_archivo (str): Ruta del archivo
+
+        Returns:
+            int: Páginas estimadas (al menos 1)
+        """
+        with open(ruta_archivo, "rb") as f:
+            datos = f.read()
+
+        if datos.startswith(b"%PDF-"):
+            paginas = len(_PATRON_PAGINA_PDF.findall(datos))
+        else:
+            paginas = datos.count(b"\f") + datos.count(b"\n") // LINEAS_POR_PAGINA + 1
+
+        return max(paginas, 1)
+
+    def _spool_de(self, impresora):
+        """
+        Returns:
+            threading.BoundedSemaphore: Spool simulado de la impresora (uno por impresora)
+        """
+        with self._candado:
+            if impresora not in self._spools:
+                self._spools[impresora] = threading.BoundedSemaphore(self.capacidad_spool)
+            return self._spools[impresora]
+
+    def _registrar_envio(self, paginas):
+        """
+        Cuenta un envío terminado y decide si se simula un fallo.
+
+        Returns:
+            bool: True si el envío debe fallar
+        """
+        with self._candado:
+            fallo = self._aleatorio.random() < self.tasa_fallos
+            self._contadores["trabajos"] += 1
+            if fallo:
+                self._contadores["fallos"] += 1
+            else:
+                self._contadores["paginas"] += paginas
+        return fallo
+
+    def _verificar_metodo(self, metodo):
+        if metodo in self.metodos_caidos:
+            with self._candado:
+                self._contadores["fallos"] += 1
+            raise Exception(f"Fallo simulado: el método {metodo} no está disponible.")
+
+    def _simular_envio(self, ruta_archivo, impresora, metodo):
+        """
+        Ocupa un lugar del spool de la impresora durante el tiempo que tardaría la impresión.
+
+        Args:
+            ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Impresora de destino
+            metodo (str): Nombre del método simulado, para los mensajes
+
+        Raises:
+            Exception: Si el spool está lleno o si se simula un fallo
+        """
+        self._verificar_metodo(metodo)
+        paginas = self.contar_paginas(ruta_archivo)
+        spool = self._spool_de(impresora)
+
+        if not spool.acquire(timeout=self.timeout_spool):
+            with self._candado:
+                self._contadores["spool_lleno"] += 1
+            raise Exception(f"Spool simulado lleno: no hubo lugar en {self.timeout_spool} segundos.")
+
+        try:
+            time.sleep(self.latencia_base + paginas * self.latencia_por_pagina)
+            fallo = self._registrar_envio(paginas)
+        finally:
+            spool.release()
+
+        if fallo:
+            raise Exception(f"Fallo simulado al imprimir con {metodo}.")
+        print(f"[simulado] {paginas} página(s) enviadas a '{impresora}' con {metodo}.")
+
+    async def _simular_envio_async(self, ruta_archivo, impresora, metodo):
+        """
+        Igual que _simular_envio, pero espera con asyncio (sin ocupar un hilo).
+        El spool se modela con un semáforo de asyncio propio del bucle de eventos.
+        """
+        self._verificar_metodo(metodo)
+        paginas = self.contar_paginas(ruta_archivo)
+        with self._candado:
+            if impresora not in self._spools_async:
+                self._spools_async[impresora] = asyncio.Semaphore(self.capacidad_spool)
+            spool = self._spools_async[impresora]
+
+        try:
+            await asyncio.wait_for(spool.acquire(), self.timeout_spool)
+        except asyncio.TimeoutError:
+            with self._candado:
+                self._contadores["spool_lleno"] += 1
+            raise Exception(f"Spool simulado lleno: no hubo lugar en {self.timeout_spool} segundos.")
+
+        try:
+            await asyncio.sleep(self.latencia_base + paginas * self.latencia_por_pagina)
+            fallo = self._registrar_envio(paginas)
+        finally:
+            spool.release()
+
+        if fallo:
+            raise Exception(f"Fallo simulado al imprimir con {metodo}.")
+        print(f"[simulado] {paginas} página(s) enviadas a '{impresora}' con {metodo}.")
+
+    def impresora_predeterminada(self):
+        return self.predeterminada
+
+    def imprimir_txt(self, ruta_archivo, impresora):
+        self._simular_envio(ruta_archivo, impresora, "powershell")
+
+    def imprimir_pdf(self, ruta_archivo, impresora):
+        self._simular_envio(ruta_archivo, impresora, "sumatra")
+
+    def imprimir_con_respaldo(self, ruta_archivo, impresora):
+        self._simular_envio(ruta_archivo, impresora, "respaldo")
+
+    async def imprimir_txt_async(self, ruta_archivo, impresora):
+        await self._simular_envio_async(ruta_archivo, impresora, "powershell")
+
+    async def imprimir_pdf_async(self, ruta_archivo, impresora):
+        await self._simular_envio_async(ruta_archivo, impresora, "sumatra")
+
+    async def imprimir_con_respaldo_async(self, ruta_archivo, impresora):
+        await self._simular_envio_async(ruta_archivo, impresora, "respaldo")
+
+    def sondear(self, metodo):
+        return metodo not in self.metodos_caidos
+
+    def listar_impresoras(self):
+        return [{"name": nombre, "port": f"SIM{indice}:"} for indice, nombre in enumerate(self.impresoras)]
+
+    def establecer_predeterminada(self, nombre_impresora):
+        if nombre_impresora not in self.impresoras:
+            print(f"ERROR: No se encontró ninguna impresora con el nombre '{nombre_impresora}'.")
+            return False
+        self.predeterminada = nombre_impresora
+        return True
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Contadores acumulados de trabajos, páginas, fallos y rechazos del spool
+        """
+        with self._candado:
+            return dict(self._contadores)
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+"""
+Backend de impresión para Windows.
+Imprime con PowerShell (TXT), SumatraPDF (PDF) y ShellExecute como respaldo,
+y administra las impresoras mediante WMI.
+"""
+
+import base64
+import os
+import subprocess
+import threading
+
+from config import (
+    NOMBRE_IMPRESORA,
+    RUTAS_SUMATRA,
+    TIMEOUT_POWERSHELL,
+    TIMEOUT_SUMATRA,
+    TXT_POWERSHELL_PERSISTENTE
+)
+from .base import BackendImpresion, ejecutar_en_hilo, ejecutar_proceso_async
+from .proceso_persistente import ProcesoPersistente
+from .sesiones_wmi import PoolSesionesWMI
+
+
+# Script del PowerShell persistente: lee una petición JSON por línea desde stdin,
+# imprime el archivo con Out-Printer y responde una línea JSON con el resultado.
+SCRIPT_POWERSHELL_PERSISTENTE = r"""
+$utf8 = New-Object System.Text.UTF8Encoding $false
+[Console]::InputEncoding = $utf8
+[Console]::OutputEncoding = $utf8
+while ($null -ne ($linea = [Console]::In.ReadLine())) {
+    $peticion = $linea | ConvertFrom-Json
+    try {
+        Get-Content -LiteralPath $peticion.archivo -ErrorAction Stop |
+            Out-Printer -Name $peticion.impresora -ErrorAction Stop
+        $respuesta = @{ id = $peticion.id; ok = $true }
+    } catch {
+        $respuesta = @{ id = $peticion.id; ok = $false; error = $_.Exception.Message }
+    }
+    [Console]::Out.WriteLine(($respuesta | ConvertTo-Json -Compress))
+    [Console]::Out.Flush()
+}
+"""
+
+
+def comando_powershell_persistente():
+    """
+    Returns:
+        list: Comando que lanza PowerShell ejecutando SCRIPT_POWERSHELL_PERSISTENTE
+    """
+    script_codificado = base64.b64encode(SCRIPT_POWERSHELL_PERSISTENTE.encode("utf-16-le")).decode("ascii")
+    return ["powershell", "-NoProfile", "-NonInteractive", "-EncodedCommand", script_codificado]
+
+
+class BackendWindows(BackendImpresion):
+    """Backend que envía los trabajos al spooler de Windows."""
+
+    nombre = "windows"
+
+    def __init__(self):
+        # Sesiones WMI persistentes para la administración de impresoras
+        self.sesiones_wmi = PoolSesionesWMI()
+        # PowerShell de larga duración para imprimir TXT sin lanzar un proceso por trabajo:
+        # uno por impresora, para que una impresora lenta no frene los TXT de las demás
+        self._powershell = {}
+        self._candado_powershell = threading.Lock()
+        # Ruta de SumatraPDF: se busca en el primer trabajo y se reutiliza
+        self._ruta_sumatra = None
+        self._candado_sumatra = threading.Lock()
+
+    def powershell(self, impresora):
+        """
+        Devuelve el PowerShell persistente de la impresora, creándolo en el primer uso.
+
+        Args:
+            impresora (str): Nombre de la impresora
+
+        Returns:
+            ProcesoPersistente: Proceso auxiliar que imprime en esa impresora
+        """
+        with self._candado_powershell:
+            proceso = self._powershell.get(impresora)
+            if proceso is None:
+                proceso = ProcesoPersistente(
+                    comando_powershell_persistente(),
+                    timeout=TIMEOUT_POWERSHELL,
+                    nombre=f"PowerShell persistente ({impresora})"
+                )
+                self._powershell[impresora] = proceso
+            return proceso
+
+    def imprimir_txt(self, ruta_archivo, impresora=NOMBRE_IMPRESORA):
+        """
+        Imprime un archivo de texto plano usando PowerShell.
+        Con TXT_POWERSHELL_PERSISTENTE se usa el PowerShell de larga duración de la
+        impresora; si no, se lanza un proceso por trabajo.
+
+        Args:
+            ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino
+
+        Raises:
+            Exception: Si hay error en la impresión
+        """
+        print("Intentando imprimir archivo TXT directamente...")
+
+        if TXT_POWERSHELL_PERSISTENTE:
+            try:
+                self.powershell(impresora).enviar({"archivo": ruta_archivo, "impresora": impresora})
+            except Exception as e:
+                raise Exception(f"Error al imprimir con PowerShell: {e}")
+            print("Archivo TXT enviado directamente a la impresora.")
+            return
+
+        comando_ps = f'Get-Content "{ruta_archivo}" | Out-Printer -Name "{impresora}"'
+
+        resultado = subprocess.run(
+            ["powershell", "-Command", comando_ps],
+            capture_output=True,
+            text=True,
+            timeout=TIMEOUT_POWERSHELL,
+            check=False
+        )
+
+        if resultado.returncode == 0:
+            print("Archivo TXT enviado directamente a la impresora.")
+        else:
+            mensaje_error = resultado.stderr.strip()
+            raise Exception(f"Error al imprimir con PowerShell: {mensaje_error}")
+
+    def imprimir_pdf(self, ruta_archivo, impresora=NOMBRE_IMPRESORA):
+        """
+        Imprime un archivo PDF usando SumatraPDF.
+
+        Args:
+            ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino
+
+        Raises:
+            Exception: Si hay error en la impresión o no se encuentra SumatraPDF
+        """
+        print("Intentando imprimir PDF con SumatraPDF...")
+
+        ruta_sumatra = self.buscar_sumatra()
+        resultado = subprocess.run(
+            self._comando_sumatra(ruta_sumatra, ruta_archivo, impresora),
+            capture_output=True, text=True, timeout=TIMEOUT_SUMATRA, check=False
+        )
+
+        if resultado.returncode == 0:
+            print("PDF enviado a la impresora usando SumatraPDF.")
+        else:
+            print(f"Error con SumatraPDF: {resultado.stderr}")
+            raise Exception("SumatraPDF falló al intentar imprimir.")
+
+    def buscar_sumatra(self, refrescar=False):
+        """
+        Devuelve la ruta de SumatraPDF. Se busca en RUTAS_SUMATRA una sola vez y
+        queda en caché; el sondeo del circuito la vuelve a buscar con refrescar=True
+        (por ejemplo, si se instaló o se movió después de iniciar el servidor).
+
+        Args:
+            refrescar (bool): Ignorar la ruta en caché y volver a buscar
+
+        Returns:
+            str: Ruta del ejecutable de SumatraPDF
+
+        Raises:
+            Exception: Si no se encuentra en ninguna de RUTAS_SUMATRA
+        """
+        with self._candado_sumatra:
+            if self._ruta_sumatra is None or refrescar:
+                self._ruta_sumatra = None
+                for ruta_sumatra in RUTAS_SUMATRA:
+                    ruta_expandida = os.path.expanduser(ruta_sumatra)
+                    if os.path.exists(ruta_expandida):
+                        print(f"SumatraPDF encontrado en: {ruta_expandida}")
+                        self._ruta_sumatra = ruta_expandida
+                        break
+            if self._ruta_sumatra is None:
+                raise Exception("SumatraPDF no encontrado en las rutas habituales. Por favor, instálalo.")
+            return self._ruta_sumatra
+
+    def sondear(self, metodo):
+        """
+        SumatraPDF: vuelve a buscar el ejecutable. PowerShell: lanza un proceso que
+        termina de inmediato, para comprobar que arranca dentro del timeout.
+        """
+        if metodo == "sumatra":
+            self.buscar_sumatra(refrescar=True)
+            return True
+
+        resultado = subprocess.run(
+            ["powershell", "-NoProfile", "-NonInteractive", "-Command", "exit 0"],
+            capture_output=True, timeout=TIMEOUT_POWERSHELL, check=False
+        )
+        return resultado.returncode == 0
+
+    @staticmethod
+    def _comando_sumatra(ruta_sumatra, ruta_archivo, impresora):
+        return [ruta_sumatra, "-print-to", impresora, "-silent", ruta_archivo]
+
+    async def imprimir_pdf_async(self, ruta_archivo, impresora=NOMBRE_IMPRESORA):
+        """
+        Igual que imprimir_pdf, pero SumatraPDF se lanza como subproceso de asyncio.
+        """
+        print("Intentando imprimir PDF con SumatraPDF...")
+
+        ruta_sumatra = self.buscar_sumatra()
+        codigo, salida_error = await ejecutar_proceso_async(
+            self._comando_sumatra(ruta_sumatra, ruta_archivo, impresora), TIMEOUT_SUMATRA
+        )
+        if codigo != 0:
+            print(f"Error con SumatraPDF: {salida_error}")
+            raise Exception("SumatraPDF falló al intentar imprimir.")
+        print("PDF enviado a la impresora usando SumatraPDF.")
+
+    async def imprimir_txt_async(self, ruta_archivo, impresora=NOMBRE_IMPRESORA):
+        """
+        Igual que imprimir_txt. El PowerShell persistente de cada impresora atiende
+        los trabajos de a uno, así que se le habla desde un hilo; sin él, PowerShell
+        se lanza como subproceso de asyncio.
+        """
+        if TXT_POWERSHELL_PERSISTENTE:
+            await ejecutar_en_hilo(self.imprimir_txt, ruta_archivo, impresora)
+            return
+
+        comando_ps = f'Get-Content "{ruta_archivo}" | Out-Printer -Name "{impresora}"'
+        codigo, salida_error = await ejecutar_proceso_async(["powershell", "-Command", comando_ps], TIMEOUT_POWERSHELL)
+        if codigo != 0:
+            raise Exception(f"Error al imprimir con PowerShell: {salida_error}")
+        print("Archivo TXT enviado directamente a la impresora.")
+
+    def imprimir_con_respaldo(self, ruta_archivo, impresora=NOMBRE_IMPRESORA):
+        """
+        Métodos de respaldo para impresión cuando fallan los métodos principales.
+
+        Args:
+            ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino
+        """
+        try:
+            print("Intentando método de respaldo con win32api...")
+            # Importación diferida: pywin32 solo se carga si se llega al respaldo
+            import win32api
+            win32api.ShellExecute(0, "print", ruta_archivo, f'/d:"{impresora}"', ".", 0)
+            print("Archivo enviado a impresión usando el método de respaldo win32api.")
+        except Exception as e2:
+            print(f"ERROR con win32api: {str(e2)}")
+            print("Último recurso: abriendo el archivo...")
+            os.startfile(ruta_archivo)
+
+    ###------------ Agregado Gabriel Lujan ---------------###
+    def listar_impresoras(self):
+        """
+        Escanea el sistema en busca de impresoras instaladas y activas usando WMI.
+        Returns:
+            list: Una lista de nombres de impresoras que están listas para usar.
+
+        Raises:
+            Exception: Si falla la consulta WMI (la caché del inventario sigue sirviendo el último bueno)
+        """
+        print("Escaneando impresoras activas en el sistema...")
+
+        def escanear(c):
+            impresoras_detalladas = []
+
+            for printer in c.Win32_Printer():
+                # Volvemos a poner el filtro original para obtener solo las activas
+                if printer.PrinterStatus == 3 or printer.PrinterStatus == 4:
+
+                    # Creamos un diccionario (objeto) con todos los detalles
+                    printer_info = {
+                        "name": printer.Name,
+                        "port": printer.PortName
+                    }
+
+                    print(f"Impresora activa encontrada: {printer_info}")
+                    impresoras_detalladas.append(printer_info)
+
+            return impresoras_detalladas
+
+        try:
+            # La consulta se ejecuta en un hilo del pool con COM y WMI ya inicializados.
+            impresoras_detalladas = self.sesiones_wmi.ejecutar(escanear)
+
+        except Exception as e:
+            # Un error no es un inventario vacío: se propaga para que la caché conserve el anterior
+            print(f"ERROR al escanear impresoras con WMI: {e}")
+            raise
+
+        if not impresoras_detalladas:
+            print("ADVERTENCIA: No se encontraron impresoras en estado 'Activo' (Idle o Printing).")
+
+        return impresoras_detalladas
+
+    def establecer_predeterminada(self, nombre_impresora):
+        """
+        Establece una impresora específica como la predeterminada del sistema en Windows.
+
+        Args:
+            nombre_impresora (str): El nombre exacto de la impresora a configurar.
+
+        Returns:
+            bool: True si la operación fue exitosa, False si no se encontró la impresora.
+
+        Raises:
+            Exception: Si ocurre un error durante la operación con WMI.
+        """
+        print(f"Intentando establecer '{nombre_impresora}' como predeterminada...")
+
+        def establecer(c):
+            # Buscamos la impresora por su nombre exacto.
+            impresora = c.Win32_Printer(Name=nombre_impresora)
+
+            # La consulta devuelve una lista, verificamos si encontró algo.
+            if not impresora:
+                return False
+
+            # El método SetDefaultPrinter() hace todo el trabajo.
+            impresora[0].SetDefaultPrinter()
+            return True
+
+        try:
+            exito = self.sesiones_wmi.ejecutar(establecer)
+        except Exception as e:
+            print(f"ERROR al intentar establecer la impresora predeterminada: {e}")
+            # relanzamos la excepción para que el endpoint la maneje
+            raise e
+
+        if exito:
+            print(f"Impresora '{nombre_impresora}' establecida como predeterminada en Windows.")
+        else:
+            print(f"ERROR: No se encontró ninguna impresora con el nombre '{nombre_impresora}'.")
+        return exito
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""
+Salud de los métodos principales de impresión (PowerShell, SumatraPDF).
+Cada método tiene un circuito: tras varios fallos o timeouts seguidos se abre y
+los trabajos pasan directo al método de respaldo, sin esperar el timeout del
+método roto. Un hilo en segundo plano sondea el método y, si responde, deja
+pasar un trabajo de prueba antes de volver a cerrarlo.
+"""
+
+import threading
+import time
+
+from config import UMBRAL_FALLOS_CIRCUITO, ESPERA_SONDEO_CIRCUITO
+from .metricas import registro_metricas
+
+# Estados de un circuito
+CIRCUITO_CERRADO = "cerrado"         # El método funciona: se usa normalmente
+CIRCUITO_ABIERTO = "abierto"         # El método falla: se usa directamente el respaldo
+CIRCUITO_SEMIABIERTO = "semiabierto" # El sondeo respondió: un trabajo de prueba decide
+
+
+class CircuitoMetodo:
+    """Circuito de un método de impresión."""
+
+    def __init__(self, metodo, sondeo=None, umbral_fallos=UMBRAL_FALLOS_CIRCUITO,
+                 espera_sondeo=ESPERA_SONDEO_CIRCUITO):
+        """
+        Args:
+            metodo (str): Nombre del método ('powershell', 'sumatra')
+            sondeo (callable): Función sin argumentos que devuelve True si el método
+                parece disponible; None para pasar directo al trabajo de prueba
+            umbral_fallos (int): Fallos seguidos que abren el circuito
+            espera_sondeo (float): Segundos entre sondeos mientras está abierto
+        """
+        self.metodo = metodo
+        self.sondeo = sondeo
+        self.umbral_fallos = umbral_fallos
+        self.espera_sondeo = espera_sondeo
+        self.estado = CIRCUITO_CERRADO
+        self.fallos_seguidos = 0
+        self.ultimo_error = None
+        self.abierto_desde = None
+        self._prueba_en_curso = False
+        self._candado = threading.Lock()
+        self._contadores = {"exitos": 0, "fallos": 0, "aperturas": 0, "evitados": 0}
+
+    def permite(self):
+        """
+        Indica si el trabajo actual debe intentar el método. Con el circuito
+        semiabierto solo lo intenta un trabajo a la vez.
+
+        Returns:
+            bool: True para usar el método, False para ir directo al respaldo
+        """
+        with self._candado:
+            if self.estado == CIRCUITO_CERRADO:
+                return True
+            if self.estado == CIRCUITO_SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            self._contadores["evitados"] += 1
+            return False
+
+    def registrar_exito(self):
+        with self._candado:
+            self._contadores["exitos"] += 1
+            self.fallos_seguidos = 0
+            if self.estado != CIRCUITO_CERRADO:
+                print(f"Método '{self.metodo}' recuperado: circuito cerrado.")
+            self.estado = CIRCUITO_CERRADO
+            self.abierto_desde = None
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self, error):
+        """
+        Args:
+            error (Exception): Error del método (incluidos los timeouts)
+        """
+        with self._candado:
+            self._contadores["fallos"] += 1
+            self.fallos_seguidos += 1
+            self.ultimo_error = str(error)
+            abrir = (self.estado == CIRCUITO_SEMIABIERTO
+                     or (self.estado == CIRCUITO_CERRADO and self.fallos_seguidos >= self.umbral_fallos))
+            if abrir:
+                self.estado = CIRCUITO_ABIERTO
+                self.abierto_desde = time.time()
+                self._contadores["aperturas"] += 1
+            self._prueba_en_curso = False
+
+        if abrir:
+            print(f"ADVERTENCIA: Método '{self.metodo}' falló {self.fallos_seguidos} veces seguidas: "
+                  f"circuito abierto, se usará el método de respaldo.")
+            threading.Thread(target=self._sondear, name=f"sondeo-{self.metodo}", daemon=True).start()
+
+    def _sondear(self):
+        """Sondea el método hasta que responda y entonces deja pasar un trabajo de prueba."""
+        while True:
+            time.sleep(self.espera_sondeo)
+            with self._candado:
+                if self.estado != CIRCUITO_ABIERTO:
+                    return
+            try:
+                disponible = self.sondeo is None or self.sondeo()
+            except Exception as e:
+                print(f"ADVERTENCIA: Falló el sondeo del método '{self.metodo}'. Error: {e}")
+                disponible = False
+            if disponible:
+                with self._candado:
+                    if self.estado == CIRCUITO_ABIERTO:
+                        self.estado = CIRCUITO_SEMIABIERTO
+                print(f"Método '{self.metodo}' responde al sondeo: el próximo trabajo lo usará de prueba.")
+                return
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Estado, fallos seguidos, último error y contadores del circuito
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+            estadisticas.update({
+                "estado": self.estado,
+                "fallos_seguidos": self.fallos_seguidos,
+                "ultimo_error": self.ultimo_error,
+                "abierto_desde": self.abierto_desde,
+            })
+        return estadisticas
+
+
+def _sondear_backend(metodo):
+    # Importación diferida: print_service usa este módulo
+    from .print_service import PrintService
+    return PrintService.obtener_backend().sondear(metodo)
+
+
+class RegistroCircuitos:
+    """Circuitos de los métodos de impresión, creados al usarse por primera vez."""
+
+    def __init__(self, sondeo=_sondear_backend):
+        """
+        Args:
+            sondeo (callable): Función que recibe el nombre del método y devuelve
+                True si está disponible
+        """
+        self.sondeo = sondeo
+        self._circuitos = {}
+        self._candado = threading.Lock()
+
+    def obtener(self, metodo):
+        """
+        Returns:
+            CircuitoMetodo: Circuito del método
+        """
+        with self._candado:
+            if metodo not in self._circuitos:
+                self._circuitos[metodo] = CircuitoMetodo(metodo, lambda: self.sondeo(metodo))
+            return self._circuitos[metodo]
+
+    def reiniciar(self):
+        """Descarta el estado de todos los circuitos (por ejemplo, al cambiar de backend)."""
+        with self._candado:
+            circuitos, self._circuitos = self._circuitos, {}
+        for circuito in circuitos.values():
+            # Cerrarlos detiene sus hilos de sondeo
+            with circuito._candado:
+                circuito.estado = CIRCUITO_CERRADO
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Estadísticas de cada circuito por método
+        """
+        with self._candado:
+            circuitos = dict(self._circuitos)
+        return {metodo: circuito.estadisticas() for metodo, circuito in circuitos.items()}
+
+
+# Instancia compartida por toda la aplicación
+circuitos_impresion = RegistroCircuitos()
+
+registro_metricas.medidor(
+    "middleware_circuito_abierto",
+    "1 si el método de impresión está evitándose por fallos repetidos (abierto o semiabierto).",
+    ("metodo",),
+    lambda: [((metodo,), int(datos["estado"] != CIRCUITO_CERRADO))
+             for metodo, datos in circuitos_impresion.estadisticas().items()]
+)
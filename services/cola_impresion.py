@@ -0,0 +1,703 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cola de trabajos de impresión.
+Permite aceptar archivos sin bloquear el hilo de la petición HTTP: el archivo
+se guarda, se encola en la cola de su impresora y los hilos trabajadores de
+esa impresora lo envían. Bajo la aplicación ASGI los trabajadores son tareas
+de asyncio en lugar de hilos.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from config import (
+    TRABAJADORES_IMPRESION,
+    CAPACIDAD_COLA_IMPRESION,
+    MAX_TRABAJOS_HISTORIAL,
+    CONCURRENCIA_IMPRESORAS,
+    GRUPOS_IMPRESORAS,
+    PRIORIDAD_PREDETERMINADA
+)
+from .admision import ColaJusta, control_admision
+from .almacen_trabajos import almacen_trabajos
+from .eventos import (
+    difusor_eventos,
+    EVENTO_ENCOLADO,
+    EVENTO_IMPRIMIENDO,
+    EVENTO_RESPALDO,
+    EVENTO_COMPLETADO,
+    EVENTO_FALLIDO
+)
+from .metricas import registro_metricas, DURACION_ETAPA, TRABAJOS_IMPRESION
+from .perfilado import registrar_etapa, traza_actual
+from .print_service import PrintService
+
+
+# Estados posibles de un trabajo de impresión
+ESTADO_EN_COLA = "en_cola"
+ESTADO_IMPRIMIENDO = "imprimiendo"
+ESTADO_COMPLETADO = "completado"
+ESTADO_FALLIDO = "fallido"
+ESTADOS_TRABAJO = (ESTADO_EN_COLA, ESTADO_IMPRIMIENDO, ESTADO_COMPLETADO, ESTADO_FALLIDO)
+
+
+class TrabajoImpresion:
+    """Representa un archivo aceptado para imprimir y el estado de su procesamiento."""
+
+    # Tipo con el que se registra en el almacén de trabajos
+    tipo = "simple"
+
+    def __init__(self, ruta_archivo, extension, nombre_original, destino=None, cliente=None,
+                 prioridad=PRIORIDAD_PREDETERMINADA):
+        self.id = uuid.uuid4().hex
+        self.ruta_archivo = ruta_archivo
+        self.extension = extension
+        self.nombre_original = nombre_original
+        self.destino = destino
+        # Cliente que lo envió (IP o nombre de su clave), para los límites y el reparto justo
+        self.cliente = cliente
+        self.prioridad = prioridad
+        self.impresora = None
+        self.estado = ESTADO_EN_COLA
+        self.metodo = None
+        self.error = None
+        self.creado = time.time()
+        self.iniciado = None
+        self.finalizado = None
+        # Instante (time.monotonic) en que entró a la cola; se conserva entre tramos para envejecerlo
+        self.encolado = None
+        # Traza de la petición que lo creó, si se está perfilando: su impresión se perfila también
+        self.traza = traza_actual()
+
+    def ejecutar(self):
+        """
+        Envía el trabajo a la impresora.
+
+        Returns:
+            str: Método de impresión utilizado
+        """
+        return PrintService.ejecutar_impresion(self.ruta_archivo, self.extension, self.impresora,
+                                               al_usar_respaldo=self.avisar_respaldo)
+
+    async def ejecutar_async(self):
+        """
+        Versión asíncrona de ejecutar, usada por los trabajadores de asyncio.
+
+        Returns:
+            str: Método de impresión utilizado
+        """
+        return await PrintService.ejecutar_impresion_async(self.ruta_archivo, self.extension, self.impresora,
+                                                           al_usar_respaldo=self.avisar_respaldo)
+
+    def ejecutar_tramo(self):
+        """
+        Imprime la siguiente parte del trabajo. Los trabajos masivos que se imprimen
+        por tramos devuelven terminado=False hasta el último, para volver a la cola
+        entre tramo y tramo; el resto se imprime completo.
+
+        Returns:
+            tuple: (método de impresión utilizado, terminado)
+        """
+        return self.ejecutar(), True
+
+    async def ejecutar_tramo_async(self):
+        """
+        Versión asíncrona de ejecutar_tramo.
+
+        Returns:
+            tuple: (método de impresión utilizado, terminado)
+        """
+        return await self.ejecutar_async(), True
+
+    def avisar_respaldo(self):
+        """Publica que el método principal falló y se pasa al de respaldo."""
+        difusor_eventos.publicar(EVENTO_RESPALDO, self)
+
+    def archivos_temporales(self):
+        """
+        Returns:
+            list: Rutas de los archivos temporales que deben eliminarse al terminar
+        """
+        return [self.ruta_archivo]
+
+    def a_dict(self):
+        """
+        Devuelve una representación serializable del trabajo.
+
+        Returns:
+            dict: Datos públicos del trabajo
+        """
+        return {
+            "job_id": self.id,
+            "archivo": self.nombre_original,
+            "destino": self.destino,
+            "impresora": self.impresora,
+            "prioridad": self.prioridad,
+            "estado": self.estado,
+            "metodo": self.metodo,
+            "error": self.error,
+            "creado": self.creado,
+            "iniciado": self.iniciado,
+            "finalizado": self.finalizado
+        }
+
+    def a_registro(self):
+        """
+        Returns:
+            dict: Datos del trabajo para el almacén, incluidos los necesarios para reanudarlo
+        """
+        registro = self.a_dict()
+        registro.update({
+            "tipo": self.tipo,
+            "ruta_archivo": self.ruta_archivo,
+            "extension": self.extension,
+            "documentos": None
+        })
+        return registro
+
+    @classmethod
+    def desde_registro(cls, registro):
+        """
+        Reconstruye un trabajo guardado en el almacén para volver a encolarlo.
+
+        Args:
+            registro (dict): Registro devuelto por AlmacenTrabajos.interrumpidos()
+
+        Returns:
+            TrabajoImpresion: Trabajo en cola con su identificador original
+        """
+        trabajo = cls(registro["ruta_archivo"], registro["extension"], registro["archivo"], registro["destino"],
+                      prioridad=registro["prioridad"] or PRIORIDAD_PREDETERMINADA)
+        trabajo.id = registro["job_id"]
+        trabajo.creado = registro["creado"]
+        return trabajo
+
+
+class ColaImpresora:
+    """
+    Cola de trabajos de una impresora, atendida por sus propios trabajadores:
+    hilos, o tareas de asyncio si se indica un bucle de eventos. Los trabajos
+    pendientes se reparten de forma justa entre los clientes (ColaJusta).
+    """
+
+    def __init__(self, nombre, concurrencia, capacidad, al_ejecutar, bucle=None):
+        """
+        Args:
+            nombre (str): Nombre de la impresora
+            concurrencia (int): Trabajos que se envían a la impresora en paralelo
+            capacidad (int): Trabajos pendientes máximos
+            al_ejecutar (callable): Función que procesa cada trabajo (corrutina si hay bucle)
+            bucle (asyncio.AbstractEventLoop): Bucle en el que corren los trabajadores, o None para hilos
+        """
+        self.nombre = nombre
+        self.concurrencia = concurrencia
+        self._cola = ColaJusta(maxsize=capacidad, peso=control_admision.peso)
+        self._al_ejecutar = al_ejecutar
+        self._candado = threading.Lock()
+        self._bucle = bucle
+        self._hay_trabajo = None
+        self.en_curso = 0
+        self.completados = 0
+        self.fallidos = 0
+
+        if bucle is not None:
+            asyncio.run_coroutine_threadsafe(self._iniciar_trabajadores_async(), bucle)
+            return
+
+        for indice in range(concurrencia):
+            threading.Thread(
+                target=self._bucle_trabajador,
+                name=f"trabajador-{nombre}-{indice}",
+                daemon=True
+            ).start()
+
+    def poner(self, trabajo):
+        """
+        Raises:
+            queue.Full: Si la cola de la impresora está llena
+        """
+        self._cola.put_nowait(trabajo)
+        if self._bucle is not None:
+            # Se puede encolar desde cualquier hilo; el aviso se da en el hilo del bucle
+            self._bucle.call_soon_threadsafe(self._avisar_trabajo)
+
+    def devolver(self, trabajo):
+        """Vuelve a encolar un trabajo que cedió su lugar entre dos tramos."""
+        self._cola.devolver(trabajo, trabajo.encolado)
+        if self._bucle is not None:
+            self._bucle.call_soon_threadsafe(self._avisar_trabajo)
+
+    def pendientes(self):
+        """
+        Returns:
+            int: Trabajos esperando en la cola de la impresora
+        """
+        return self._cola.qsize()
+
+    def sin_terminar(self):
+        """
+        Returns:
+            int: Trabajos encolados que todavía no terminaron (pendientes y en curso)
+        """
+        with self._cola.mutex:
+            return self._cola.unfinished_tasks
+
+    def carga(self):
+        """
+        Returns:
+            float: Trabajos pendientes y en curso por cada hilo de la impresora
+        """
+        return (self.pendientes() + self.en_curso) / self.concurrencia
+
+    def _bucle_trabajador(self):
+        """Toma trabajos de la cola y los imprime uno a uno."""
+        while True:
+            trabajo = self._cola.get()
+            self._iniciar_trabajo()
+            try:
+                self._al_ejecutar(trabajo)
+            finally:
+                self._terminar_trabajo(trabajo)
+
+    async def _iniciar_trabajadores_async(self):
+        """Crea el aviso de trabajo nuevo y las tareas trabajadoras (en el hilo del bucle)."""
+        self._hay_trabajo = asyncio.Event()
+        for _ in range(self.concurrencia):
+            asyncio.ensure_future(self._bucle_trabajador_async())
+
+    def _avisar_trabajo(self):
+        if self._hay_trabajo is not None:
+            self._hay_trabajo.set()
+
+    async def _bucle_trabajador_async(self):
+        """Igual que _bucle_trabajador, pero como tarea de asyncio."""
+        while True:
+            try:
+                trabajo = self._cola.get_nowait()
+            except queue.Empty:
+                self._hay_trabajo.clear()
+                await self._hay_trabajo.wait()
+                continue
+            self._iniciar_trabajo()
+            try:
+                await self._al_ejecutar(trabajo)
+            finally:
+                self._terminar_trabajo(trabajo)
+
+    def _iniciar_trabajo(self):
+        with self._candado:
+            self.en_curso += 1
+
+    def _terminar_trabajo(self, trabajo):
+        with self._candado:
+            self.en_curso -= 1
+            if trabajo.estado == ESTADO_FALLIDO:
+                self.fallidos += 1
+            elif trabajo.estado == ESTADO_COMPLETADO:
+                self.completados += 1
+        self._cola.task_done()
+
+    def a_dict(self):
+        """
+        Returns:
+            dict: Profundidad de la cola y trabajos en curso de la impresora
+        """
+        with self._candado:
+            return {
+                "impresora": self.nombre,
+                "concurrencia": self.concurrencia,
+                "pendientes": self.pendientes(),
+                "en_curso": self.en_curso,
+                "completados": self.completados,
+                "fallidos": self.fallidos
+            }
+
+
+class ColaImpresion:
+    """
+    Despachador de trabajos de impresión.
+
+    Mantiene una cola por impresora con su propia concurrencia. El destino de
+    cada trabajo puede ser una impresora o un grupo de impresoras
+    (GRUPOS_IMPRESORAS); en ese caso se elige la impresora menos cargada del
+    grupo entre las que figuran como activas en el inventario.
+    """
+
+    def __init__(self, concurrencia=TRABAJADORES_IMPRESION,
+                 capacidad=CAPACIDAD_COLA_IMPRESION,
+                 max_historial=MAX_TRABAJOS_HISTORIAL,
+                 concurrencia_por_impresora=None, grupos=None):
+        self.concurrencia = concurrencia
+        self.capacidad = capacidad
+        self.max_historial = max_historial
+        self.concurrencia_por_impresora = dict(
+            CONCURRENCIA_IMPRESORAS if concurrencia_por_impresora is None else concurrencia_por_impresora
+        )
+        self.grupos = dict(GRUPOS_IMPRESORAS if grupos is None else grupos)
+        self._colas = {}
+        self._trabajos = OrderedDict()
+        self._candado = threading.Lock()
+        self._iniciada = False
+        self._deteniendo = False
+        self._bucle = None
+        self._recuperados = []
+
+    def iniciar(self):
+        """Habilita el despacho de trabajos; las colas de cada impresora se crean en su primer uso."""
+        with self._candado:
+            if self._iniciada:
+                return
+            self._iniciada = True
+        print(f"Cola de impresión iniciada ({self.concurrencia} trabajador(es) por impresora por defecto).")
+
+    def usar_bucle(self, bucle):
+        """
+        Hace que las colas de impresora se atiendan con tareas de asyncio en el bucle
+        indicado en lugar de con hilos. Debe llamarse antes de encolar el primer trabajo.
+
+        Args:
+            bucle (asyncio.AbstractEventLoop): Bucle de eventos de la aplicación ASGI
+        """
+        with self._candado:
+            if self._colas and self._bucle is not bucle:
+                raise Exception("Las colas de impresión ya se crearon con hilos trabajadores.")
+            self._bucle = bucle
+
+    def _cola_de(self, impresora):
+        """
+        Devuelve la cola de la impresora, creándola si todavía no existe.
+
+        Args:
+            impresora (str): Nombre de la impresora
+
+        Returns:
+            ColaImpresora: Cola de la impresora
+        """
+        with self._candado:
+            cola = self._colas.get(impresora)
+            if cola is None:
+                concurrencia = self.concurrencia_por_impresora.get(impresora, self.concurrencia)
+                if self._bucle is None:
+                    cola = ColaImpresora(impresora, concurrencia, self.capacidad, self._ejecutar)
+                else:
+                    cola = ColaImpresora(impresora, concurrencia, self.capacidad, self._ejecutar_async, self._bucle)
+                self._colas[impresora] = cola
+            return cola
+
+    def resolver_destino(self, destino):
+        """
+        Traduce el destino pedido por el cliente a una impresora concreta.
+
+        Args:
+            destino (str): Nombre de impresora, nombre de grupo o None para la predeterminada
+
+        Returns:
+            str: Nombre de la impresora elegida
+
+        Raises:
+            Exception: Si la impresora no está activa o el grupo no tiene impresoras activas
+        """
+        if not destino:
+            return PrintService.obtener_backend().impresora_predeterminada()
+
+        activas = {impresora["name"] for impresora in PrintService.obtener_impresoras_activas()}
+
+        if destino not in self.grupos:
+            if destino not in activas:
+                raise Exception(f"La impresora '{destino}' no está disponible.")
+            return destino
+
+        candidatas = [nombre for nombre in self.grupos[destino] if nombre in activas]
+        if not candidatas:
+            raise Exception(f"No hay impresoras disponibles en el grupo '{destino}'.")
+
+        # La menos cargada; ante empate, la primera del grupo
+        return min(candidatas, key=lambda nombre: self._cola_de(nombre).carga())
+
+    def encolar_trabajo(self, trabajo):
+        """
+        Registra un trabajo ya construido, elige su impresora y lo deja pendiente
+        en la cola correspondiente.
+
+        Args:
+            trabajo (TrabajoImpresion): Trabajo a encolar
+
+        Returns:
+            TrabajoImpresion: El mismo trabajo
+
+        Raises:
+            Exception: Si no hay impresora disponible
+            SaturacionServicio: Si se superó un límite de admisión o la cola de la impresora está llena
+        """
+        if self._deteniendo:
+            raise Exception("El servidor se está deteniendo y no acepta trabajos nuevos.")
+
+        trabajo.impresora = self.resolver_destino(trabajo.destino)
+        cola = self._cola_de(trabajo.impresora)
+        control_admision.admitir(trabajo)
+
+        with self._candado:
+            self._trabajos[trabajo.id] = trabajo
+            self._recortar_historial()
+
+        # Se registra y se publica antes de encolar para que el cambio a 'imprimiendo' no llegue primero
+        almacen_trabajos.guardar(trabajo)
+        difusor_eventos.publicar(EVENTO_ENCOLADO, trabajo)
+        try:
+            cola.poner(trabajo)
+        except queue.Full:
+            with self._candado:
+                self._trabajos.pop(trabajo.id, None)
+            almacen_trabajos.eliminar(trabajo.id)
+            rechazo = control_admision.rechazo_cola_llena(trabajo, cola.pendientes())
+            trabajo.estado = ESTADO_FALLIDO
+            trabajo.error = str(rechazo)
+            difusor_eventos.publicar(EVENTO_FALLIDO, trabajo)
+            raise rechazo
+
+        print(f"Trabajo {trabajo.id} encolado ('{trabajo.nombre_original}') para '{trabajo.impresora}'.")
+        return trabajo
+
+    def recuperar(self):
+        """
+        Carga del almacén los trabajos que quedaron en cola o imprimiéndose en la
+        ejecución anterior. Los que perdieron su archivo temporal se marcan como
+        fallidos; el resto queda listo para reencolar_recuperados().
+
+        Returns:
+            list: Rutas de los archivos temporales de los trabajos recuperados
+                (no deben borrarse como huérfanos)
+        """
+        # Importación diferida: lotes importa este módulo
+        from .lotes import TrabajoLote, TrabajoPdfMasivo
+        clases = {TrabajoImpresion.tipo: TrabajoImpresion, TrabajoLote.tipo: TrabajoLote,
+                  TrabajoPdfMasivo.tipo: TrabajoPdfMasivo}
+
+        for registro in almacen_trabajos.interrumpidos():
+            trabajo = clases[registro["tipo"]].desde_registro(registro)
+            if all(os.path.exists(ruta) for ruta in trabajo.archivos_temporales()):
+                self._recuperados.append(trabajo)
+                continue
+            trabajo.estado = ESTADO_FALLIDO
+            trabajo.error = "El archivo temporal se perdió al reiniciar el servidor."
+            trabajo.finalizado = time.time()
+            almacen_trabajos.guardar(trabajo)
+
+        return [ruta for trabajo in self._recuperados for ruta in trabajo.archivos_temporales()]
+
+    def reencolar_recuperados(self):
+        """
+        Vuelve a encolar los trabajos cargados con recuperar(). Un trabajo que se
+        estaba imprimiendo al caerse el servidor se imprime de nuevo.
+
+        Returns:
+            int: Trabajos reencolados
+        """
+        recuperados, self._recuperados = self._recuperados, []
+        reencolados = 0
+        for trabajo in recuperados:
+            try:
+                self.encolar_trabajo(trabajo)
+                reencolados += 1
+            except Exception as e:
+                print(f"ERROR: No se pudo reencolar el trabajo {trabajo.id}. Error: {e}")
+                self._marcar_fin(trabajo, e)
+
+        if recuperados:
+            print(f"Se reencolaron {reencolados} de {len(recuperados)} trabajo(s) interrumpidos.")
+        return reencolados
+
+    def obtener(self, job_id):
+        """
+        Busca un trabajo por su identificador.
+
+        Args:
+            job_id (str): Identificador del trabajo
+
+        Returns:
+            TrabajoImpresion: El trabajo, o None si no existe
+        """
+        with self._candado:
+            return self._trabajos.get(job_id)
+
+    def estado_trabajo(self, job_id):
+        """
+        Busca un trabajo en memoria o, si ya salió del historial, en el almacén.
+
+        Args:
+            job_id (str): Identificador del trabajo
+
+        Returns:
+            dict: Datos públicos del trabajo, o None si no existe
+        """
+        trabajo = self.obtener(job_id)
+        return trabajo.a_dict() if trabajo is not None else almacen_trabajos.obtener(job_id)
+
+    def pendientes(self):
+        """
+        Returns:
+            int: Cantidad aproximada de trabajos esperando en todas las colas
+        """
+        with self._candado:
+            colas = list(self._colas.values())
+        return sum(cola.pendientes() for cola in colas)
+
+    def estado_colas(self):
+        """
+        Returns:
+            list: Estado de la cola de cada impresora (profundidad y trabajos en curso)
+        """
+        with self._candado:
+            colas = list(self._colas.values())
+        return [cola.a_dict() for cola in colas]
+
+    def detener(self, timeout):
+        """
+        Deja de aceptar trabajos y espera a que terminen los pendientes y en curso.
+
+        Args:
+            timeout (float): Segundos máximos de espera
+
+        Returns:
+            bool: True si todas las colas quedaron vacías dentro del tiempo
+        """
+        self._deteniendo = True
+        limite = time.monotonic() + timeout
+
+        while True:
+            with self._candado:
+                colas = list(self._colas.values())
+            restantes = sum(cola.sin_terminar() for cola in colas)
+            if restantes == 0:
+                print("Cola de impresión vaciada.")
+                return True
+            if time.monotonic() >= limite:
+                print(f"ADVERTENCIA: Quedaron {restantes} trabajo(s) sin terminar al detener la cola.")
+                return False
+            time.sleep(0.1)
+
+    def _recortar_historial(self):
+        """Descarta los trabajos terminados más antiguos cuando se supera el máximo."""
+        exceso = len(self._trabajos) - self.max_historial
+        if exceso <= 0:
+            return
+        for job_id in list(self._trabajos):
+            if exceso <= 0:
+                break
+            if self._trabajos[job_id].estado in (ESTADO_COMPLETADO, ESTADO_FALLIDO):
+                del self._trabajos[job_id]
+                exceso -= 1
+
+    def _ejecutar(self, trabajo):
+        """
+        Imprime un trabajo (o su siguiente tramo) actualizando su estado.
+
+        Args:
+            trabajo (TrabajoImpresion): Trabajo a procesar
+        """
+        if trabajo.traza is not None:
+            with trabajo.traza.activar(), trabajo.traza.perfilar(f"trabajo {trabajo.id}"):
+                self._ejecutar_tramo(trabajo)
+        else:
+            self._ejecutar_tramo(trabajo)
+
+    def _ejecutar_tramo(self, trabajo):
+        if trabajo.estado != ESTADO_IMPRIMIENDO:
+            self._marcar_inicio(trabajo)
+        try:
+            metodo, terminado = trabajo.ejecutar_tramo()
+        except Exception as e:
+            self._marcar_fin(trabajo, e)
+        else:
+            self._terminar_tramo(trabajo, metodo, terminado)
+
+    async def _ejecutar_async(self, trabajo):
+        """
+        Igual que _ejecutar, para los trabajadores de asyncio.
+
+        Args:
+            trabajo (TrabajoImpresion): Trabajo a procesar
+        """
+        if trabajo.traza is not None:
+            with trabajo.traza.activar(), trabajo.traza.perfilar(f"trabajo {trabajo.id}"):
+                await self._ejecutar_tramo_async(trabajo)
+        else:
+            await self._ejecutar_tramo_async(trabajo)
+
+    async def _ejecutar_tramo_async(self, trabajo):
+        if trabajo.estado != ESTADO_IMPRIMIENDO:
+            self._marcar_inicio(trabajo)
+        try:
+            metodo, terminado = await trabajo.ejecutar_tramo_async()
+        except Exception as e:
+            self._marcar_fin(trabajo, e)
+        else:
+            self._terminar_tramo(trabajo, metodo, terminado)
+
+    def _terminar_tramo(self, trabajo, metodo, terminado):
+        if terminado:
+            trabajo.metodo = metodo
+            self._marcar_fin(trabajo)
+        else:
+            # Ceder el lugar: los trabajos más urgentes encolados mientras tanto pasan antes
+            self._cola_de(trabajo.impresora).devolver(trabajo)
+
+    @staticmethod
+    def _marcar_inicio(trabajo):
+        trabajo.estado = ESTADO_IMPRIMIENDO
+        trabajo.iniciado = time.time()
+        DURACION_ETAPA.observar(trabajo.iniciado - trabajo.creado, etapa="espera_cola")
+        registrar_etapa("espera_cola", trabajo.iniciado - trabajo.creado)
+        control_admision.registrar_espera(trabajo)
+        almacen_trabajos.guardar(trabajo)
+        difusor_eventos.publicar(EVENTO_IMPRIMIENDO, trabajo)
+
+    @staticmethod
+    def _marcar_fin(trabajo, error=None):
+        """
+        Registra el resultado del trabajo y programa la limpieza de sus archivos.
+
+        Args:
+            trabajo (TrabajoImpresion): Trabajo terminado
+            error (Exception): Error producido, o None si se imprimió
+        """
+        if error is None:
+            trabajo.estado = ESTADO_COMPLETADO
+            print(f"Trabajo {trabajo.id} completado en '{trabajo.impresora}' (método: {trabajo.metodo}).")
+        else:
+            trabajo.error = str(error)
+            trabajo.estado = ESTADO_FALLIDO
+            print(f"ERROR en trabajo {trabajo.id}: {str(error)}")
+
+        trabajo.finalizado = time.time()
+        # El perfil queda en el registro de perfiles; el historial de trabajos no lo retiene
+        trabajo.traza = None
+        TRABAJOS_IMPRESION.inc(resultado=trabajo.estado)
+        control_admision.liberar(trabajo)
+        almacen_trabajos.guardar(trabajo)
+        difusor_eventos.publicar(EVENTO_COMPLETADO if error is None else EVENTO_FALLIDO, trabajo)
+        for ruta_archivo in trabajo.archivos_temporales():
+            PrintService.programar_limpieza(ruta_archivo, trabajo.metodo)
+
+
+# Instancia compartida por toda la aplicación
+cola_impresion = ColaImpresion()
+
+registro_metricas.medidor(
+    "middleware_cola_pendientes",
+    "Trabajos esperando en la cola de cada impresora.",
+    ("impresora",),
+    lambda: [((cola["impresora"],), cola["pendientes"]) for cola in cola_impresion.estado_colas()]
+)
+registro_metricas.medidor(
+    "middleware_cola_en_curso",
+    "Trabajos que se están enviando a cada impresora.",
+    ("impresora",),
+    lambda: [((cola["impresora"],), cola["en_curso"]) for cola in cola_impresion.estado_colas()]
+)
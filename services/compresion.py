@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cuerpos de petición comprimidos.
+Una petición con Content-Encoding: gzip (o zstd, si está instalado 'zstandard')
+se descomprime a medida que la aplicación lee el cuerpo, así el archivo llega
+descomprimido al archivo temporal sin pasar entero por memoria. Para evitar
+bombas de descompresión se limita el tamaño descomprimido y, a partir de
+MIN_BYTES_RATIO_DESCOMPRESION bytes, la relación entre lo descomprimido y lo
+recibido.
+"""
+
+import gzip
+import threading
+import zlib
+
+from werkzeug.wsgi import LimitedStream
+
+from config import (
+    MAX_RATIO_DESCOMPRESION,
+    MAX_TAMANO_DESCOMPRIMIDO,
+    MIN_BYTES_RATIO_DESCOMPRESION,
+    TAMANO_BLOQUE_ESCRITURA
+)
+
+CODIFICACIONES = ("gzip", "zstd")
+
+# Errores de los lectores ante datos corruptos o truncados
+ERRORES_DATOS = (OSError, EOFError, zlib.error, ValueError)
+
+
+class FlujoContado:
+    """Envoltorio del cuerpo recibido que cuenta los bytes comprimidos leídos."""
+
+    def __init__(self, flujo):
+        self._flujo = flujo
+        self.leidos = 0
+
+    def read(self, tamano=-1):
+        datos = self._flujo.read(tamano)
+        self.leidos += len(datos)
+        return datos
+
+    def readable(self):
+        return True
+
+
+class FlujoDescomprimido:
+    """
+    Cuerpo de la petición descomprimido bajo demanda: cada read() descomprime
+    solo lo necesario para devolver, como mucho, los bytes pedidos.
+    """
+
+    def __init__(self, flujo, codificacion, registro=None, max_tamano=MAX_TAMANO_DESCOMPRIMIDO,
+                 max_ratio=MAX_RATIO_DESCOMPRESION, min_bytes_ratio=MIN_BYTES_RATIO_DESCOMPRESION):
+        """
+        Args:
+            flujo: Cuerpo comprimido, limitado a su Content-Length
+            codificacion (str): 'gzip' o 'zstd'
+            registro (RegistroCompresion): Contadores a actualizar al terminar
+            max_tamano (int): Bytes descomprimidos máximos
+            max_ratio (float): Relación máxima entre bytes descomprimidos y recibidos
+            min_bytes_ratio (int): Bytes descomprimidos a partir de los que se controla la relación
+        """
+        self.codificacion = codificacion
+        self.max_tamano = max_tamano
+        self.max_ratio = max_ratio
+        self.min_bytes_ratio = min_bytes_ratio
+        self.descomprimidos = 0
+        self._registro = registro
+        self._terminado = False
+        self._recibido = FlujoContado(flujo)
+        self._errores = ERRORES_DATOS
+        if codificacion == "gzip":
+            self._lector = gzip.GzipFile(fileobj=self._recibido, mode="rb")
+        else:
+            self._lector = crear_lector_zstd(self._recibido)
+            # zstandard.ZstdError deriva de Exception, no de OSError (ya se importó al crear el lector)
+            import zstandard
+            self._errores = ERRORES_DATOS + (zstandard.ZstdError,)
+
+    def read(self, tamano=-1):
+        if tamano is None or tamano < 0:
+            partes = []
+            while True:
+                bloque = self.read(TAMANO_BLOQUE_ESCRITURA)
+                if not bloque:
+                    return b"".join(partes)
+                partes.append(bloque)
+
+        try:
+            datos = self._lector.read(tamano)
+        except self._errores as e:
+            # Datos corruptos o truncados
+            self._terminar("invalidos")
+            raise Exception(f"El cuerpo comprimido con {self.codificacion} no es válido: {e}")
+
+        self.descomprimidos += len(datos)
+        if self.descomprimidos > self.max_tamano:
+            self._terminar("rechazados")
+            raise Exception(
+                f"El cuerpo descomprimido excede el tamaño máximo de {self.max_tamano} bytes."
+            )
+        if (self.descomprimidos >= self.min_bytes_ratio
+                and self.descomprimidos > self.max_ratio * max(self._recibido.leidos, 1)):
+            self._terminar("rechazados")
+            raise Exception(
+                f"El cuerpo descomprimido excede la relación de compresión máxima de {self.max_ratio}:1 "
+                f"({self.descomprimidos} bytes a partir de {self._recibido.leidos})."
+            )
+        if not datos:
+            self._terminar("descomprimidos")
+        return datos
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self._lector.close()
+
+    def _terminar(self, resultado):
+        if self._terminado:
+            return
+        self._terminado = True
+        if self._registro is not None:
+            self._registro.registrar(self.codificacion, resultado, self._recibido.leidos, self.descomprimidos)
+
+
+def crear_lector_zstd(flujo):
+    """
+    Returns:
+        Lector de zstandard que descomprime el flujo de a bloques
+
+    Raises:
+        Exception: Si 'zstandard' no está instalado
+    """
+    # Dependencia opcional: solo la necesitan los clientes que envían zstd
+    try:
+        import zstandard
+    except ImportError:
+        raise Exception("Codificación no soportada: 'zstd' requiere el paquete 'zstandard' en el servidor.")
+    return zstandard.ZstdDecompressor().stream_reader(flujo, read_size=TAMANO_BLOQUE_ESCRITURA)
+
+
+def zstd_disponible():
+    """
+    Returns:
+        bool: True si se pueden recibir cuerpos comprimidos con zstd
+    """
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class RegistroCompresion:
+    """Contadores de las peticiones recibidas comprimidas."""
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._contadores = {}
+
+    def registrar(self, codificacion, resultado, recibidos, descomprimidos):
+        """
+        Args:
+            codificacion (str): 'gzip' o 'zstd'
+            resultado (str): 'descomprimidos', 'rechazados' (límites) o 'invalidos'
+            recibidos (int): Bytes comprimidos leídos
+            descomprimidos (int): Bytes descomprimidos entregados a la aplicación
+        """
+        with self._candado:
+            contadores = self._contadores.setdefault(codificacion, {
+                "descomprimidos": 0, "rechazados": 0, "invalidos": 0,
+                "bytes_recibidos": 0, "bytes_descomprimidos": 0
+            })
+            contadores[resultado] += 1
+            contadores["bytes_recibidos"] += recibidos
+            contadores["bytes_descomprimidos"] += descomprimidos
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Por codificación: peticiones descomprimidas, rechazadas e inválidas y bytes recibidos y descomprimidos
+        """
+        with self._candado:
+            return {codificacion: dict(contadores) for codificacion, contadores in self._contadores.items()}
+
+
+# Instancia compartida por toda la aplicación
+registro_compresion = RegistroCompresion()
+
+
+class DescompresionPeticiones:
+    """
+    Middleware WSGI que reemplaza el cuerpo de las peticiones con Content-Encoding
+    por su versión descomprimida. Como el tamaño descomprimido no se conoce de
+    antemano, se quita Content-Length y se marca el cuerpo como terminado por el
+    servidor (wsgi.input_terminated), que es como Werkzeug lee un cuerpo sin largo.
+    """
+
+    def __init__(self, app_wsgi, registro=registro_compresion):
+        self.app_wsgi = app_wsgi
+        self.registro = registro
+
+    def __call__(self, entorno, start_response):
+        codificacion = entorno.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if codificacion in ("", "identity"):
+            return self.app_wsgi(entorno, start_response)
+
+        if codificacion not in CODIFICACIONES or (codificacion == "zstd" and not zstd_disponible()):
+            disponibles = "gzip, zstd" if zstd_disponible() else "gzip"
+            return self._rechazar(start_response, 415, f"Error: Codificación no soportada: '{codificacion}'. Usa {disponibles}.")
+
+        try:
+            largo = int(entorno.get("CONTENT_LENGTH") or -1)
+        except ValueError:
+            largo = -1
+        flujo = entorno["wsgi.input"]
+        if largo >= 0:
+            flujo = LimitedStream(flujo, largo)
+        elif "wsgi.input_terminated" not in entorno:
+            return self._rechazar(start_response, 411, "Error: Un cuerpo comprimido debe indicar Content-Length.")
+
+        entorno = dict(entorno)
+        entorno["wsgi.input"] = FlujoDescomprimido(flujo, codificacion, self.registro)
+        entorno["wsgi.input_terminated"] = True
+        entorno.pop("CONTENT_LENGTH", None)
+        entorno.pop("HTTP_CONTENT_ENCODING", None)
+        return self.app_wsgi(entorno, start_response)
+
+    @staticmethod
+    def _rechazar(start_response, codigo, texto):
+        cuerpo = texto.encode("utf-8")
+        estados = {411: "411 Length Required", 415: "415 Unsupported Media Type"}
+        start_response(estados[codigo], [("Content-Type", "text/plain; charset=utf-8"),
+                                         ("Content-Length", str(len(cuerpo)))])
+        return [cuerpo]
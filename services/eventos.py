@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+"""
+Difusión de eventos de los trabajos de impresión (GET /events, Server-Sent Events).
+Los trabajadores de la cola publican cada cambio de un trabajo y el difusor lo
+copia en el buffer de cada suscriptor interesado sin esperar a nadie: si un
+cliente lento llena su buffer se descartan sus eventos más antiguos y se le
+avisa cuántos perdió, en lugar de frenar la impresión.
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from config import CAPACIDAD_SUSCRIPTOR_EVENTOS, INTERVALO_LATIDO_EVENTOS
+from .metricas import registro_metricas
+
+# Eventos del ciclo de vida de un trabajo
+EVENTO_ENCOLADO = "encolado"
+EVENTO_IMPRIMIENDO = "imprimiendo"
+EVENTO_RESPALDO = "respaldo"
+EVENTO_COMPLETADO = "completado"
+EVENTO_FALLIDO = "fallido"
+# Aviso al suscriptor de que se descartaron eventos por no leerlos a tiempo
+EVENTO_DESCARTADOS = "descartados"
+
+EVENTOS_FINALES = (EVENTO_COMPLETADO, EVENTO_FALLIDO)
+
+
+class Suscripcion:
+    """Buffer acotado de eventos de un suscriptor, con su filtro."""
+
+    def __init__(self, difusor, job_id=None, impresora=None, capacidad=CAPACIDAD_SUSCRIPTOR_EVENTOS, bucle=None):
+        """
+        Args:
+            difusor (DifusorEventos): Difusor al que pertenece
+            job_id (str): Recibir solo los eventos de este trabajo, o None
+            impresora (str): Recibir solo los eventos de esta impresora, o None
+            capacidad (int): Eventos máximos retenidos sin leer
+            bucle (asyncio.AbstractEventLoop): Bucle desde el que se espera con
+                esperar_async(), o None para esperar desde un hilo
+        """
+        self.job_id = job_id
+        self.impresora = impresora
+        self.descartados = 0
+        self._difusor = difusor
+        self._eventos = deque(maxlen=capacidad)
+        self._sin_avisar = 0
+        self._condicion = threading.Condition()
+        self._bucle = bucle
+        self._hay_eventos = asyncio.Event() if bucle is not None else None
+
+    def acepta(self, evento):
+        return ((self.job_id is None or evento["job_id"] == self.job_id)
+                and (self.impresora is None or evento["impresora"] == self.impresora))
+
+    def entregar(self, evento):
+        """Agrega un evento sin bloquear; si el buffer está lleno se pierde el más antiguo."""
+        with self._condicion:
+            if len(self._eventos) == self._eventos.maxlen:
+                self.descartados += 1
+                self._sin_avisar += 1
+            self._eventos.append(evento)
+            self._condicion.notify()
+        if self._bucle is not None:
+            try:
+                self._bucle.call_soon_threadsafe(self._hay_eventos.set)
+            except RuntimeError:
+                # El bucle ya se cerró (servidor deteniéndose): nadie va a leer este evento
+                pass
+
+    def _tomar(self):
+        eventos = list(self._eventos)
+        self._eventos.clear()
+        if self._sin_avisar:
+            eventos.insert(0, {"evento": EVENTO_DESCARTADOS, "id": None, "descartados": self._sin_avisar})
+            self._sin_avisar = 0
+        return eventos
+
+    def esperar(self, timeout):
+        """
+        Espera eventos desde un hilo.
+
+        Args:
+            timeout (float): Segundos máximos de espera
+
+        Returns:
+            list: Eventos pendientes (vacía si venció el tiempo)
+        """
+        with self._condicion:
+            if not self._eventos:
+                self._condicion.wait(timeout)
+            return self._tomar()
+
+    async def esperar_async(self, timeout):
+        """Igual que esperar, desde el bucle de eventos indicado al suscribirse."""
+        with self._condicion:
+            if self._eventos:
+                return self._tomar()
+            self._hay_eventos.clear()
+        try:
+            await asyncio.wait_for(self._hay_eventos.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._condicion:
+            return self._tomar()
+
+    def cancelar(self):
+        self._difusor.cancelar(self)
+
+
+class DifusorEventos:
+    """Publica los eventos de los trabajos a todos los suscriptores interesados."""
+
+    def __init__(self):
+        self._suscripciones = []
+        self._secuencia = itertools.count(1)
+        self._candado = threading.Lock()
+        self._contadores = {"publicados": 0, "entregados": 0, "descartados": 0}
+
+    def suscribir(self, job_id=None, impresora=None, maximo=None, bucle=None,
+                  capacidad=CAPACIDAD_SUSCRIPTOR_EVENTOS):
+        """
+        Args:
+            job_id (str): Filtrar por trabajo, o None
+            impresora (str): Filtrar por impresora, o None
+            maximo (int): Suscripciones simultáneas permitidas, o None sin límite
+            bucle (asyncio.AbstractEventLoop): Bucle si se va a esperar con asyncio
+            capacidad (int): Eventos máximos retenidos sin leer
+
+        Returns:
+            Suscripcion: Suscripción registrada; hay que cancelarla al terminar
+
+        Raises:
+            Exception: Si se alcanzó el máximo de suscripciones
+        """
+        suscripcion = Suscripcion(self, job_id, impresora, capacidad, bucle)
+        with self._candado:
+            if maximo is not None and len(self._suscripciones) >= maximo:
+                raise Exception(f"El stream de eventos no está disponible: se alcanzó el máximo de {maximo} suscriptores.")
+            # Copia al escribir: publicar() recorre la lista sin tomar el candado
+            self._suscripciones = self._suscripciones + [suscripcion]
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._candado:
+            self._suscripciones = [actual for actual in self._suscripciones if actual is not suscripcion]
+            self._contadores["descartados"] += suscripcion.descartados
+
+    def publicar(self, tipo, trabajo):
+        """
+        Publica un evento de un trabajo. No bloquea aunque haya suscriptores lentos.
+
+        Args:
+            tipo (str): Uno de los EVENTO_*
+            trabajo (TrabajoImpresion): Trabajo al que corresponde
+        """
+        suscripciones = self._suscripciones
+        if not suscripciones:
+            return
+        evento = {
+            "evento": tipo,
+            "id": next(self._secuencia),
+            "job_id": trabajo.id,
+            "impresora": trabajo.impresora,
+            "estado": trabajo.estado,
+            "metodo": trabajo.metodo,
+            "error": trabajo.error,
+            "instante": time.time()
+        }
+        entregados = 0
+        for suscripcion in suscripciones:
+            if suscripcion.acepta(evento):
+                suscripcion.entregar(evento)
+                entregados += 1
+        with self._candado:
+            self._contadores["publicados"] += 1
+            self._contadores["entregados"] += entregados
+
+    def suscriptores(self):
+        """
+        Returns:
+            int: Suscripciones activas
+        """
+        return len(self._suscripciones)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Suscriptores activos y eventos publicados, entregados y descartados
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+            suscripciones = self._suscripciones
+        estadisticas["descartados"] += sum(suscripcion.descartados for suscripcion in suscripciones)
+        estadisticas["suscriptores"] = len(suscripciones)
+        return estadisticas
+
+
+# Comentario SSE que se envía si no hubo eventos, para mantener viva la conexión
+# y detectar a los clientes que se desconectaron
+LATIDO_SSE = b": latido\n\n"
+
+
+def formatear_evento_sse(evento):
+    """
+    Returns:
+        bytes: Evento en formato Server-Sent Events
+    """
+    lineas = []
+    if evento.get("id") is not None:
+        lineas.append(f"id: {evento['id']}")
+    lineas.append(f"event: {evento['evento']}")
+    lineas.append(f"data: {json.dumps(evento, ensure_ascii=False)}")
+    return ("\n".join(lineas) + "\n\n").encode("utf-8")
+
+
+def _es_final(suscripcion, evento):
+    # El stream de un solo trabajo termina cuando el trabajo termina
+    return suscripcion.job_id is not None and evento.get("estado") in EVENTOS_FINALES
+
+
+def flujo_eventos(suscripcion, inicial=None, latido=INTERVALO_LATIDO_EVENTOS):
+    """
+    Genera el cuerpo SSE de una suscripción (servidor WSGI) y la cancela al terminar.
+
+    Args:
+        suscripcion (Suscripcion): Suscripción ya registrada
+        inicial (dict): Estado actual del trabajo, si se filtra por trabajo
+        latido (float): Segundos sin eventos tras los que se envía un latido
+
+    Yields:
+        bytes: Fragmentos del stream
+    """
+    try:
+        if inicial is not None:
+            evento = dict(inicial, evento="estado", id=None)
+            yield formatear_evento_sse(evento)
+            if _es_final(suscripcion, evento):
+                return
+        while True:
+            eventos = suscripcion.esperar(latido)
+            if not eventos:
+                yield LATIDO_SSE
+            for evento in eventos:
+                yield formatear_evento_sse(evento)
+                if _es_final(suscripcion, evento):
+                    return
+    finally:
+        suscripcion.cancelar()
+
+
+async def flujo_eventos_async(suscripcion, inicial=None, latido=INTERVALO_LATIDO_EVENTOS):
+    """Igual que flujo_eventos, para la aplicación ASGI (la suscripción debe tener bucle)."""
+    try:
+        if inicial is not None:
+            evento = dict(inicial, evento="estado", id=None)
+            yield formatear_evento_sse(evento)
+            if _es_final(suscripcion, evento):
+                return
+        while True:
+            eventos = await suscripcion.esperar_async(latido)
+            if not eventos:
+                yield LATIDO_SSE
+            for evento in eventos:
+                yield formatear_evento_sse(evento)
+                if _es_final(suscripcion, evento):
+                    return
+    finally:
+        suscripcion.cancelar()
+
+
+# Instancia compartida por toda la aplicación
+difusor_eventos = DifusorEventos()
+
+registro_metricas.medidor(
+    "middleware_eventos_suscriptores",
+    "Clientes conectados a GET /events.",
+    (),
+    lambda: [((), difusor_eventos.suscriptores())]
+)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+"""
+Índice de idempotencia de envíos.
+Recuerda durante un tiempo limitado qué trabajo se creó para cada clave de
+idempotencia (cabecera Idempotency-Key) o para cada contenido (hash del archivo),
+para que los reintentos de un cliente no vuelvan a imprimir lo mismo.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    MAX_ENTRADAS_IDEMPOTENCIA,
+    TTL_IDEMPOTENCIA,
+    DEDUPLICAR_POR_CONTENIDO,
+    ESPERA_ORIGINAL_IDEMPOTENCIA,
+    TTL_DEDUPLICACION_CONTENIDO
+)
+from .cola_impresion import cola_impresion, ESTADO_FALLIDO
+
+
+class IndiceIdempotencia:
+    """
+    Índice LRU con vencimiento por entrada que asocia claves a identificadores de
+    trabajo. Cada entrada lleva un evento que se activa cuando su trabajo terminó
+    de encolarse (o no se pudo encolar), para que un reintento que llega mientras
+    tanto lo espere en lugar de darlo por perdido.
+    """
+
+    def __init__(self, max_entradas=MAX_ENTRADAS_IDEMPOTENCIA):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._candado = threading.Lock()
+        self._contadores = {"aciertos": 0, "fallos": 0, "vencidas": 0, "descartadas": 0}
+
+    def obtener_o_registrar(self, clave, job_id, huella, ttl):
+        """
+        Devuelve la entrada vigente de la clave o, si no existe, la registra de
+        forma atómica con el trabajo indicado.
+
+        Args:
+            clave (str): Clave de idempotencia o de contenido
+            job_id (str): Trabajo a registrar si la clave es nueva
+            huella (str): Hash del contenido asociado a la clave
+            ttl (float): Segundos durante los que la entrada es válida
+
+        Returns:
+            tuple: (job_id registrado, huella registrada, evento de encolado); si
+                job_id coincide con el recibido, la clave era nueva
+        """
+        ahora = time.monotonic()
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[2] > ahora:
+                    self._entradas.move_to_end(clave)
+                    self._contadores["aciertos"] += 1
+                    return entrada[0], entrada[1], entrada[3]
+                self._contadores["vencidas"] += 1
+
+            self._contadores["fallos"] += 1
+            encolado = threading.Event()
+            self._entradas[clave] = (job_id, huella, ahora + ttl, encolado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._contadores["descartadas"] += 1
+            return job_id, huella, encolado
+
+    def reemplazar(self, clave, anterior, job_id, huella, ttl):
+        """
+        Registra la clave con un trabajo nuevo si todavía apunta al anterior
+        (por ejemplo, cuando el trabajo original falló).
+
+        Returns:
+            bool: True si la clave pasó al trabajo nuevo
+        """
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] != anterior:
+                return False
+            self._entradas[clave] = (job_id, huella, time.monotonic() + ttl, threading.Event())
+            self._entradas.move_to_end(clave)
+            return True
+
+    def confirmar(self, clave, job_id):
+        """
+        Marca como encolado el trabajo de la clave, liberando a los reintentos que lo esperan.
+        """
+        with self._candado:
+            entrada = self._entradas.get(clave)
+        if entrada is not None and entrada[0] == job_id:
+            entrada[3].set()
+
+    def eliminar(self, clave, job_id):
+        """
+        Quita la clave si todavía apunta al trabajo indicado (por ejemplo, si no se
+        pudo encolar); los reintentos que lo esperaban vuelven a intentar registrarla.
+        """
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == job_id:
+                del self._entradas[clave]
+        if entrada is not None and entrada[0] == job_id:
+            entrada[3].set()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Aciertos, fallos, entradas vencidas y descartadas, y tamaño actual del índice
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+            estadisticas["entradas"] = len(self._entradas)
+        return estadisticas
+
+
+# Instancia compartida por toda la aplicación
+indice_idempotencia = IndiceIdempotencia()
+
+
+def encolar_idempotente(trabajo, clave_cliente=None, huella=None):
+    """
+    Encola un trabajo salvo que sea un reintento de uno reciente.
+
+    Con clave_cliente (cabecera Idempotency-Key) la deduplicación se hace por esa
+    clave, propia de cada cliente, durante TTL_IDEMPOTENCIA; sin ella, por el hash
+    del contenido enviado por el mismo cliente al mismo destino durante
+    TTL_DEDUPLICACION_CONTENIDO. Un reintento que llega
+    mientras el original todavía se encola espera a que termine. El trabajo
+    original se busca también en el almacén, ya que puede haber salido del
+    historial en memoria; solo si falló (o ya se purgó) se permite reimprimir.
+
+    Args:
+        trabajo (TrabajoImpresion): Trabajo nuevo, todavía sin encolar
+        clave_cliente (str): Valor de la cabecera Idempotency-Key, si se envió
+        huella (str): Hash SHA-256 del contenido, si se conoce
+
+    Returns:
+        tuple: (trabajo encolado, False) o (datos públicos del trabajo original, True)
+
+    Raises:
+        Exception: Si la clave ya se usó con otro contenido, el original todavía se
+            está encolando tras ESPERA_ORIGINAL_IDEMPOTENCIA o la cola está llena
+    """
+    if clave_cliente:
+        # Dos clientes que elijan la misma clave no se pisan
+        clave, ttl = f"clave:{trabajo.cliente or ''}:{clave_cliente}", TTL_IDEMPOTENCIA
+    elif huella and DEDUPLICAR_POR_CONTENIDO:
+        # El mismo contenido enviado a otro destino, o por otro cliente (dos estaciones
+        # que imprimen la misma etiqueta), no es un reintento
+        clave, ttl = f"contenido:{trabajo.cliente or ''}:{trabajo.destino or ''}:{huella}", TTL_DEDUPLICACION_CONTENIDO
+    else:
+        return cola_impresion.encolar_trabajo(trabajo), False
+
+    while True:
+        job_id, huella_registrada, encolado = indice_idempotencia.obtener_o_registrar(clave, trabajo.id, huella, ttl)
+        if job_id == trabajo.id:
+            break
+
+        if clave_cliente and huella and huella_registrada and huella != huella_registrada:
+            raise Exception("La clave de idempotencia ya se usó con otro contenido.")
+
+        # Mientras el original se encola todavía no figura en la cola ni en el almacén
+        if not encolado.wait(ESPERA_ORIGINAL_IDEMPOTENCIA):
+            raise Exception(f"El trabajo original {job_id} todavía se está encolando; reintenta en unos segundos.")
+
+        original = cola_impresion.estado_trabajo(job_id)
+        if original is not None and original["estado"] != ESTADO_FALLIDO:
+            print(f"Envío duplicado: se devuelve el trabajo {job_id} sin volver a imprimir.")
+            return original, True
+
+        # El original falló o ya se purgó del almacén: se acepta el reintento. Si no
+        # se pudo encolar, la clave ya no apunta a él y se vuelve a registrar.
+        if indice_idempotencia.reemplazar(clave, job_id, trabajo.id, huella, ttl):
+            break
+
+    try:
+        cola_impresion.encolar_trabajo(trabajo)
+    except Exception:
+        indice_idempotencia.eliminar(clave, trabajo.id)
+        raise
+    indice_idempotencia.confirmar(clave, trabajo.id)
+
+    return trabajo, False
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""
+Caché del inventario de impresoras.
+Evita enumerar las impresoras del sistema en cada petición: guarda el último
+resultado durante un TTL, lo refresca en segundo plano y agrupa las consultas
+concurrentes para que se haga a lo sumo una enumeración a la vez.
+"""
+
+import threading
+import time
+
+from config import TTL_INVENTARIO_IMPRESORAS, INTERVALO_REFRESCO_INVENTARIO
+
+
+class CacheInventario:
+    """
+    Caché con TTL y semántica stale-while-revalidate.
+
+    - Mientras el dato está vigente se devuelve sin consultar al sistema.
+    - Vencido el TTL se devuelve el dato anterior y se lanza un refresco en segundo plano.
+    - Si no hay dato (o fue invalidado) la petición espera a la carga.
+    - Las cargas concurrentes se agrupan: solo un hilo enumera, el resto espera su resultado.
+    """
+
+    def __init__(self, cargar, ttl=TTL_INVENTARIO_IMPRESORAS,
+                 intervalo_refresco=INTERVALO_REFRESCO_INVENTARIO):
+        """
+        Args:
+            cargar (callable): Función sin argumentos que devuelve el inventario actual
+            ttl (float): Segundos durante los que el inventario se considera vigente
+            intervalo_refresco (float): Segundos entre refrescos en segundo plano (0 lo desactiva)
+        """
+        self._cargar = cargar
+        self.ttl = ttl
+        self.intervalo_refresco = intervalo_refresco
+        self._candado = threading.Lock()
+        self._datos = None
+        self._cargado_en = None
+        self._valido = False
+        self._carga_en_curso = None
+        self._hilo_refresco = None
+        self._detener = threading.Event()
+        self._contadores = {"aciertos": 0, "obsoletos": 0, "esperas": 0, "cargas": 0, "errores": 0}
+
+    def obtener(self):
+        """
+        Devuelve el inventario, cargándolo o refrescándolo según corresponda.
+
+        Returns:
+            list: Inventario de impresoras
+
+        Raises:
+            Exception: Si no hay inventario previo y la carga falla
+        """
+        with self._candado:
+            if self._valido and self._datos is not None:
+                edad = time.monotonic() - self._cargado_en
+                if edad < self.ttl:
+                    self._contadores["aciertos"] += 1
+                    return list(self._datos)
+                self._contadores["obsoletos"] += 1
+                datos_obsoletos = list(self._datos)
+            else:
+                datos_obsoletos = None
+                self._contadores["esperas"] += 1
+
+        if datos_obsoletos is not None:
+            self._refrescar_en_segundo_plano()
+            return datos_obsoletos
+
+        error = self._cargar_agrupado()
+        with self._candado:
+            if self._datos is None:
+                raise error or Exception("No se pudo obtener el inventario de impresoras.")
+            return list(self._datos)
+
+    def invalidar(self):
+        """
+        Descarta el inventario vigente tras un cambio de estado (por ejemplo, al
+        cambiar la impresora predeterminada) y lanza su recarga inmediata.
+        Las lecturas siguientes esperan al inventario nuevo.
+        """
+        with self._candado:
+            self._valido = False
+        self._refrescar_en_segundo_plano()
+
+    def _refrescar_en_segundo_plano(self):
+        """Lanza una carga en otro hilo si no hay una en curso."""
+        with self._candado:
+            if self._carga_en_curso is not None:
+                return
+        threading.Thread(target=self._cargar_agrupado, name="refresco-inventario", daemon=True).start()
+
+    def _cargar_agrupado(self):
+        """
+        Ejecuta la carga o, si otro hilo ya la está haciendo, espera su resultado.
+
+        Returns:
+            Exception: El error de la carga, o None si fue exitosa
+        """
+        with self._candado:
+            evento = self._carga_en_curso
+            es_lider = evento is None
+            if es_lider:
+                evento = threading.Event()
+                evento.error = None
+                self._carga_en_curso = evento
+
+        if not es_lider:
+            evento.wait()
+            return evento.error
+
+        try:
+            datos = self._cargar()
+            with self._candado:
+                self._datos = datos
+                self._cargado_en = time.monotonic()
+                self._valido = True
+                self._contadores["cargas"] += 1
+        except Exception as e:
+            print(f"ERROR al refrescar el inventario de impresoras: {e}")
+            evento.error = e
+            with self._candado:
+                self._contadores["errores"] += 1
+        finally:
+            with self._candado:
+                self._carga_en_curso = None
+            evento.set()
+
+        return evento.error
+
+    def iniciar_refresco(self):
+        """Arranca el hilo que mantiene el inventario actualizado periódicamente."""
+        if self.intervalo_refresco <= 0 or self._hilo_refresco is not None:
+            return
+
+        def bucle_refresco():
+            while not self._detener.wait(self.intervalo_refresco):
+                self._cargar_agrupado()
+
+        self._hilo_refresco = threading.Thread(target=bucle_refresco, name="refresco-inventario-periodico", daemon=True)
+        self._hilo_refresco.start()
+
+    def detener(self):
+        """Detiene el refresco periódico."""
+        self._detener.set()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Contadores de aciertos, lecturas obsoletas, esperas, cargas y errores
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+            estadisticas["edad_segundos"] = (
+                time.monotonic() - self._cargado_en if self._cargado_en is not None else None
+            )
+        return estadisticas
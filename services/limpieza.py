@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+Limpieza de archivos temporales.
+Un único hilo elimina los archivos temporales cuando vence su plazo, usando un
+montículo ordenado por fecha límite en lugar de un hilo dormido por archivo.
+"""
+
+import glob
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from config import DIRECTORIO_TEMPORAL, MAX_REINTENTOS_LIMPIEZA, ESPERA_REINTENTO_LIMPIEZA
+from .metricas import registro_metricas
+
+# Prefijo de los archivos temporales que genera el middleware
+PREFIJO_TEMPORAL = "etiqueta_"
+
+
+def directorio_temporal():
+    """
+    Returns:
+        str: Directorio de los archivos temporales de esta instancia (se crea si no existe)
+    """
+    os.makedirs(DIRECTORIO_TEMPORAL, exist_ok=True)
+    return DIRECTORIO_TEMPORAL
+
+
+class LimpiadorTemporales:
+    """Programa y ejecuta la eliminación de archivos temporales desde un solo hilo."""
+
+    def __init__(self, max_reintentos=MAX_REINTENTOS_LIMPIEZA,
+                 espera_reintento=ESPERA_REINTENTO_LIMPIEZA):
+        self.max_reintentos = max_reintentos
+        self.espera_reintento = espera_reintento
+        self._monticulo = []
+        self._secuencia = itertools.count()
+        self._condicion = threading.Condition()
+        self._hilo = None
+        self._contadores = {"eliminados": 0, "fallidos": 0, "reintentos": 0, "barridos": 0}
+
+    def iniciar(self):
+        """Arranca el hilo de limpieza si todavía no está en ejecución."""
+        with self._condicion:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._bucle, name="limpieza-temporales", daemon=True)
+            self._hilo.start()
+
+    def programar(self, ruta_archivo, demora=0):
+        """
+        Programa la eliminación de un archivo.
+
+        Args:
+            ruta_archivo (str): Ruta del archivo temporal
+            demora (float): Segundos a esperar antes de eliminarlo
+        """
+        self.iniciar()
+        with self._condicion:
+            heapq.heappush(self._monticulo, (time.monotonic() + demora, next(self._secuencia), ruta_archivo, 0))
+            self._condicion.notify()
+
+    def _bucle(self):
+        """Espera al vencimiento más próximo y elimina los archivos vencidos."""
+        while True:
+            with self._condicion:
+                while not self._monticulo or self._monticulo[0][0] > time.monotonic():
+                    espera = self._monticulo[0][0] - time.monotonic() if self._monticulo else None
+                    self._condicion.wait(espera)
+                _, _, ruta_archivo, intentos = heapq.heappop(self._monticulo)
+
+            self._eliminar(ruta_archivo, intentos)
+
+    def _eliminar(self, ruta_archivo, intentos):
+        """
+        Elimina un archivo; si falla (por ejemplo, porque sigue abierto) lo reprograma.
+
+        Args:
+            ruta_archivo (str): Ruta del archivo
+            intentos (int): Intentos fallidos previos
+        """
+        try:
+            os.remove(ruta_archivo)
+            print(f"Archivo temporal '{ruta_archivo}' eliminado correctamente.")
+            resultado = "eliminados"
+        except FileNotFoundError:
+            resultado = "eliminados"
+        except Exception as e:
+            if intentos < self.max_reintentos:
+                with self._condicion:
+                    heapq.heappush(self._monticulo, (
+                        time.monotonic() + self.espera_reintento * (intentos + 1),
+                        next(self._secuencia), ruta_archivo, intentos + 1
+                    ))
+                    self._contadores["reintentos"] += 1
+                return
+            print(f"ADVERTENCIA: No se pudo eliminar el archivo temporal. Error: {e}")
+            resultado = "fallidos"
+
+        with self._condicion:
+            self._contadores[resultado] += 1
+
+    def ejecutar_pendientes(self):
+        """Elimina de inmediato todos los archivos programados (por ejemplo, al detener el servidor)."""
+        with self._condicion:
+            pendientes = [(ruta_archivo, intentos) for _, _, ruta_archivo, intentos in self._monticulo]
+            self._monticulo = []
+        for ruta_archivo, intentos in pendientes:
+            self._eliminar(ruta_archivo, self.max_reintentos)
+
+    def barrer_huerfanos(self, excluir=()):
+        """
+        Elimina los archivos temporales que quedaron de ejecuciones anteriores
+        (por ejemplo, tras un cierre inesperado). Solo se recorre el directorio de
+        esta instancia, no el temporal compartido del sistema.
+
+        Args:
+            excluir (iterable): Rutas que no deben eliminarse
+
+        Returns:
+            int: Archivos eliminados
+        """
+        excluir = {os.path.normcase(os.path.abspath(ruta)) for ruta in excluir}
+        with self._condicion:
+            excluir.update(os.path.normcase(os.path.abspath(ruta)) for _, _, ruta, _ in self._monticulo)
+
+        eliminados = 0
+        for ruta_archivo in glob.glob(os.path.join(directorio_temporal(), f"{PREFIJO_TEMPORAL}*")):
+            if os.path.normcase(os.path.abspath(ruta_archivo)) in excluir:
+                continue
+            try:
+                os.remove(ruta_archivo)
+                eliminados += 1
+            except Exception as e:
+                print(f"ADVERTENCIA: No se pudo eliminar el archivo huérfano '{ruta_archivo}'. Error: {e}")
+
+        with self._condicion:
+            self._contadores["barridos"] += eliminados
+        if eliminados:
+            print(f"Se eliminaron {eliminados} archivo(s) temporales huérfanos.")
+        return eliminados
+
+    def pendientes(self):
+        """
+        Returns:
+            int: Eliminaciones programadas que todavía no se ejecutaron
+        """
+        with self._condicion:
+            return len(self._monticulo)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Eliminaciones pendientes, realizadas, fallidas, reintentos y huérfanos barridos
+        """
+        with self._condicion:
+            estadisticas = dict(self._contadores)
+            estadisticas["pendientes"] = len(self._monticulo)
+        return estadisticas
+
+
+# Instancia compartida por toda la aplicación
+limpiador_temporales = LimpiadorTemporales()
+
+registro_metricas.medidor(
+    "middleware_limpieza_pendientes",
+    "Archivos temporales a la espera de ser eliminados.",
+    (),
+    lambda: [((), limpiador_temporales.pendientes())]
+)
+registro_metricas.medidor(
+    "middleware_limpieza_fallidos",
+    "Archivos temporales que no se pudieron eliminar tras agotar los reintentos.",
+    (),
+    lambda: [((), limpiador_temporales.estadisticas()["fallidos"])]
+)
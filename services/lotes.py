@@ -0,0 +1,521 @@
+# -*- coding: utf-8 -*-
+
+"""
+Impresión por lotes.
+Un lote agrupa varios documentos recibidos en una sola petición. Los documentos
+consecutivos del mismo tipo se combinan en un único archivo (PDFs unidos, TXT
+concatenados) y se envían al spooler de una sola vez, respetando el orden del
+lote e informando el resultado de cada documento por separado.
+
+Los lotes de prioridad masiva se imprimen por tramos de hasta PAGINAS_POR_TRAMO
+páginas y vuelven a la cola entre tramos, para que los trabajos urgentes se
+intercalen. Un PDF masivo grande se divide en tramos de páginas con el mismo fin,
+recién cuando un trabajador empieza a imprimirlo.
+"""
+
+import os
+import shutil
+import zipfile
+
+from config import (
+    BYTES_FIRMA,
+    EXTENSIONES_SOPORTADAS,
+    COMBINAR_DOCUMENTOS_LOTE,
+    MAX_DOCUMENTOS_LOTE,
+    MAX_TAMANO_ZIP_LOTE,
+    PAGINAS_POR_TRAMO,
+    PRIORIDAD_MASIVA,
+    PRIORIDAD_PREDETERMINADA
+)
+from utils import ValidationUtils
+from .cola_impresion import (
+    TrabajoImpresion,
+    ESTADO_EN_COLA,
+    ESTADO_IMPRIMIENDO,
+    ESTADO_COMPLETADO,
+    ESTADO_FALLIDO
+)
+from .almacen_trabajos import almacen_trabajos
+from .backends.base import ejecutar_en_hilo
+from .print_service import PrintService
+
+
+
+# Separador entre documentos de texto concatenados (salto de página)
+SEPARADOR_TXT = b"\f"
+BOM_UTF8 = b"\xef\xbb\xbf"
+
+
+class DocumentoLote:
+    """Un documento dentro de un lote, con su resultado individual."""
+
+    def __init__(self, indice, nombre_original, ruta_archivo, extension, paginas=None):
+        self.indice = indice
+        self.nombre_original = nombre_original
+        self.ruta_archivo = ruta_archivo
+        self.extension = extension
+        self.estado = ESTADO_EN_COLA
+        self.metodo = None
+        self.error = None
+        # Se cuentan al armar los tramos de un lote masivo (ver contar_paginas)
+        self.paginas = paginas
+
+    def contar_paginas(self):
+        """
+        Returns:
+            int: Páginas del documento (un TXT o un PDF ilegible cuentan como una)
+        """
+        if self.paginas is None:
+            self.paginas = 1
+            if self.extension == '.pdf':
+                try:
+                    from pypdf import PdfReader
+                    self.paginas = max(len(PdfReader(self.ruta_archivo).pages), 1)
+                except Exception:
+                    pass
+        return self.paginas
+
+    def a_dict(self):
+        """
+        Returns:
+            dict: Datos públicos del documento
+        """
+        return {
+            "indice": self.indice,
+            "archivo": self.nombre_original,
+            "estado": self.estado,
+            "metodo": self.metodo,
+            "error": self.error
+        }
+
+    def a_registro(self):
+        """
+        Returns:
+            dict: Datos del documento para el almacén de trabajos
+        """
+        registro = self.a_dict()
+        registro.update({"ruta_archivo": self.ruta_archivo, "extension": self.extension})
+        return registro
+
+    @classmethod
+    def desde_registro(cls, registro):
+        """
+        Reconstruye un documento guardado en el almacén. Los que no llegaron a
+        terminar vuelven a quedar en cola.
+        """
+        documento = cls(registro["indice"], registro["archivo"], registro["ruta_archivo"], registro["extension"])
+        if registro["estado"] in (ESTADO_COMPLETADO, ESTADO_FALLIDO):
+            documento.estado = registro["estado"]
+            documento.metodo = registro["metodo"]
+            documento.error = registro["error"]
+        return documento
+
+
+class TrabajoLote(TrabajoImpresion):
+    """Trabajo de impresión compuesto por varios documentos que se imprimen en orden."""
+
+    tipo = "lote"
+
+    def __init__(self, documentos, destino=None, cliente=None, prioridad=PRIORIDAD_PREDETERMINADA):
+        super().__init__(None, None, f"lote de {len(documentos)} documento(s)", destino, cliente, prioridad)
+        self.documentos = documentos
+        self._archivos_combinados = []
+
+    def _grupos_pendientes(self):
+        """
+        Returns:
+            list: Grupos de documentos que faltan imprimir; en un lote masivo, de
+                hasta PAGINAS_POR_TRAMO páginas cada uno
+        """
+        pendientes = [documento for documento in self.documentos
+                      if documento.estado not in (ESTADO_COMPLETADO, ESTADO_FALLIDO)]
+        return agrupar_consecutivos(pendientes, PAGINAS_POR_TRAMO if self.prioridad == PRIORIDAD_MASIVA else None)
+
+    def ejecutar(self):
+        """
+        Imprime los grupos de documentos consecutivos del mismo tipo, en orden.
+        Los documentos ya terminados (en un lote reanudado tras un reinicio) se omiten.
+
+        Returns:
+            str: Métodos de impresión utilizados, separados por comas
+
+        Raises:
+            Exception: Si ningún documento del lote pudo imprimirse
+        """
+        for grupo in self._grupos_pendientes():
+            self._imprimir_grupo(grupo)
+            # Guardar el avance para no reimprimir este grupo si el servidor se cae
+            almacen_trabajos.guardar(self, transicion=False)
+        return self._metodos()
+
+    def ejecutar_tramo(self):
+        """
+        En un lote masivo imprime solo el siguiente grupo; el resto, el lote completo.
+
+        Returns:
+            tuple: (métodos de impresión utilizados, terminado)
+        """
+        if self.prioridad != PRIORIDAD_MASIVA:
+            return self.ejecutar(), True
+        grupos = self._grupos_pendientes()
+        if grupos:
+            self._imprimir_grupo(grupos[0])
+            almacen_trabajos.guardar(self, transicion=False)
+        if len(grupos) > 1:
+            return None, False
+        return self._metodos(), True
+
+    async def ejecutar_tramo_async(self):
+        """
+        Igual que ejecutar_tramo, en un hilo (ver ejecutar_async).
+
+        Returns:
+            tuple: (métodos de impresión utilizados, terminado)
+        """
+        return await ejecutar_en_hilo(self.ejecutar_tramo)
+
+    def _metodos(self):
+        """
+        Returns:
+            str: Métodos de impresión utilizados, separados por comas
+
+        Raises:
+            Exception: Si ningún documento del lote pudo imprimirse
+        """
+        metodos = []
+        for documento in self.documentos:
+            if documento.metodo and documento.metodo not in metodos:
+                metodos.append(documento.metodo)
+
+        if not metodos:
+            raise Exception("Ningún documento del lote pudo imprimirse.")
+        return ",".join(metodos)
+
+    async def ejecutar_async(self):
+        """
+        Combinar PDFs es trabajo de CPU y disco: el lote completo se imprime en un hilo.
+
+        Returns:
+            str: Métodos de impresión utilizados, separados por comas
+        """
+        return await ejecutar_en_hilo(self.ejecutar)
+
+    def _imprimir_grupo(self, grupo):
+        """
+        Combina un grupo de documentos del mismo tipo y lo envía a la impresora.
+        Si no se pueden combinar, los documentos se envían uno por uno.
+
+        Args:
+            grupo (list): Documentos consecutivos con la misma extensión
+        """
+        for documento in grupo:
+            documento.estado = ESTADO_IMPRIMIENDO
+
+        extension = grupo[0].extension
+        envios = [(documento.ruta_archivo, [documento]) for documento in grupo]
+
+        if COMBINAR_DOCUMENTOS_LOTE and len(grupo) > 1:
+            try:
+                ruta_combinada, incluidos = combinar_documentos(grupo)
+                self._archivos_combinados.append(ruta_combinada)
+                envios = [(ruta_combinada, incluidos)]
+                print(f"Lote {self.id}: {len(incluidos)} documento(s) '{extension}' combinados en un solo envío.")
+            except Exception as e:
+                print(f"ADVERTENCIA: No se pudieron combinar los documentos del lote, se envían por separado. Error: {e}")
+
+        for ruta_archivo, documentos in envios:
+            try:
+                metodo = PrintService.ejecutar_impresion(ruta_archivo, extension, self.impresora,
+                                                         al_usar_respaldo=self.avisar_respaldo)
+                for documento in documentos:
+                    documento.metodo = metodo
+                    documento.estado = ESTADO_COMPLETADO
+            except Exception as e:
+                for documento in documentos:
+                    documento.error = str(e)
+                    documento.estado = ESTADO_FALLIDO
+
+    def archivos_temporales(self):
+        return [documento.ruta_archivo for documento in self.documentos] + self._archivos_combinados
+
+    def a_dict(self):
+        datos = super().a_dict()
+        datos["documentos"] = [documento.a_dict() for documento in self.documentos]
+        return datos
+
+    def a_registro(self):
+        registro = super().a_registro()
+        registro["documentos"] = [documento.a_registro() for documento in self.documentos]
+        return registro
+
+    @classmethod
+    def desde_registro(cls, registro):
+        trabajo = cls([DocumentoLote.desde_registro(documento) for documento in registro["documentos"]],
+                      registro["destino"], prioridad=registro["prioridad"] or PRIORIDAD_PREDETERMINADA)
+        trabajo.id = registro["job_id"]
+        trabajo.nombre_original = registro["archivo"]
+        trabajo.creado = registro["creado"]
+        return trabajo
+
+
+class TrabajoPdfMasivo(TrabajoLote):
+    """
+    PDF de prioridad masiva que se imprime por tramos de páginas. Se divide en el
+    trabajador, al imprimir el primer tramo: los reintentos y duplicados se
+    descartan antes de dividir nada y la petición no espera a pypdf.
+    """
+
+    tipo = "pdf_masivo"
+
+    def __init__(self, documentos, destino=None, cliente=None, prioridad=PRIORIDAD_MASIVA):
+        super().__init__(documentos, destino, cliente, prioridad)
+        self._dividido = False
+
+    @classmethod
+    def desde_pdf(cls, ruta_archivo, nombre_original, destino=None, cliente=None):
+        """
+        Args:
+            ruta_archivo (str): Ruta del PDF ya guardado
+            nombre_original (str): Nombre con el que el cliente envió el archivo
+            destino (str): Impresora o grupo de destino (None para la predeterminada)
+            cliente (str): Cliente que envió el archivo
+
+        Returns:
+            TrabajoPdfMasivo: Trabajo con el PDF completo como único documento
+        """
+        trabajo = cls([DocumentoLote(0, nombre_original, ruta_archivo, '.pdf')], destino, cliente)
+        trabajo.nombre_original = nombre_original
+        return trabajo
+
+    def ejecutar_tramo(self):
+        """
+        Divide el PDF en tramos si todavía no se hizo e imprime el siguiente.
+
+        Returns:
+            tuple: (métodos de impresión utilizados, terminado)
+        """
+        if not self._dividido:
+            self._dividir()
+            self._dividido = True
+        return super().ejecutar_tramo()
+
+    def _dividir(self):
+        """
+        Reemplaza el PDF completo por sus tramos. Un trabajo recuperado del almacén
+        que ya estaba dividido se deja como está.
+        """
+        if len(self.documentos) != 1:
+            return
+        original = self.documentos[0]
+        tramos = dividir_pdf(original.ruta_archivo, self.nombre_original)
+        if tramos is None:
+            return
+        self.documentos = tramos
+        # Eliminar el original recién cuando el almacén ya apunta a los tramos
+        almacen_trabajos.guardar(self, transicion=False)
+        almacen_trabajos.vaciar()
+        PrintService.programar_limpieza(original.ruta_archivo)
+
+
+def agrupar_consecutivos(documentos, max_paginas=None):
+    """
+    Agrupa los documentos consecutivos que comparten extensión, sin alterar el orden.
+
+    Args:
+        documentos (list): Documentos del lote
+        max_paginas (int): Páginas máximas por grupo, o None sin límite
+            (un documento más largo forma un grupo propio)
+
+    Returns:
+        list: Lista de grupos (listas de documentos)
+    """
+    grupos = []
+    paginas = 0
+    for documento in documentos:
+        if max_paginas is not None:
+            paginas_documento = documento.contar_paginas()
+        if (grupos and grupos[-1][0].extension == documento.extension
+                and (max_paginas is None or paginas + paginas_documento <= max_paginas)):
+            grupos[-1].append(documento)
+        else:
+            grupos.append([documento])
+            paginas = 0
+        if max_paginas is not None:
+            paginas += paginas_documento
+    return grupos
+
+
+def combinar_documentos(grupo):
+    """
+    Combina un grupo de documentos del mismo tipo en un único archivo temporal.
+    Los documentos que no se pueden leer se marcan como fallidos y se omiten.
+
+    Args:
+        grupo (list): Documentos con la misma extensión
+
+    Returns:
+        tuple: (ruta del archivo combinado, documentos incluidos)
+
+    Raises:
+        Exception: Si el tipo no se puede combinar o ningún documento es legible
+    """
+    extension = grupo[0].extension
+    ruta_combinada = PrintService.generar_ruta_temporal(extension)
+    incluidos = []
+
+    if extension == '.pdf':
+        # Dependencia opcional e importación diferida: pypdf tarda en cargarse y solo
+        # se necesita al unir PDFs; sin él los PDFs del lote se envían uno por uno
+        try:
+            from pypdf import PdfReader, PdfWriter
+        except ImportError:
+            raise Exception("pypdf no está instalado; no se pueden unir PDFs.")
+        escritor = PdfWriter()
+        for documento in grupo:
+            try:
+                for pagina in PdfReader(documento.ruta_archivo).pages:
+                    escritor.add_page(pagina)
+                incluidos.append(documento)
+            except Exception as e:
+                documento.error = f"PDF ilegible: {e}"
+                documento.estado = ESTADO_FALLIDO
+        if incluidos:
+            with open(ruta_combinada, "wb") as destino:
+                escritor.write(destino)
+
+    elif extension == '.txt':
+        with open(ruta_combinada, "wb") as destino:
+            for documento in grupo:
+                with open(documento.ruta_archivo, "rb") as origen:
+                    contenido = origen.read()
+                if incluidos:
+                    destino.write(SEPARADOR_TXT)
+                    # El BOM UTF-8 solo es válido al inicio del flujo combinado
+                    if contenido.startswith(BOM_UTF8):
+                        contenido = contenido[len(BOM_UTF8):]
+                destino.write(contenido)
+                incluidos.append(documento)
+
+    else:
+        raise Exception(f"No se pueden combinar archivos '{extension}'.")
+
+    if not incluidos:
+        raise Exception("Ningún documento del grupo pudo leerse.")
+    return ruta_combinada, incluidos
+
+
+def extraer_zip(archivo):
+    """
+    Extrae los documentos de un ZIP recibido al directorio temporal, en el orden
+    en que aparecen dentro del archivo.
+
+    Args:
+        archivo: Archivo ZIP recibido de la petición Flask
+
+    Returns:
+        list: Tuplas (nombre original, ruta temporal, extensión)
+
+    Raises:
+        Exception: Si el ZIP no es válido, contiene tipos no soportados o excede los límites
+    """
+    try:
+        zip_lote = zipfile.ZipFile(archivo.stream)
+    except zipfile.BadZipFile:
+        raise Exception("El archivo ZIP del lote no es válido.")
+
+    with zip_lote:
+        miembros = [info for info in zip_lote.infolist() if not info.is_dir()]
+        if not miembros:
+            raise Exception("No se recibió ningún documento dentro del ZIP.")
+        if len(miembros) > MAX_DOCUMENTOS_LOTE:
+            raise Exception(f"El lote excede el máximo de {MAX_DOCUMENTOS_LOTE} documentos.")
+        if sum(info.file_size for info in miembros) > MAX_TAMANO_ZIP_LOTE:
+            raise Exception(f"El contenido del ZIP excede el máximo de {MAX_TAMANO_ZIP_LOTE} bytes.")
+
+        for info in miembros:
+            _, extension = os.path.splitext(info.filename)
+            if extension.lower() not in EXTENSIONES_SOPORTADAS:
+                raise Exception(f"Tipo de archivo no soportado en el ZIP: '{info.filename}'. Solo se admiten {', '.join(EXTENSIONES_SOPORTADAS)}.")
+
+        extraidos = []
+        try:
+            for info in miembros:
+                nombre_original = os.path.basename(info.filename)
+                extension = os.path.splitext(nombre_original)[1].lower()
+                ruta_archivo = PrintService.generar_ruta_temporal(extension)
+                with zip_lote.open(info) as origen:
+                    inicio = origen.read(BYTES_FIRMA)
+                    ValidationUtils.validar_firma(nombre_original, extension, inicio)
+                    with open(ruta_archivo, "wb") as destino:
+                        destino.write(inicio)
+                        shutil.copyfileobj(origen, destino)
+                extraidos.append((nombre_original, ruta_archivo, extension))
+        except Exception:
+            for _, ruta_archivo, _ in extraidos:
+                PrintService.programar_limpieza(ruta_archivo)
+            raise
+
+    print(f"ZIP del lote extraído: {len(extraidos)} documento(s).")
+    return extraidos
+
+
+def crear_lote(documentos_guardados, destino=None, cliente=None, prioridad=PRIORIDAD_PREDETERMINADA):
+    """
+    Construye el trabajo de lote a partir de documentos ya guardados en disco.
+
+    Args:
+        documentos_guardados (list): Tuplas (nombre original, ruta temporal, extensión) en orden
+        destino (str): Impresora o grupo de destino (None para la predeterminada)
+        cliente (str): Cliente que envió el lote
+        prioridad (str): Prioridad del lote
+
+    Returns:
+        TrabajoLote: Trabajo listo para encolar
+    """
+    documentos = [
+        DocumentoLote(indice, nombre_original, ruta_archivo, extension)
+        for indice, (nombre_original, ruta_archivo, extension) in enumerate(documentos_guardados)
+    ]
+    return TrabajoLote(documentos, destino, cliente, prioridad)
+
+
+def dividir_pdf(ruta_archivo, nombre_original, paginas_por_tramo=PAGINAS_POR_TRAMO):
+    """
+    Divide un PDF en tramos de páginas, cada uno en su propio archivo temporal.
+    El archivo original no se modifica.
+
+    Args:
+        ruta_archivo (str): Ruta del PDF
+        nombre_original (str): Nombre con el que el cliente envió el archivo
+        paginas_por_tramo (int): Páginas máximas de cada tramo
+
+    Returns:
+        list: Un DocumentoLote por tramo, o None si el PDF no supera
+            paginas_por_tramo páginas o no se puede dividir
+    """
+    tramos = []
+    try:
+        from pypdf import PdfReader, PdfWriter
+        paginas = PdfReader(ruta_archivo).pages
+        if len(paginas) <= paginas_por_tramo:
+            return None
+        for desde in range(0, len(paginas), paginas_por_tramo):
+            hasta = min(desde + paginas_por_tramo, len(paginas))
+            escritor = PdfWriter()
+            for pagina in paginas[desde:hasta]:
+                escritor.add_page(pagina)
+            # Registrar el tramo antes de escribirlo, así se limpia aunque la escritura falle
+            ruta_tramo = PrintService.generar_ruta_temporal('.pdf')
+            tramos.append(DocumentoLote(len(tramos), f"{nombre_original} (páginas {desde + 1}-{hasta})",
+                                        ruta_tramo, '.pdf', paginas=hasta - desde))
+            with open(ruta_tramo, "wb") as destino_tramo:
+                escritor.write(destino_tramo)
+    except Exception as e:
+        # Sin pypdf o con un PDF que no se puede leer, se imprime completo
+        print(f"ADVERTENCIA: No se pudo dividir '{nombre_original}' en tramos, se imprime completo. Error: {e}")
+        for documento in tramos:
+            PrintService.programar_limpieza(documento.ruta_archivo)
+        return None
+
+    print(f"PDF masivo '{nombre_original}' dividido en {len(tramos)} tramo(s) de hasta {paginas_por_tramo} páginas.")
+    return tramos
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""
+Métricas del middleware en formato de texto de Prometheus.
+Implementación mínima de contadores, histogramas y medidores: registrar un
+valor cuesta un lock y una búsqueda binaria, por lo que puede quedar activa
+en producción.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# Límites superiores (en segundos) de los buckets de los histogramas de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60)
+
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    """
+    Returns:
+        str: Etiquetas en formato Prometheus, ej. '{metodo="GET",codigo="200"}'
+    """
+    pares = list(zip(nombres, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ""
+    partes = []
+    for nombre, valor in pares:
+        valor = str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        partes.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _formatear_numero(valor):
+    """
+    Returns:
+        str: Número en el formato que espera Prometheus
+    """
+    if valor == float("inf"):
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class Contador:
+    """Contador monótono con etiquetas."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._candado = threading.Lock()
+
+    def inc(self, valor=1, **etiquetas):
+        """Incrementa el contador para la combinación de etiquetas indicada."""
+        clave = tuple(etiquetas.get(nombre, "") for nombre in self.etiquetas)
+        with self._candado:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def exportar(self):
+        """
+        Returns:
+            list: Líneas de texto de la métrica
+        """
+        with self._candado:
+            valores = list(self._valores.items())
+        return [
+            f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(valor)}"
+            for clave, valor in valores
+        ]
+
+
+class Histograma:
+    """Histograma acumulativo con buckets fijos y etiquetas."""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._candado = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        """Registra una observación para la combinación de etiquetas indicada."""
+        clave = tuple(etiquetas.get(nombre, "") for nombre in self.etiquetas)
+        indice = bisect_left(self.buckets, valor)
+        with self._candado:
+            serie = self._series.get(clave)
+            if serie is None:
+                # [conteos por bucket (+Inf al final), suma]
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        """Mide la duración del bloque y la registra al salir, aunque haya excepción."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def exportar(self):
+        """
+        Returns:
+            list: Líneas de texto de la métrica
+        """
+        with self._candado:
+            series = [(clave, list(serie[0]), serie[1]) for clave, serie in self._series.items()]
+
+        lineas = []
+        for clave, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += conteo
+                etiquetas = _formatear_etiquetas(self.etiquetas, clave, ("le", _formatear_numero(limite)))
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_formatear_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {acumulado}")
+        return lineas
+
+
+class Medidor:
+    """Valor instantáneo que se calcula en el momento de exportar."""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas, obtener):
+        """
+        Args:
+            obtener (callable): Devuelve una lista de tuplas (valores de etiquetas, valor)
+        """
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._obtener = obtener
+
+    def exportar(self):
+        return [
+            f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(valor)}"
+            for clave, valor in self._obtener()
+        ]
+
+
+class RegistroMetricas:
+    """Conjunto de métricas que se exportan juntas en /metrics."""
+
+    def __init__(self):
+        self._metricas = []
+        self._candado = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._candado:
+            self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def medidor(self, nombre, ayuda, etiquetas, obtener):
+        return self._registrar(Medidor(nombre, ayuda, etiquetas, obtener))
+
+    def exportar(self):
+        """
+        Returns:
+            str: Todas las métricas en formato de texto de Prometheus
+        """
+        with self._candado:
+            metricas = list(self._metricas)
+
+        lineas = []
+        for metrica in metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            try:
+                lineas.extend(metrica.exportar())
+            except Exception as e:
+                print(f"ERROR al exportar la métrica '{metrica.nombre}': {e}")
+        return "\n".join(lineas) + "\n"
+
+
+# Registro compartido por toda la aplicación y métricas comunes
+registro_metricas = RegistroMetricas()
+
+PETICIONES_HTTP = registro_metricas.contador(
+    "middleware_http_peticiones_total",
+    "Peticiones HTTP atendidas por ruta, método y código de estado.",
+    ("ruta", "metodo", "codigo")
+)
+DURACION_HTTP = registro_metricas.histograma(
+    "middleware_http_duracion_segundos",
+    "Duración de las peticiones HTTP por ruta.",
+    ("ruta",)
+)
+DURACION_ETAPA = registro_metricas.histograma(
+    "middleware_impresion_etapa_segundos",
+    "Duración de cada etapa del proceso de impresión (plantilla, guardar, espera_cola, sumatra, powershell, respaldo).",
+    ("etapa",)
+)
+TRABAJOS_IMPRESION = registro_metricas.contador(
+    "middleware_impresion_trabajos_total",
+    "Trabajos de impresión terminados por resultado.",
+    ("resultado",)
+)
+ACTIVACIONES_RESPALDO = registro_metricas.contador(
+    "middleware_impresion_respaldo_total",
+    "Veces que se recurrió al método de respaldo, por extensión del archivo.",
+    ("extension",)
+)
+DURACION_WMI = registro_metricas.histograma(
+    "middleware_wmi_operacion_segundos",
+    "Duración de las operaciones WMI, incluida la espera por una sesión libre.",
+    ("resultado",)
+)
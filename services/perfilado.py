@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+
+"""
+Perfilado a demanda de las peticiones de impresión.
+Una petición se perfila si trae la cabecera CABECERA_PERFILADO junto con la
+clave de administración, o al azar según TASA_MUESTREO_PERFILES. Su perfil
+(cProfile, o muestreo de la pila del hilo) cubre la petición y la impresión
+del trabajo que encola, y se acompaña de la duración de cada etapa (validar,
+guardar, método de impresión, respaldo, limpieza). Los perfiles se
+guardan en memoria, en un anillo de MAX_PERFILES entradas.
+
+Sin una traza activa, etapa() devuelve un contexto vacío compartido: el costo
+de los puntos de medición es una consulta a una variable de contexto.
+"""
+
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import (
+    CABECERA_CLAVE_ADMIN,
+    CABECERA_PERFILADO,
+    CLAVE_ADMIN,
+    INTERVALO_MUESTREO_PILA,
+    MAX_PERFILES,
+    MAX_ETAPAS_PERFIL,
+    MODO_PERFIL_MUESTREO,
+    TASA_MUESTREO_PERFILES
+)
+from .metricas import registro_metricas
+
+# Modos de perfilado: cProfile (determinista, una traza a la vez) o muestreo de la pila
+MODO_CPROFILE = "cprofile"
+MODO_MUESTREO = "muestreo"
+MODOS_PERFIL = (MODO_CPROFILE, MODO_MUESTREO)
+
+# Formatos en que se descarga un perfil
+FORMATOS_PERFIL = ("texto", "pstats", "colapsado")
+
+# Traza de la petición o trabajo que se está ejecutando en este hilo o tarea
+_traza_actual = ContextVar("traza_actual", default=None)
+
+# cProfile no admite dos perfiladores activos a la vez en Python 3.12+; con uno
+# ocupado, las demás trazas pasan a muestrear la pila
+_candado_cprofile = threading.Lock()
+
+
+class _SinTraza:
+    """Contexto vacío que se usa cuando no hay una traza activa."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+_SIN_TRAZA = _SinTraza()
+
+
+def traza_actual():
+    """
+    Returns:
+        Traza: Traza activa en este hilo o tarea, o None
+    """
+    return _traza_actual.get()
+
+
+def etapa(nombre):
+    """
+    Mide un bloque como etapa de la traza activa; sin traza no hace nada.
+
+    Args:
+        nombre (str): Etapa medida (ej. 'guardar', 'sumatra')
+
+    Returns:
+        Contexto que registra la etapa al salir
+    """
+    traza = _traza_actual.get()
+    if traza is None:
+        return _SIN_TRAZA
+    return traza.etapa(nombre)
+
+
+def registrar_etapa(nombre, duracion):
+    """
+    Registra en la traza activa una etapa ya medida que acaba de terminar.
+
+    Args:
+        nombre (str): Etapa medida
+        duracion (float): Segundos que duró
+    """
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.agregar_etapa(nombre, time.perf_counter() - duracion, duracion)
+
+
+class MuestreadorPila:
+    """
+    Hilo que lee cada INTERVALO_MUESTREO_PILA segundos la pila de otro hilo y
+    cuenta las pilas vistas, en formato colapsado ('raíz;...;hoja').
+    """
+
+    def __init__(self, id_hilo, intervalo=INTERVALO_MUESTREO_PILA):
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._detenido = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name="muestreo-pila", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        """
+        Returns:
+            Counter: Muestras por pila colapsada
+        """
+        self._detenido.set()
+        self._hilo.join()
+        return self.pilas
+
+    def _bucle(self):
+        while not self._detenido.wait(self.intervalo):
+            marco = sys._current_frames().get(self.id_hilo)
+            if marco is None:
+                continue
+            nombres = []
+            while marco is not None:
+                codigo = marco.f_code
+                nombres.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                marco = marco.f_back
+            self.pilas[";".join(reversed(nombres))] += 1
+
+
+class Traza:
+    """
+    Perfil y etapas de una petición perfilada. Se activa en el hilo de la
+    petición y después en el del trabajo encolado, así que junta varios segmentos.
+    """
+
+    def __init__(self, modo, origen, ruta):
+        """
+        Args:
+            modo (str): 'cprofile' o 'muestreo'
+            origen (str): 'cabecera' (pedida por un administrador) o 'muestreo' (al azar)
+            ruta (str): Ruta de la petición perfilada
+        """
+        self.id = uuid.uuid4().hex
+        self.modo = modo
+        self.origen = origen
+        self.ruta = ruta
+        self.creado = time.time()
+        self.segmentos = 0
+        self.etapas_descartadas = 0
+        self._inicio = time.perf_counter()
+        self._candado = threading.Lock()
+        self._etapas = []
+        self._estadisticas = None
+        self._pilas = Counter()
+
+    @contextmanager
+    def activar(self):
+        """Hace de esta la traza activa del hilo o tarea mientras dura el bloque."""
+        token = _traza_actual.set(self)
+        try:
+            yield self
+        finally:
+            _traza_actual.reset(token)
+
+    @contextmanager
+    def perfilar(self, segmento):
+        """
+        Perfila el bloque y lo registra como etapa. Con cProfile ocupado por otra
+        traza (o por otra herramienta), el segmento se perfila por muestreo.
+
+        Bajo asyncio el perfil también incluye lo que hagan las demás tareas del
+        bucle mientras el bloque espera.
+
+        Args:
+            segmento (str): Nombre de la etapa (ej. 'peticion', 'trabajo <id>')
+        """
+        perfilador = None
+        if self.modo == MODO_CPROFILE and _candado_cprofile.acquire(blocking=False):
+            perfilador = cProfile.Profile()
+            try:
+                perfilador.enable()
+            except ValueError:
+                _candado_cprofile.release()
+                perfilador = None
+
+        muestreador = None
+        if perfilador is None:
+            muestreador = MuestreadorPila(threading.get_ident())
+            muestreador.iniciar()
+
+        try:
+            with self.etapa(segmento):
+                yield self
+        finally:
+            if perfilador is not None:
+                perfilador.disable()
+                _candado_cprofile.release()
+                self._agregar_perfil(perfilador)
+            else:
+                self._agregar_pilas(muestreador.detener())
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide el bloque y lo registra como etapa, aunque haya excepción."""
+        inicio = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            self.agregar_etapa(nombre, inicio, time.perf_counter() - inicio, error)
+
+    def agregar_etapa(self, nombre, inicio, duracion, error=None):
+        """
+        Args:
+            nombre (str): Etapa medida
+            inicio (float): Momento de inicio (time.perf_counter())
+            duracion (float): Segundos que duró
+            error (str): Error con que terminó, si lo hubo
+        """
+        with self._candado:
+            if len(self._etapas) >= MAX_ETAPAS_PERFIL:
+                self.etapas_descartadas += 1
+                return
+            self._etapas.append({
+                "nombre": nombre,
+                "inicio_ms": round((inicio - self._inicio) * 1000, 3),
+                "duracion_ms": round(duracion * 1000, 3),
+                "hilo": threading.current_thread().name,
+                "error": error
+            })
+
+    def _agregar_perfil(self, perfilador):
+        with self._candado:
+            self.segmentos += 1
+            if self._estadisticas is None:
+                self._estadisticas = pstats.Stats(perfilador, stream=io.StringIO())
+            else:
+                self._estadisticas.add(perfilador)
+
+    def _agregar_pilas(self, pilas):
+        with self._candado:
+            self.segmentos += 1
+            self._pilas.update(pilas)
+
+    def exportar(self, formato):
+        """
+        Args:
+            formato (str): 'texto' (legible), 'pstats' (para pstats/snakeviz) o
+                'colapsado' (pilas muestreadas, para flamegraph.pl/speedscope)
+
+        Returns:
+            tuple: (contenido en bytes, tipo MIME)
+
+        Raises:
+            Exception: Si el formato no es válido o la traza no tiene datos en ese formato
+        """
+        if formato not in FORMATOS_PERFIL:
+            raise Exception(f"El formato '{formato}' no es válido. Usa: {', '.join(FORMATOS_PERFIL)}.")
+
+        with self._candado:
+            if formato == "pstats":
+                if self._estadisticas is None:
+                    raise Exception(f"El perfil {self.id} no existe en formato pstats (se tomó por muestreo).")
+                return marshal.dumps(self._estadisticas.stats), "application/octet-stream"
+
+            if formato == "colapsado":
+                if not self._pilas:
+                    raise Exception(f"El perfil {self.id} no existe en formato colapsado (se tomó con cProfile).")
+                lineas = [f"{pila} {muestras}" for pila, muestras in self._pilas.most_common()]
+                return ("\n".join(lineas) + "\n").encode("utf-8"), "text/plain; charset=utf-8"
+
+            salida = io.StringIO()
+            salida.write(f"Perfil {self.id} de {self.ruta} ({self.modo}, {self.origen})\n\nEtapas:\n")
+            for datos in sorted(self._etapas, key=lambda datos: datos["inicio_ms"]):
+                error = f"  ERROR: {datos['error']}" if datos["error"] else ""
+                salida.write(f"  {datos['inicio_ms']:>10.1f} ms  {datos['duracion_ms']:>10.1f} ms  "
+                             f"{datos['nombre']} [{datos['hilo']}]{error}\n")
+            if self._estadisticas is not None:
+                salida.write("\ncProfile (ordenado por tiempo acumulado):\n")
+                self._estadisticas.stream = salida
+                self._estadisticas.sort_stats("cumulative").print_stats(50)
+            if self._pilas:
+                total = sum(self._pilas.values())
+                salida.write(f"\nPilas más frecuentes ({total} muestras):\n")
+                for pila, muestras in self._pilas.most_common(20):
+                    salida.write(f"  {muestras:>6}  {pila.rsplit(';', 1)[-1]}\n            {pila}\n")
+            return salida.getvalue().encode("utf-8"), "text/plain; charset=utf-8"
+
+    def a_dict(self):
+        """
+        Returns:
+            dict: Datos del perfil y sus etapas
+        """
+        with self._candado:
+            return {
+                "profile_id": self.id,
+                "ruta": self.ruta,
+                "modo": self.modo,
+                "origen": self.origen,
+                "creado": self.creado,
+                "segmentos": self.segmentos,
+                "muestras": sum(self._pilas.values()),
+                "etapas": sorted(self._etapas, key=lambda datos: datos["inicio_ms"]),
+                "etapas_descartadas": self.etapas_descartadas
+            }
+
+
+class RegistroPerfiles:
+    """Decide qué peticiones se perfilan y conserva los últimos perfiles."""
+
+    def __init__(self, clave_admin=CLAVE_ADMIN, tasa=TASA_MUESTREO_PERFILES, maximo=MAX_PERFILES,
+                 modo_muestreo=MODO_PERFIL_MUESTREO):
+        """
+        Args:
+            clave_admin (str): Clave para pedir perfiles y descargarlos (None lo deshabilita)
+            tasa (float): Probabilidad (0 a 1) de perfilar una petición al azar
+            maximo (int): Perfiles que se conservan (se descartan los más viejos)
+            modo_muestreo (str): Modo de los perfiles tomados al azar
+        """
+        self.clave_admin = clave_admin
+        self.tasa = tasa
+        self.maximo = maximo
+        self.modo_muestreo = modo_muestreo
+        self._candado = threading.Lock()
+        self._perfiles = OrderedDict()
+        self._contadores = {"cabecera": 0, "muestreo": 0, "descartados": 0}
+
+    def es_admin(self, cabeceras):
+        """
+        Args:
+            cabeceras: Cabeceras de la petición
+
+        Returns:
+            bool: True si la petición trae la clave de administración
+        """
+        if not self.clave_admin:
+            return False
+        clave = cabeceras.get(CABECERA_CLAVE_ADMIN) or ""
+        return hmac.compare_digest(clave.encode("utf-8"), self.clave_admin.encode("utf-8"))
+
+    def decidir(self, cabeceras, ruta):
+        """
+        Decide si se perfila una petición y, si es así, crea y guarda su traza.
+
+        Args:
+            cabeceras: Cabeceras de la petición
+            ruta (str): Ruta de la petición
+
+        Returns:
+            Traza: Traza de la petición, o None si no se perfila
+        """
+        pedido = cabeceras.get(CABECERA_PERFILADO)
+        if pedido and self.es_admin(cabeceras):
+            pedido = pedido.strip().lower()
+            traza = Traza(pedido if pedido in MODOS_PERFIL else MODO_CPROFILE, "cabecera", ruta)
+        elif self.tasa and random.random() < self.tasa:
+            traza = Traza(self.modo_muestreo, "muestreo", ruta)
+        else:
+            return None
+
+        with self._candado:
+            self._contadores[traza.origen] += 1
+            self._perfiles[traza.id] = traza
+            while len(self._perfiles) > self.maximo:
+                self._perfiles.popitem(last=False)
+                self._contadores["descartados"] += 1
+        return traza
+
+    def obtener(self, profile_id):
+        """
+        Raises:
+            Exception: Si el perfil no existe (o ya se descartó)
+        """
+        with self._candado:
+            traza = self._perfiles.get(profile_id)
+        if traza is None:
+            raise Exception(f"El perfil {profile_id} no existe.")
+        return traza
+
+    def guardados(self):
+        """
+        Returns:
+            int: Perfiles guardados en memoria
+        """
+        with self._candado:
+            return len(self._perfiles)
+
+    def listar(self):
+        """
+        Returns:
+            list: Perfiles guardados, del más reciente al más viejo
+        """
+        with self._candado:
+            trazas = list(self._perfiles.values())
+        return [traza.a_dict() for traza in reversed(trazas)]
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Perfiles tomados por origen, descartados y guardados
+        """
+        with self._candado:
+            return dict(self._contadores, guardados=len(self._perfiles), tasa=self.tasa,
+                        habilitado=bool(self.clave_admin))
+
+
+# Instancia compartida por toda la aplicación
+registro_perfiles = RegistroPerfiles()
+
+registro_metricas.medidor(
+    "middleware_perfiles_guardados",
+    "Perfiles de peticiones guardados en memoria.",
+    (),
+    lambda: [((), registro_perfiles.guardados())]
+)
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+
+"""
+Plantillas de etiquetas.
+Las plantillas se registran una vez (y se guardan en DIRECTORIO_PLANTILLAS);
+luego cada etiqueta se pide con un JSON pequeño y el middleware la genera en
+TXT o en PDF. Las plantillas se compilan al primer uso (partes fijas del PDF e
+imágenes ya serializadas) y se guardan en una caché LRU.
+"""
+
+import base64
+import binascii
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from string import Template
+
+from config import DIRECTORIO_PLANTILLAS, MAX_PLANTILLAS_COMPILADAS
+
+
+# Nombres de plantilla admitidos (también son nombres de archivo)
+PATRON_NOMBRE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Conversión de milímetros a puntos PDF (1/72 de pulgada)
+MM_A_PUNTOS = 72 / 25.4
+
+# Fuentes estándar de PDF: no hace falta incrustarlas
+FUENTES_PDF = (("F1", "Helvetica"), ("F2", "Helvetica-Bold"))
+
+# Marcadores SOF de JPEG que indican las dimensiones de la imagen
+_MARCADORES_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _numero(valor):
+    """
+    Returns:
+        str: Número con a lo sumo dos decimales, como se escribe en un PDF
+    """
+    return f"{valor:.2f}".rstrip("0").rstrip(".")
+
+
+def _escapar_texto_pdf(texto):
+    """
+    Returns:
+        bytes: Texto en WinAnsiEncoding listo para ir entre paréntesis en un PDF
+    """
+    datos = texto.encode("cp1252", errors="replace")
+    return datos.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").replace(b"\r", b"").replace(b"\n", b" ")
+
+
+def _dimensiones_jpeg(datos):
+    """
+    Lee ancho, alto y cantidad de componentes de un JPEG.
+
+    Returns:
+        tuple: (ancho, alto, componentes)
+
+    Raises:
+        Exception: Si los datos no son un JPEG
+    """
+    if not datos.startswith(b"\xff\xd8"):
+        raise Exception("El recurso no es válido: solo se admiten imágenes JPEG.")
+    posicion = 2
+    while posicion + 9 < len(datos):
+        if datos[posicion] != 0xFF:
+            posicion += 1
+            continue
+        marcador = datos[posicion + 1]
+        longitud = int.from_bytes(datos[posicion + 2:posicion + 4], "big")
+        if marcador in _MARCADORES_SOF:
+            alto = int.from_bytes(datos[posicion + 5:posicion + 7], "big")
+            ancho = int.from_bytes(datos[posicion + 7:posicion + 9], "big")
+            return ancho, alto, datos[posicion + 9]
+        posicion += 2 + longitud
+    raise Exception("El recurso no es válido: no se encontraron las dimensiones del JPEG.")
+
+
+class PlantillaTxt:
+    """Plantilla de texto plano con campos ${campo}."""
+
+    extension = '.txt'
+
+    def __init__(self, nombre, definicion):
+        self.nombre = nombre
+        contenido = definicion.get("contenido")
+        if not isinstance(contenido, str):
+            raise Exception("El campo 'contenido' de la plantilla TXT no es válido.")
+        self._plantilla = Template(contenido)
+
+    def renderizar(self, datos):
+        """
+        Returns:
+            bytes: Texto en UTF-8 con BOM (PowerShell lo lee como UTF-8 solo si tiene BOM)
+        """
+        try:
+            return self._plantilla.substitute(datos).encode("utf-8-sig")
+        except KeyError as e:
+            raise Exception(f"Falta el campo {e} en los datos de la plantilla '{self.nombre}'.")
+        except ValueError as e:
+            raise Exception(f"La plantilla '{self.nombre}' no es válida: {e}")
+
+
+class PlantillaPdf:
+    """
+    Plantilla de una página PDF con textos, líneas, rectángulos e imágenes JPEG.
+    Las coordenadas se expresan en milímetros desde la esquina superior izquierda;
+    la 'y' de un texto es su línea base.
+    """
+
+    extension = '.pdf'
+
+    def __init__(self, nombre, definicion):
+        self.nombre = nombre
+        try:
+            ancho = float(definicion["ancho"]) * MM_A_PUNTOS
+            self._alto = float(definicion["alto"]) * MM_A_PUNTOS
+        except (KeyError, TypeError, ValueError):
+            raise Exception("Los campos 'ancho' y 'alto' (mm) de la plantilla PDF no son válidos.")
+
+        imagenes = self._compilar_recursos(definicion.get("recursos") or {})
+        self._partes = self._compilar_elementos(definicion.get("elementos") or [], imagenes)
+
+        # Objetos fijos: catálogo, páginas, página, fuentes e imágenes. El contenido va al final.
+        primer_imagen = 4 + len(FUENTES_PDF)
+        self._numero_contenido = primer_imagen + len(imagenes)
+        fuentes = " ".join(f"/{alias} {4 + i} 0 R" for i, (alias, _) in enumerate(FUENTES_PDF))
+        xobjetos = " ".join(f"/{alias} {primer_imagen + i} 0 R" for i, alias in enumerate(imagenes))
+        objetos = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_numero(ancho)} {_numero(self._alto)}] "
+             f"/Resources << /Font << {fuentes} >> /XObject << {xobjetos} >> >> "
+             f"/Contents {self._numero_contenido} 0 R >>").encode("ascii"),
+        ]
+        objetos += [
+            f"<< /Type /Font /Subtype /Type1 /BaseFont /{fuente} /Encoding /WinAnsiEncoding >>".encode("ascii")
+            for _, fuente in FUENTES_PDF
+        ]
+        objetos += [objeto for objeto, _ in imagenes.values()]
+
+        prefijo = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._desplazamientos = []
+        for numero, objeto in enumerate(objetos, start=1):
+            self._desplazamientos.append(len(prefijo))
+            prefijo += f"{numero} 0 obj\n".encode("ascii") + objeto + b"\nendobj\n"
+        self._prefijo = bytes(prefijo)
+
+    @staticmethod
+    def _compilar_recursos(recursos):
+        """
+        Returns:
+            OrderedDict: alias -> (objeto XObject serializado, nombre del recurso)
+        """
+        imagenes = OrderedDict()
+        for indice, (nombre_recurso, contenido) in enumerate(recursos.items()):
+            try:
+                datos = base64.b64decode(contenido, validate=True)
+            except (binascii.Error, TypeError, ValueError):
+                raise Exception(f"El recurso '{nombre_recurso}' no es válido: debe estar en base64.")
+            ancho, alto, componentes = _dimensiones_jpeg(datos)
+            espacio = {1: "/DeviceGray", 4: "/DeviceCMYK"}.get(componentes, "/DeviceRGB")
+            objeto = (
+                f"<< /Type /XObject /Subtype /Image /Width {ancho} /Height {alto} "
+                f"/ColorSpace {espacio} /BitsPerComponent 8 /Filter /DCTDecode /Length {len(datos)} >>\nstream\n"
+            ).encode("ascii") + datos + b"\nendstream"
+            imagenes[f"Im{indice}"] = (objeto, nombre_recurso)
+        return imagenes
+
+    def _compilar_elementos(self, elementos, imagenes):
+        """
+        Convierte los elementos en operadores PDF. Los que no tienen campos quedan
+        serializados; los textos con ${campo} quedan como plantillas.
+
+        Returns:
+            list: Partes del contenido (bytes o tuplas (Template, prefijo, sufijo))
+        """
+        alias_imagen = {nombre_recurso: alias for alias, (_, nombre_recurso) in imagenes.items()}
+        alto = self._alto
+
+        def pt(valor):
+            return _numero(float(valor) * MM_A_PUNTOS)
+
+        partes = []
+        for indice, elemento in enumerate(elementos):
+            try:
+                tipo = elemento["tipo"]
+                if tipo == "texto":
+                    fuente = "F2" if elemento.get("negrita") else "F1"
+                    tamano = float(elemento.get("tamano", 10))
+                    prefijo = (f"BT /{fuente} {_numero(tamano)} Tf {pt(elemento['x'])} "
+                               f"{_numero(alto - float(elemento['y']) * MM_A_PUNTOS)} Td (").encode("ascii")
+                    sufijo = b") Tj ET\n"
+                    texto = str(elemento["texto"])
+                    if "$" in texto:
+                        partes.append((Template(texto), prefijo, sufijo))
+                    else:
+                        partes.append(prefijo + _escapar_texto_pdf(texto) + sufijo)
+                elif tipo == "linea":
+                    partes.append((
+                        f"{pt(elemento.get('grosor', 0.3))} w {pt(elemento['x1'])} "
+                        f"{_numero(alto - float(elemento['y1']) * MM_A_PUNTOS)} m {pt(elemento['x2'])} "
+                        f"{_numero(alto - float(elemento['y2']) * MM_A_PUNTOS)} l S\n"
+                    ).encode("ascii"))
+                elif tipo == "rectangulo":
+                    operador = "f" if elemento.get("relleno") else "S"
+                    partes.append((
+                        f"{pt(elemento.get('grosor', 0.3))} w {pt(elemento['x'])} "
+                        f"{_numero(alto - (float(elemento['y']) + float(elemento['alto'])) * MM_A_PUNTOS)} "
+                        f"{pt(elemento['ancho'])} {pt(elemento['alto'])} re {operador}\n"
+                    ).encode("ascii"))
+                elif tipo == "imagen":
+                    alias = alias_imagen[elemento["recurso"]]
+                    partes.append((
+                        f"q {pt(elemento['ancho'])} 0 0 {pt(elemento['alto'])} {pt(elemento['x'])} "
+                        f"{_numero(alto - (float(elemento['y']) + float(elemento['alto'])) * MM_A_PUNTOS)} "
+                        f"cm /{alias} Do Q\n"
+                    ).encode("ascii"))
+                else:
+                    raise ValueError(f"tipo '{tipo}' desconocido")
+            except (KeyError, TypeError, ValueError) as e:
+                raise Exception(f"El elemento {indice} de la plantilla no es válido: {e}")
+
+        # Unir las partes fijas consecutivas para no concatenarlas en cada etiqueta
+        compactas = []
+        for parte in partes:
+            if isinstance(parte, bytes) and compactas and isinstance(compactas[-1], bytes):
+                compactas[-1] += parte
+            else:
+                compactas.append(parte)
+        return compactas
+
+    def renderizar(self, datos):
+        """
+        Returns:
+            bytes: Documento PDF de una página
+        """
+        contenido = []
+        for parte in self._partes:
+            if isinstance(parte, bytes):
+                contenido.append(parte)
+                continue
+            plantilla, prefijo, sufijo = parte
+            try:
+                texto = plantilla.substitute(datos)
+            except KeyError as e:
+                raise Exception(f"Falta el campo {e} en los datos de la plantilla '{self.nombre}'.")
+            except ValueError as e:
+                raise Exception(f"La plantilla '{self.nombre}' no es válida: {e}")
+            contenido.append(prefijo + _escapar_texto_pdf(texto) + sufijo)
+        contenido = b"".join(contenido)
+
+        documento = bytearray(self._prefijo)
+        desplazamientos = self._desplazamientos + [len(documento)]
+        documento += (f"{self._numero_contenido} 0 obj\n<< /Length {len(contenido)} >>\nstream\n").encode("ascii")
+        documento += contenido + b"\nendstream\nendobj\n"
+
+        inicio_xref = len(documento)
+        documento += f"xref\n0 {len(desplazamientos) + 1}\n0000000000 65535 f \n".encode("ascii")
+        documento += "".join(f"{d:010d} 00000 n \n" for d in desplazamientos).encode("ascii")
+        documento += (f"trailer\n<< /Size {len(desplazamientos) + 1} /Root 1 0 R >>\n"
+                      f"startxref\n{inicio_xref}\n%%EOF\n").encode("ascii")
+        return bytes(documento)
+
+
+def compilar_plantilla(nombre, definicion):
+    """
+    Args:
+        nombre (str): Nombre de la plantilla
+        definicion (dict): Definición registrada
+
+    Returns:
+        PlantillaTxt | PlantillaPdf: Plantilla lista para renderizar
+
+    Raises:
+        Exception: Si la definición no es válida
+    """
+    if not isinstance(definicion, dict):
+        raise Exception("La definición de la plantilla no es válida: debe ser un objeto JSON.")
+    formato = str(definicion.get("formato", "")).lower().lstrip(".")
+    if formato == "txt":
+        return PlantillaTxt(nombre, definicion)
+    if formato == "pdf":
+        return PlantillaPdf(nombre, definicion)
+    raise Exception(f"El formato '{formato}' de la plantilla no es válido. Solo se admiten txt y pdf.")
+
+
+class RegistroPlantillas:
+    """Plantillas registradas en disco, con caché LRU de plantillas compiladas."""
+
+    def __init__(self, directorio=DIRECTORIO_PLANTILLAS, max_compiladas=MAX_PLANTILLAS_COMPILADAS):
+        self.directorio = directorio
+        self.max_compiladas = max_compiladas
+        self._compiladas = OrderedDict()
+        self._candado = threading.Lock()
+        self._contadores = {"aciertos": 0, "fallos": 0, "descartadas": 0, "renderizadas": 0}
+
+    def _ruta(self, nombre):
+        """
+        Returns:
+            str: Archivo donde se guarda la definición de la plantilla
+
+        Raises:
+            Exception: Si el nombre no es válido
+        """
+        if not isinstance(nombre, str) or not PATRON_NOMBRE.match(nombre):
+            raise Exception("El nombre de la plantilla no es válido: use letras, números, '-' o '_' (máximo 64).")
+        return os.path.join(self.directorio, f"{nombre}.json")
+
+    def _guardar_en_cache(self, nombre, plantilla):
+        with self._candado:
+            self._compiladas[nombre] = plantilla
+            self._compiladas.move_to_end(nombre)
+            while len(self._compiladas) > self.max_compiladas:
+                self._compiladas.popitem(last=False)
+                self._contadores["descartadas"] += 1
+
+    def registrar(self, nombre, definicion):
+        """
+        Valida, compila y guarda una plantilla (reemplaza la anterior con el mismo nombre).
+
+        Args:
+            nombre (str): Nombre de la plantilla
+            definicion (dict): Formato ('txt' o 'pdf') y contenido o elementos
+
+        Returns:
+            bool: True si ya existía una plantilla con ese nombre
+
+        Raises:
+            Exception: Si el nombre o la definición no son válidos
+        """
+        ruta = self._ruta(nombre)
+        plantilla = compilar_plantilla(nombre, definicion)
+
+        os.makedirs(self.directorio, exist_ok=True)
+        existia = os.path.exists(ruta)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(definicion, f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+        self._guardar_en_cache(nombre, plantilla)
+        print(f"Plantilla '{nombre}' registrada ({plantilla.extension}).")
+        return existia
+
+    def obtener(self, nombre):
+        """
+        Returns:
+            PlantillaTxt | PlantillaPdf: Plantilla compilada
+
+        Raises:
+            Exception: Si la plantilla no existe
+        """
+        with self._candado:
+            plantilla = self._compiladas.get(nombre)
+            if plantilla is not None:
+                self._compiladas.move_to_end(nombre)
+                self._contadores["aciertos"] += 1
+                return plantilla
+            self._contadores["fallos"] += 1
+
+        ruta = self._ruta(nombre)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                definicion = json.load(f)
+        except FileNotFoundError:
+            raise Exception(f"La plantilla '{nombre}' no existe.")
+
+        plantilla = compilar_plantilla(nombre, definicion)
+        self._guardar_en_cache(nombre, plantilla)
+        return plantilla
+
+    def eliminar(self, nombre):
+        """
+        Returns:
+            bool: True si la plantilla existía
+        """
+        ruta = self._ruta(nombre)
+        with self._candado:
+            self._compiladas.pop(nombre, None)
+        try:
+            os.remove(ruta)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def listar(self):
+        """
+        Returns:
+            list: Nombres de las plantillas registradas
+        """
+        try:
+            archivos = os.listdir(self.directorio)
+        except FileNotFoundError:
+            return []
+        return sorted(archivo[:-5] for archivo in archivos if archivo.endswith(".json"))
+
+    def renderizar(self, nombre, datos):
+        """
+        Genera una etiqueta a partir de una plantilla.
+
+        Args:
+            nombre (str): Nombre de la plantilla
+            datos (dict): Valores de los campos ${campo}
+
+        Returns:
+            tuple: (contenido generado, extensión '.txt' o '.pdf')
+        """
+        plantilla = self.obtener(nombre)
+        contenido = plantilla.renderizar(datos)
+        with self._candado:
+            self._contadores["renderizadas"] += 1
+        return contenido, plantilla.extension
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Aciertos y fallos de la caché, descartes, etiquetas generadas y plantillas compiladas
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+            estadisticas["compiladas"] = len(self._compiladas)
+        return estadisticas
+
+
+# Instancia compartida por toda la aplicación
+registro_plantillas = RegistroPlantillas()
@@ -5,280 +5,321 @@ Servicios de impresión.
 Contiene toda la lógica relacionada con la impresión de archivos.
 """
 
+import hashlib
 import os
-import subprocess
-import tempfile
 import threading
-import time
 import uuid
 
-#Libreria Externas
-import win32api
-import wmi
-import pythoncom
-
-from config import (
-    NOMBRE_IMPRESORA, 
-    RUTAS_SUMATRA, 
-    TIMEOUT_POWERSHELL, 
-    TIMEOUT_SUMATRA, 
-    TIMEOUT_LIMPIEZA
-)
+from config import TIMEOUT_LIMPIEZA, TAMANO_BLOQUE_ESCRITURA
+from .backends import crear_backend
+from .circuitos import circuitos_impresion
+from .inventario import CacheInventario
+from .limpieza import PREFIJO_TEMPORAL, directorio_temporal, limpiador_temporales
+from .metricas import DURACION_ETAPA, ACTIVACIONES_RESPALDO
+from .perfilado import etapa
 
+# Método principal de impresión de cada extensión (el respaldo es común a todas)
+METODOS_PRINCIPALES = {'.txt': 'powershell', '.pdf': 'sumatra'}
 
 class PrintService:
     """Servicio encargado de manejar todas las operaciones de impresión."""
     
+    # Backend de impresión activo (se crea en el primer uso)
+    _backend = None
+    _candado_backend = threading.Lock()
+    
+    # Caché del inventario de impresoras (se crea en el primer uso)
+    _inventario = None
+    
+    @staticmethod
+    def generar_ruta_temporal(extension):
+        """
+        Genera una ruta única en el directorio temporal de esta instancia.
+        
+        Args:
+            extension (str): Extensión del archivo (ej. '.pdf')
+            
+        Returns:
+            str: Ruta del archivo temporal (todavía no creado)
+        """
+        return os.path.join(
+            directorio_temporal(),
+            f"{PREFIJO_TEMPORAL}{uuid.uuid4().hex}{extension.lower()}"
+        )
+    
     @staticmethod
     def guardar_archivo_temporal(archivo):
         """
-        Guarda el archivo recibido en el directorio temporal del sistema.
+        Guarda el archivo recibido en el directorio temporal del sistema,
+        calculando el hash de su contenido mientras se escribe.
         
         Args:
             archivo: Archivo recibido de la petición Flask
             
         Returns:
-            str: Ruta del archivo temporal guardado
+            tuple: (ruta del archivo temporal guardado, hash SHA-256 del contenido en hexadecimal)
         """
-        directorio_temporal = tempfile.gettempdir()
-        nombre_base, extension = os.path.splitext(archivo.filename)
-        extension = extension.lower()
+        # Recibido con ArchivoEntrante: ya se validó y se escribió en disco mientras llegaba
+        reclamar = getattr(archivo.stream, "reclamar", None)
+        if reclamar is not None:
+            return reclamar()
         
-        nombre_archivo_temporal = os.path.join(
-            directorio_temporal, 
-            f"etiqueta_{uuid.uuid4().hex}{extension}"
-        )
+        nombre_base, extension = os.path.splitext(archivo.filename)
+        nombre_archivo_temporal = PrintService.generar_ruta_temporal(extension)
         
-        archivo.save(nombre_archivo_temporal)
+        hash_contenido = hashlib.sha256()
+        with DURACION_ETAPA.medir(etapa="guardar"), etapa("guardar"), open(nombre_archivo_temporal, "wb") as destino:
+            while True:
+                bloque = archivo.stream.read(TAMANO_BLOQUE_ESCRITURA)
+                if not bloque:
+                    break
+                hash_contenido.update(bloque)
+                destino.write(bloque)
         print(f"Archivo '{archivo.filename}' guardado temporalmente en: {nombre_archivo_temporal}")
         
-        return nombre_archivo_temporal
+        return nombre_archivo_temporal, hash_contenido.hexdigest()
     
     @staticmethod
-    def imprimir_txt(ruta_archivo):
+    def guardar_contenido_temporal(contenido, extension):
         """
-        Imprime un archivo de texto plano usando PowerShell.
+        Guarda en el directorio temporal un documento generado por el middleware
+        (por ejemplo, una etiqueta a partir de una plantilla).
         
         Args:
-            ruta_archivo (str): Ruta del archivo a imprimir
+            contenido (bytes): Documento a guardar
+            extension (str): Extensión del archivo (ej. '.pdf', '.txt')
             
-        Raises:
-            Exception: Si hay error en la impresión
+        Returns:
+            tuple: (ruta del archivo temporal guardado, hash SHA-256 del contenido en hexadecimal)
         """
-        print("Intentando imprimir archivo TXT directamente...")
-        comando_ps = f'Get-Content "{ruta_archivo}" | Out-Printer -Name "{NOMBRE_IMPRESORA}"'
+        nombre_archivo_temporal = PrintService.generar_ruta_temporal(extension)
+        with DURACION_ETAPA.medir(etapa="guardar"), etapa("guardar"), open(nombre_archivo_temporal, "wb") as destino:
+            destino.write(contenido)
         
-        resultado = subprocess.run(
-            ["powershell", "-Command", comando_ps],
-            capture_output=True, 
-            text=True, 
-            timeout=TIMEOUT_POWERSHELL, 
-            check=False
-        )
+        return nombre_archivo_temporal, hashlib.sha256(contenido).hexdigest()
+    
+    @classmethod
+    def obtener_backend(cls):
+        """
+        Devuelve el backend de impresión en uso, creándolo en el primer acceso
+        según BACKEND_IMPRESION.
         
-        if resultado.returncode == 0:
-            print("Archivo TXT enviado directamente a la impresora.")
-        else:
-            mensaje_error = resultado.stderr.strip()
-            raise Exception(f"Error al imprimir con PowerShell: {mensaje_error}")
+        Returns:
+            BackendImpresion: Backend que ejecuta las impresiones
+        """
+        with cls._candado_backend:
+            if cls._backend is None:
+                cls._backend = crear_backend()
+                print(f"Backend de impresión: '{cls._backend.nombre}'")
+            return cls._backend
     
-    @staticmethod
-    def imprimir_pdf(ruta_archivo):
+    @classmethod
+    def usar_backend(cls, backend):
+        """
+        Reemplaza el backend de impresión (por ejemplo, por uno simulado en pruebas de carga).
+        
+        Args:
+            backend (BackendImpresion): Backend a utilizar
         """
-        Imprime un archivo PDF usando SumatraPDF.
+        with cls._candado_backend:
+            cls._backend = backend
+        # La salud de los métodos del backend anterior no aplica al nuevo
+        circuitos_impresion.reiniciar()
+    
+    @classmethod
+    def imprimir_txt(cls, ruta_archivo, impresora=None):
+        """
+        Imprime un archivo de texto plano con el backend configurado.
         
         Args:
             ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino (None para la predeterminada)
             
         Raises:
-            Exception: Si hay error en la impresión o no se encuentra SumatraPDF
+            Exception: Si hay error en la impresión
         """
-        print("Intentando imprimir PDF con SumatraPDF...")
-        
-        sumatra_encontrado = False
-        for ruta_sumatra in RUTAS_SUMATRA:
-            ruta_expandida = os.path.expanduser(ruta_sumatra)
-            if os.path.exists(ruta_expandida):
-                print(f"SumatraPDF encontrado en: {ruta_expandida}")
-                
-                resultado = subprocess.run([
-                    ruta_expandida,
-                    "-print-to", NOMBRE_IMPRESORA,
-                    "-silent",
-                    ruta_archivo
-                ], capture_output=True, text=True, timeout=TIMEOUT_SUMATRA, check=False)
-                
-                sumatra_encontrado = True
-                if resultado.returncode == 0:
-                    print("PDF enviado a la impresora usando SumatraPDF.")
-                else:
-                    print(f"Error con SumatraPDF: {resultado.stderr}")
-                    raise Exception("SumatraPDF falló al intentar imprimir.")
-                break
+        backend = cls.obtener_backend()
+        backend.imprimir_txt(ruta_archivo, impresora or backend.impresora_predeterminada())
+    
+    @classmethod
+    def imprimir_pdf(cls, ruta_archivo, impresora=None):
+        """
+        Imprime un archivo PDF con el backend configurado.
         
-        if not sumatra_encontrado:
-            raise Exception("SumatraPDF no encontrado en las rutas habituales. Por favor, instálalo.")
+        Args:
+            ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino (None para la predeterminada)
+            
+        Raises:
+            Exception: Si hay error en la impresión
+        """
+        backend = cls.obtener_backend()
+        backend.imprimir_pdf(ruta_archivo, impresora or backend.impresora_predeterminada())
     
-    @staticmethod
-    def imprimir_con_respaldo(ruta_archivo):
+    @classmethod
+    def imprimir_con_respaldo(cls, ruta_archivo, impresora=None):
         """
         Métodos de respaldo para impresión cuando fallan los métodos principales.
         
         Args:
             ruta_archivo (str): Ruta del archivo a imprimir
+            impresora (str): Nombre de la impresora de destino (None para la predeterminada)
         """
-        try:
-            print("Intentando método de respaldo con win32api...")
-            win32api.ShellExecute(0, "print", ruta_archivo, f'/d:"{NOMBRE_IMPRESORA}"', ".", 0)
-            print("Archivo enviado a impresión usando el método de respaldo win32api.")
-        except Exception as e2:
-            print(f"ERROR con win32api: {str(e2)}")
-            print("Último recurso: abriendo el archivo...")
-            os.startfile(ruta_archivo)
+        backend = cls.obtener_backend()
+        backend.imprimir_con_respaldo(ruta_archivo, impresora or backend.impresora_predeterminada())
     
     ###------------ Agregado Gabriel Lujan ---------------###
-    @staticmethod
-    def obtener_impresoras_activas():
+    @classmethod
+    def obtener_inventario(cls):
         """
-        Escanea el sistema en busca de impresoras instaladas y activas usando WMI.
+        Devuelve la caché del inventario de impresoras, creándola en el primer acceso.
+        
         Returns:
-            list: Una lista de nombres de impresoras que están listas para usar.
+            CacheInventario: Caché que consulta al backend configurado
         """
-        print("Escaneando impresoras activas en el sistema...")
-        try:
-            # 1. INICIALIZAR COM: Registra el hilo actual para que pueda usar WMI.
-            pythoncom.CoInitialize()
-
-            c = wmi.WMI()
-            impresoras_detalladas = []
+        with cls._candado_backend:
+            if cls._inventario is None:
+                cls._inventario = CacheInventario(lambda: cls.obtener_backend().listar_impresoras())
+            return cls._inventario
+    
+    @classmethod
+    def obtener_impresoras_activas(cls):
+        """
+        Obtiene las impresoras instaladas y activas del sistema.
+        El resultado proviene de la caché del inventario (ver CacheInventario).
         
-            for printer in c.Win32_Printer():
-                # Volvemos a poner el filtro original para obtener solo las activas
-                if printer.PrinterStatus == 3 or printer.PrinterStatus == 4:
-                    
-                    # --- INICIO DE LA NUEVA LÓGICA DE DETECCIÓN ---
-                    port_name = printer.PortName
-                    printer_type = "Desconocido"
-                    port = port_name
-                
-
-                # Creamos un diccionario (objeto) con todos los detalles
-                    printer_info = {
-                    "name": printer.Name,
-                    "port": port
-                }
-
-                # --- FIN DE LA NUEVA LÓGICA ---
-
-                print(f"Impresora activa encontrada: {printer_info}")
-                impresoras_detalladas.append(printer_info)
-
-            if not impresoras_detalladas:
-                print("ADVERTENCIA: No se encontraron impresoras en estado 'Activo' (Idle o Printing).")
-
-            return impresoras_detalladas
-            
-        # ESTA ES LA PARTE CORREGIDA: Ahora está correctamente indentado
-        except Exception as e:
-            print(f"ERROR al escanear impresoras con WMI: {e}")
-            return []
-        finally:
-            # 2. DESINICIALIZAR COM: Libera el hilo, sin importar si hubo éxito o error.
-            pythoncom.CoUninitialize()
-
-     # --- MÉTODO NUEVO PARA ESTABLECER LA IMPRESORA PREDETERMINADA ---
-    @staticmethod
-    def establecer_impresora_predeterminada(nombre_impresora):
+        Returns:
+            list: Diccionarios con el nombre ('name') y puerto ('port') de cada impresora.
         """
-        Establece una impresora específica como la predeterminada del sistema en Windows.
-
+        return cls.obtener_inventario().obtener()
+    
+    @classmethod
+    def establecer_impresora_predeterminada(cls, nombre_impresora):
+        """
+        Establece una impresora específica como la predeterminada del sistema.
+        Si el cambio se aplica, invalida la caché del inventario.
+        
         Args:
             nombre_impresora (str): El nombre exacto de la impresora a configurar.
-
+            
         Returns:
             bool: True si la operación fue exitosa, False si no se encontró la impresora.
         
         Raises:
-            Exception: Si ocurre un error durante la operación con WMI.
+            Exception: Si ocurre un error durante la operación.
         """
-        print(f"Intentando establecer '{nombre_impresora}' como predeterminada...")
-        try:
-            # Es necesario inicializar COM para este hilo, igual que antes.
-            pythoncom.CoInitialize()
-
-            c = wmi.WMI()
-            # Buscamos la impresora por su nombre exacto.
-            impresora = c.Win32_Printer(Name=nombre_impresora)
-
-            # La consulta devuelve una lista, verificamos si encontró algo.
-            if not impresora:
-                print(f"ERROR: No se encontró ninguna impresora con el nombre '{nombre_impresora}'.")
-                return False
-
-            # El método SetDefaultPrinter() hace todo el trabajo.
-            impresora[0].SetDefaultPrinter()
-            print(f"Impresora '{nombre_impresora}' establecida como predeterminada en Windows.")
-            return True
-
-        except Exception as e:
-            print(f"ERROR al intentar establecer la impresora predeterminada: {e}")
-            # relanzamos la excepción para que el endpoint la maneje
-            raise e
-        finally:
-            # Siempre liberamos el hilo al final.
-            pythoncom.CoUninitialize()
-
+        exito = cls.obtener_backend().establecer_predeterminada(nombre_impresora)
+        if exito:
+            cls.obtener_inventario().invalidar()
+        return exito
+    
     @staticmethod
-    def programar_limpieza(ruta_archivo):
+    def programar_limpieza(ruta_archivo, metodo=None):
         """
-        Programa la eliminación del archivo temporal en segundo plano.
+        Programa la eliminación del archivo temporal en el hilo de limpieza.
+        
+        Los métodos principales terminan de leer el archivo antes de devolver el
+        control, así que se elimina en cuanto termina el trabajo; el de respaldo
+        delega en otra aplicación, por lo que se espera TIMEOUT_LIMPIEZA segundos.
         
         Args:
             ruta_archivo (str): Ruta del archivo temporal a eliminar
+            metodo (str): Método(s) con que se imprimió, si se llegó a imprimir
+        """
+        demora = TIMEOUT_LIMPIEZA if metodo and "respaldo" in metodo else 0
+        with etapa("limpieza"):
+            limpiador_temporales.programar(ruta_archivo, demora)
+    
+    @classmethod
+    def ejecutar_impresion(cls, ruta_archivo, extension, impresora=None, al_usar_respaldo=None):
+        """
+        Envía a la impresora un archivo ya guardado en disco, usando el método
+        principal según la extensión y el de respaldo si este falla (o directamente
+        el de respaldo si el principal viene fallando; ver services/circuitos.py).
+        
+        Args:
+            ruta_archivo (str): Ruta del archivo temporal a imprimir
+            extension (str): Extensión del archivo (ej. '.pdf', '.txt')
+            impresora (str): Nombre de la impresora de destino (None para la predeterminada)
+            al_usar_respaldo (callable): Función a llamar antes de recurrir al método de respaldo
+            
+        Returns:
+            str: Método con el que se envió la impresión ('powershell', 'sumatra' o 'respaldo'),
+                o None si la extensión no tiene método asociado
         """
-        def limpiar_archivo():
-            time.sleep(TIMEOUT_LIMPIEZA)
+        # Determinar el método de impresión según la extensión
+        metodo = METODOS_PRINCIPALES.get(extension)
+        if metodo is None:
+            return None
+        
+        # Con el circuito abierto se evita esperar el timeout de un método que viene fallando
+        circuito = circuitos_impresion.obtener(metodo)
+        if circuito.permite():
             try:
-                os.remove(ruta_archivo)
-                print(f"Archivo temporal '{ruta_archivo}' eliminado correctamente.")
+                with DURACION_ETAPA.medir(etapa=metodo), etapa(metodo):
+                    if metodo == "powershell":
+                        cls.imprimir_txt(ruta_archivo, impresora)
+                    else:
+                        cls.imprimir_pdf(ruta_archivo, impresora)
+                circuito.registrar_exito()
+                return metodo
+            
             except Exception as e:
-                print(f"ADVERTENCIA: No se pudo eliminar el archivo temporal. Error: {e}")
+                print(f"ERROR en método principal: {str(e)}")
+                circuito.registrar_fallo(e)
+        else:
+            print(f"Método '{metodo}' en falla: se usa directamente el método de respaldo.")
         
-        threading.Thread(target=limpiar_archivo, daemon=True).start()
+        if al_usar_respaldo is not None:
+            al_usar_respaldo()
+        ACTIVACIONES_RESPALDO.inc(extension=extension)
+        with DURACION_ETAPA.medir(etapa="respaldo"), etapa("respaldo"):
+            cls.imprimir_con_respaldo(ruta_archivo, impresora)
+        return "respaldo"
     
     @classmethod
-    def procesar_impresion(cls, archivo):
+    async def ejecutar_impresion_async(cls, ruta_archivo, extension, impresora=None, al_usar_respaldo=None):
         """
-        Método principal que orquesta todo el proceso de impresión.
+        Versión asíncrona de ejecutar_impresion, para la aplicación ASGI: los métodos
+        del backend se esperan con asyncio en lugar de bloquear un hilo.
         
         Args:
-            archivo: Archivo recibido de la petición Flask
+            ruta_archivo (str): Ruta del archivo temporal a imprimir
+            extension (str): Extensión del archivo (ej. '.pdf', '.txt')
+            impresora (str): Nombre de la impresora de destino (None para la predeterminada)
+            al_usar_respaldo (callable): Función a llamar antes de recurrir al método de respaldo
             
         Returns:
-            bool: True si la impresión fue exitosa
-            
-        Raises:
-            Exception: Si hay errores en el proceso
+            str: Método con el que se envió la impresión ('powershell', 'sumatra' o 'respaldo'),
+                o None si la extensión no tiene método asociado
         """
-        # Guardar archivo temporal
-        ruta_archivo = cls.guardar_archivo_temporal(archivo)
+        backend = cls.obtener_backend()
+        impresora = impresora or backend.impresora_predeterminada()
         
-        try:
-            # Determinar el método de impresión según la extensión
-            _, extension = os.path.splitext(archivo.filename)
-            extension = extension.lower()
-            
-            if extension == '.txt':
-                cls.imprimir_txt(ruta_archivo)
-            elif extension == '.pdf':
-                cls.imprimir_pdf(ruta_archivo)
-            
-        except Exception as e:
-            print(f"ERROR en método principal: {str(e)}")
-            cls.imprimir_con_respaldo(ruta_archivo)
+        metodo = METODOS_PRINCIPALES.get(extension)
+        if metodo is None:
+            return None
         
-        finally:
-            # Programar limpieza del archivo temporal
-            cls.programar_limpieza(ruta_archivo)
+        circuito = circuitos_impresion.obtener(metodo)
+        if circuito.permite():
+            try:
+                with DURACION_ETAPA.medir(etapa=metodo), etapa(metodo):
+                    if metodo == "powershell":
+                        await backend.imprimir_txt_async(ruta_archivo, impresora)
+                    else:
+                        await backend.imprimir_pdf_async(ruta_archivo, impresora)
+                circuito.registrar_exito()
+                return metodo
+            
+            except Exception as e:
+                print(f"ERROR en método principal: {str(e)}")
+                circuito.registrar_fallo(e)
+        else:
+            print(f"Método '{metodo}' en falla: se usa directamente el método de respaldo.")
         
-        return True
+        if al_usar_respaldo is not None:
+            al_usar_respaldo()
+        ACTIVACIONES_RESPALDO.inc(extension=extension)
+        with DURACION_ETAPA.medir(etapa="respaldo"), etapa("respaldo"):
+            await backend.imprimir_con_respaldo_async(ruta_archivo, impresora)
+        return "respaldo"
@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sesiones de subida por partes.
+Un archivo grande se envía en varias peticiones PUT con rangos de bytes: cada
+parte se verifica con su SHA-256 y se agrega directamente al archivo temporal,
+sin reunir el archivo en memoria. Si la conexión se corta, el cliente consulta
+cuántos bytes se confirmaron y continúa desde ahí. Las sesiones sin actividad
+durante TTL_SESION_SUBIDA se descartan junto con su archivo.
+"""
+
+import hashlib
+import os
+import string
+import threading
+import time
+import uuid
+
+from config import (
+    BYTES_FIRMA,
+    EXTENSIONES_SOPORTADAS,
+    MAX_SESIONES_SUBIDA,
+    MAX_TAMANO_ARCHIVO,
+    MAX_TAMANO_PARTE,
+    PRIORIDAD_PREDETERMINADA,
+    TAMANO_BLOQUE_ESCRITURA,
+    TTL_SESION_SUBIDA
+)
+from utils import ValidationUtils
+from .admision import SaturacionServicio
+from .limpieza import limpiador_temporales
+from .metricas import registro_metricas
+from .print_service import PrintService
+
+
+class SesionSubida:
+    """Archivo que se recibe por partes y el destino del trabajo que se creará con él."""
+
+    def __init__(self, nombre_archivo, tamano, cliente, destino=None,
+                 prioridad=PRIORIDAD_PREDETERMINADA, sha256=None):
+        self.id = uuid.uuid4().hex
+        self.nombre_archivo = nombre_archivo
+        self.extension = os.path.splitext(nombre_archivo)[1].lower()
+        self.tamano = tamano
+        self.cliente = cliente
+        self.destino = destino
+        self.prioridad = prioridad
+        self.sha256 = sha256
+        self.ruta = PrintService.generar_ruta_temporal(self.extension)
+        self.recibido = 0
+        self.codificacion = None
+        self.creada = time.time()
+        self.ultima_actividad = time.monotonic()
+        # Hash de los bytes confirmados: las partes llegan en orden, así que se calcula de a poco
+        self._hash = hashlib.sha256()
+        # Una sola parte a la vez por sesión
+        self._candado = threading.Lock()
+
+    @property
+    def completa(self):
+        return self.recibido == self.tamano
+
+    def a_dict(self, ttl=TTL_SESION_SUBIDA):
+        """
+        Returns:
+            dict: Estado de la sesión para las respuestas JSON
+        """
+        return {
+            "upload_id": self.id,
+            "nombre_original": self.nombre_archivo,
+            "tamano": self.tamano,
+            "recibido": self.recibido,
+            "completa": self.completa,
+            "impresora": self.destino,
+            "prioridad": self.prioridad,
+            "creada": self.creada,
+            "expira_en": max(round(self.ultima_actividad + ttl - time.monotonic()), 0),
+        }
+
+    def huella(self):
+        """
+        Returns:
+            str: Hash SHA-256 en hexadecimal de los bytes confirmados
+        """
+        return self._hash.hexdigest()
+
+    def escribir_parte(self, inicio, fin, flujo, sha256_parte):
+        """
+        Recibe los bytes [inicio, fin] y los agrega al archivo temporal. Si la parte
+        llega incompleta o su hash no coincide, el archivo vuelve al último byte
+        confirmado. Los bytes que ya se habían confirmado (una parte reenviada tras
+        un corte) se verifican pero no se vuelven a escribir.
+
+        Args:
+            inicio (int): Primer byte de la parte
+            fin (int): Último byte de la parte (inclusive)
+            flujo: Cuerpo de la petición, con método read()
+            sha256_parte (str): Hash SHA-256 de la parte en hexadecimal
+
+        Returns:
+            int: Bytes nuevos agregados al archivo
+
+        Raises:
+            Exception: Si la parte no continúa lo recibido, llega incompleta o no coincide con su hash
+        """
+        if inicio > self.recibido:
+            raise Exception(
+                f"La parte empieza en el byte {inicio} pero se esperaba el byte {self.recibido} "
+                f"de la sesión '{self.id}'."
+            )
+
+        esperado = fin - inicio + 1
+        hash_parte = hashlib.sha256()
+        hash_archivo = self._hash.copy()
+        posicion = inicio
+        with open(self.ruta, "r+b") as archivo:
+            archivo.seek(self.recibido)
+            while posicion <= fin:
+                bloque = flujo.read(min(TAMANO_BLOQUE_ESCRITURA, fin + 1 - posicion))
+                if not bloque:
+                    break
+                hash_parte.update(bloque)
+                nuevos = bloque[max(self.recibido - posicion, 0):]
+                if nuevos:
+                    hash_archivo.update(nuevos)
+                    archivo.write(nuevos)
+                posicion += len(bloque)
+
+            recibidos = posicion - inicio
+            if recibidos != esperado or hash_parte.hexdigest() != sha256_parte.lower():
+                archivo.truncate(self.recibido)
+                if recibidos != esperado:
+                    raise Exception(f"La parte no es válida: llegó incompleta ({recibidos} de {esperado} bytes).")
+                raise Exception("La parte no es válida: su SHA-256 no coincide con el indicado.")
+
+        agregados = max(fin + 1 - self.recibido, 0)
+        if agregados:
+            anterior = self.recibido
+            self.recibido = fin + 1
+            self._hash = hash_archivo
+            # La firma se valida en cuanto se reciben sus bytes, sin esperar al final
+            if anterior < min(BYTES_FIRMA, self.tamano) <= self.recibido:
+                with open(self.ruta, "rb") as archivo:
+                    self.codificacion = ValidationUtils.validar_firma(
+                        self.nombre_archivo, self.extension, archivo.read(BYTES_FIRMA)
+                    )
+        return agregados
+
+
+class RegistroSesionesSubida:
+    """Sesiones de subida abiertas, con vencimiento por inactividad."""
+
+    def __init__(self, ttl=TTL_SESION_SUBIDA, max_sesiones=MAX_SESIONES_SUBIDA):
+        self.ttl = ttl
+        self.max_sesiones = max_sesiones
+        self._sesiones = {}
+        self._candado = threading.Lock()
+        self._hilo = None
+        self._contadores = {
+            "creadas": 0, "completadas": 0, "canceladas": 0, "vencidas": 0,
+            "partes": 0, "partes_rechazadas": 0, "bytes_recibidos": 0
+        }
+
+    def iniciar(self):
+        """Arranca el hilo que descarta las sesiones vencidas, si todavía no está en ejecución."""
+        with self._candado:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._bucle, name="sesiones-subida", daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(min(self.ttl / 4, 60))
+            self.purgar_vencidas()
+
+    def crear(self, nombre_archivo, tamano, cliente, destino=None, prioridad=PRIORIDAD_PREDETERMINADA, sha256=None):
+        """
+        Abre una sesión y crea su archivo temporal vacío.
+
+        Args:
+            nombre_archivo (str): Nombre original del archivo
+            tamano (int): Bytes totales que se enviarán
+            cliente (str): Cliente que crea la sesión
+            destino (str): Impresora o grupo de destino del trabajo
+            prioridad (str): Prioridad del trabajo
+            sha256 (str): Hash SHA-256 del archivo completo, si el cliente lo conoce
+
+        Returns:
+            SesionSubida: Sesión creada
+
+        Raises:
+            Exception: Si la extensión no está soportada, el tamaño no es válido o hay demasiadas sesiones
+        """
+        extension = os.path.splitext(nombre_archivo or "")[1].lower()
+        if extension not in EXTENSIONES_SOPORTADAS:
+            raise Exception(f"Tipo de archivo no soportado: '{extension}'. Solo se admiten {', '.join(EXTENSIONES_SOPORTADAS)}.")
+        if isinstance(tamano, bool) or not isinstance(tamano, int) or tamano <= 0:
+            raise Exception("El tamaño de la subida no es válido: indica 'size' en bytes (mayor que cero).")
+        if tamano > MAX_TAMANO_ARCHIVO:
+            raise Exception(f"El archivo '{nombre_archivo}' excede el tamaño máximo de {MAX_TAMANO_ARCHIVO} bytes.")
+        if sha256 is not None and not es_sha256(sha256):
+            raise Exception("El SHA-256 del archivo no es válido: deben ser 64 caracteres hexadecimales.")
+
+        self.iniciar()
+        self.purgar_vencidas()
+        sesion = SesionSubida(nombre_archivo, tamano, cliente, destino, prioridad, sha256 and sha256.lower())
+        with self._candado:
+            if len(self._sesiones) >= self.max_sesiones:
+                raise SaturacionServicio(
+                    f"El servicio está saturado: hay {len(self._sesiones)} sesiones de subida abiertas "
+                    f"(máximo {self.max_sesiones}). Intenta nuevamente más tarde.",
+                    min(self.ttl, 60)
+                )
+            open(sesion.ruta, "wb").close()
+            self._sesiones[sesion.id] = sesion
+            self._contadores["creadas"] += 1
+        print(f"Sesión de subida {sesion.id} abierta para '{nombre_archivo}' ({tamano} bytes).")
+        return sesion
+
+    def obtener(self, upload_id):
+        """
+        Returns:
+            SesionSubida: Sesión vigente
+
+        Raises:
+            Exception: Si la sesión no existe o ya venció
+        """
+        with self._candado:
+            sesion = self._sesiones.get(upload_id)
+        if sesion is None or self._vencida(sesion, time.monotonic()):
+            raise Exception(f"No existe la sesión de subida '{upload_id}' o ya venció.")
+        return sesion
+
+    def recibir_parte(self, upload_id, inicio, fin, total, flujo, sha256_parte):
+        """
+        Agrega una parte al archivo de la sesión.
+
+        Args:
+            upload_id (str): Identificador de la sesión
+            inicio (int): Primer byte de la parte (cabecera Content-Range)
+            fin (int): Último byte de la parte, inclusive
+            total (int): Tamaño total indicado en Content-Range
+            flujo: Cuerpo de la petición
+            sha256_parte (str): Hash SHA-256 de la parte en hexadecimal
+
+        Returns:
+            SesionSubida: Sesión actualizada
+
+        Raises:
+            Exception: Si la sesión no existe, el rango o el hash no son válidos o ya se recibe otra parte
+        """
+        sesion = self.obtener(upload_id)
+        if total != sesion.tamano or inicio > fin or fin >= sesion.tamano:
+            raise Exception(f"El rango 'bytes {inicio}-{fin}/{total}' no es válido para un archivo de {sesion.tamano} bytes.")
+        if fin - inicio + 1 > MAX_TAMANO_PARTE:
+            raise Exception(f"La parte excede el tamaño máximo de {MAX_TAMANO_PARTE} bytes.")
+        if not es_sha256(sha256_parte):
+            raise Exception("El SHA-256 de la parte no es válido: deben ser 64 caracteres hexadecimales.")
+
+        if not sesion._candado.acquire(blocking=False):
+            raise Exception(f"La sesión '{upload_id}' ya está recibiendo otra parte.")
+        try:
+            sesion.ultima_actividad = time.monotonic()
+            try:
+                agregados = sesion.escribir_parte(inicio, fin, flujo, sha256_parte)
+            except Exception as e:
+                with self._candado:
+                    self._contadores["partes_rechazadas"] += 1
+                if "no soportado" in str(e).lower():
+                    # El contenido no corresponde a la extensión: la sesión no puede completarse
+                    self._descartar(sesion, "canceladas")
+                raise
+            sesion.ultima_actividad = time.monotonic()
+        finally:
+            sesion._candado.release()
+
+        with self._candado:
+            self._contadores["partes"] += 1
+            self._contadores["bytes_recibidos"] += agregados
+        return sesion
+
+    def retirar(self, upload_id, sha256=None, confirmar=True):
+        """
+        Cierra una sesión completa y entrega su archivo al llamador, que pasa a ser
+        responsable de eliminarlo.
+
+        Con confirmar=False la sesión queda reservada (no recibe partes ni vence)
+        hasta que el llamador la confirme con confirmar() o la devuelva con
+        devolver(); así, si no se puede encolar el trabajo, el cliente reintenta
+        el cierre sin volver a subir el archivo.
+
+        Args:
+            upload_id (str): Identificador de la sesión
+            sha256 (str): Hash SHA-256 esperado del archivo completo, si no se indicó al crearla
+            confirmar (bool): Cerrar la sesión en el acto
+
+        Returns:
+            SesionSubida: Sesión retirada, con el archivo temporal completo en `ruta`
+
+        Raises:
+            Exception: Si la sesión no existe, está incompleta o el archivo no coincide con su hash
+        """
+        sesion = self.obtener(upload_id)
+        if not sesion._candado.acquire(blocking=False):
+            raise Exception(f"La sesión '{upload_id}' ya está recibiendo otra parte.")
+        try:
+            if not sesion.completa:
+                raise Exception(
+                    f"La subida está incompleta: se recibieron {sesion.recibido} de {sesion.tamano} bytes."
+                )
+            esperado = (sha256 or sesion.sha256 or "").lower()
+            if esperado and esperado != sesion.huella():
+                self._descartar(sesion, "canceladas")
+                raise Exception("El archivo no es válido: su SHA-256 no coincide con el indicado. Vuelve a subirlo.")
+            with self._candado:
+                if upload_id not in self._sesiones:
+                    raise Exception(f"No existe la sesión de subida '{upload_id}' o ya venció.")
+        except Exception:
+            sesion._candado.release()
+            raise
+
+        if confirmar:
+            self.confirmar(sesion)
+        return sesion
+
+    def confirmar(self, sesion):
+        """
+        Cierra una sesión reservada con retirar(..., confirmar=False). El archivo
+        queda en manos del llamador.
+
+        Args:
+            sesion (SesionSubida): Sesión retirada
+        """
+        with self._candado:
+            if self._sesiones.pop(sesion.id, None) is not None:
+                self._contadores["completadas"] += 1
+        sesion._candado.release()
+        print(f"Archivo '{sesion.nombre_archivo}' recibido por partes en: {sesion.ruta} "
+              f"({sesion.tamano} bytes, codificación: {sesion.codificacion or '-'})")
+
+    def devolver(self, sesion):
+        """
+        Libera una sesión reservada con retirar(..., confirmar=False) sin cerrarla:
+        conserva su archivo y vuelve a contar el tiempo de inactividad.
+
+        Args:
+            sesion (SesionSubida): Sesión retirada
+        """
+        sesion.ultima_actividad = time.monotonic()
+        sesion._candado.release()
+
+    def cancelar(self, upload_id):
+        """
+        Descarta una sesión y su archivo.
+
+        Raises:
+            Exception: Si la sesión no existe o está recibiendo una parte
+        """
+        sesion = self.obtener(upload_id)
+        if not sesion._candado.acquire(blocking=False):
+            raise Exception(f"La sesión '{upload_id}' ya está recibiendo otra parte.")
+        try:
+            self._descartar(sesion, "canceladas")
+        finally:
+            sesion._candado.release()
+
+    def purgar_vencidas(self):
+        """
+        Descarta las sesiones sin actividad durante más de `ttl` segundos.
+
+        Returns:
+            int: Sesiones descartadas
+        """
+        ahora = time.monotonic()
+        with self._candado:
+            vencidas = [sesion for sesion in self._sesiones.values() if self._vencida(sesion, ahora)]
+        descartadas = 0
+        for sesion in vencidas:
+            # Una sesión que está recibiendo una parte no se descarta
+            if sesion._candado.acquire(blocking=False):
+                try:
+                    descartadas += self._descartar(sesion, "vencidas")
+                finally:
+                    sesion._candado.release()
+        if descartadas:
+            print(f"Se descartaron {descartadas} sesión(es) de subida vencidas.")
+        return descartadas
+
+    def _vencida(self, sesion, ahora):
+        return sesion.ultima_actividad + self.ttl < ahora and not sesion._candado.locked()
+
+    def _descartar(self, sesion, motivo):
+        with self._candado:
+            if self._sesiones.pop(sesion.id, None) is None:
+                return False
+            self._contadores[motivo] += 1
+        limpiador_temporales.programar(sesion.ruta)
+        return True
+
+    def abiertas(self):
+        """
+        Returns:
+            int: Sesiones de subida abiertas
+        """
+        with self._candado:
+            return len(self._sesiones)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Sesiones abiertas, creadas, completadas, canceladas y vencidas, y partes recibidas
+        """
+        with self._candado:
+            estadisticas = dict(self._contadores)
+            estadisticas["abiertas"] = len(self._sesiones)
+        return estadisticas
+
+
+def es_sha256(valor):
+    """
+    Returns:
+        bool: True si el valor es un hash SHA-256 en hexadecimal
+    """
+    return isinstance(valor, str) and len(valor) == 64 and all(c in string.hexdigits for c in valor)
+
+
+# Instancia compartida por toda la aplicación
+sesiones_subida = RegistroSesionesSubida()
+
+registro_metricas.medidor(
+    "middleware_subidas_sesiones",
+    "Sesiones de subida por partes abiertas.",
+    (),
+    lambda: [((), sesiones_subida.abiertas())]
+)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""
+Recepción de archivos subidos.
+Los archivos de un formulario multipart se validan mientras llegan (firma del
+contenido y tamaño máximo) y se escriben directamente en su archivo temporal,
+sin pasar por una copia intermedia en memoria o en otro archivo.
+"""
+
+import hashlib
+import io
+import os
+import time
+
+from flask import Request
+
+from config import BYTES_FIRMA, EXTENSIONES_SOPORTADAS, MAX_TAMANO_ARCHIVO, MAX_TAMANO_PETICION
+from utils import ValidationUtils
+from .limpieza import limpiador_temporales
+from .metricas import DURACION_ETAPA
+from .perfilado import registrar_etapa
+from .print_service import PrintService
+
+
+# Extensiones que se aceptan en una subida (los ZIP solo se usan en /print-batch)
+EXTENSIONES_RECIBIDAS = EXTENSIONES_SOPORTADAS + ['.zip']
+
+
+class ArchivoEntrante:
+    """
+    Destino de un archivo subido. Retiene en memoria solo los primeros
+    BYTES_FIRMA bytes; si la firma es válida crea el archivo temporal y escribe
+    el resto a medida que llega.
+    """
+
+    def __init__(self, nombre_archivo, tamano_declarado=None):
+        """
+        Args:
+            nombre_archivo (str): Nombre del archivo en el formulario
+            tamano_declarado (int): Tamaño indicado por la parte multipart, si lo hay
+
+        Raises:
+            Exception: Si la extensión no está soportada o el tamaño declarado excede el máximo
+        """
+        self.nombre_archivo = nombre_archivo
+        self.extension = os.path.splitext(nombre_archivo)[1].lower()
+        if self.extension not in EXTENSIONES_RECIBIDAS:
+            raise Exception(f"Tipo de archivo no soportado: '{self.extension}'. Solo se admiten {', '.join(EXTENSIONES_RECIBIDAS)}.")
+
+        # Un ZIP de lote agrupa varios documentos: lo limita el tamaño de la petición
+        self.max_tamano = MAX_TAMANO_PETICION if self.extension == '.zip' else MAX_TAMANO_ARCHIVO
+        if tamano_declarado and tamano_declarado > self.max_tamano:
+            raise Exception(f"El archivo '{nombre_archivo}' excede el tamaño máximo de {self.max_tamano} bytes.")
+
+        self.ruta = None
+        self.tamano = 0
+        self.codificacion = None
+        self.reclamado = False
+        self._inicio = bytearray()
+        self._archivo = None
+        self._hash = hashlib.sha256()
+        self._duracion_escritura = 0.0
+
+    def write(self, datos):
+        """
+        Recibe un fragmento del archivo.
+
+        Raises:
+            Exception: Si se supera el tamaño máximo o la firma no corresponde a la extensión
+        """
+        self.tamano += len(datos)
+        if self.tamano > self.max_tamano:
+            self.descartar()
+            raise Exception(f"El archivo '{self.nombre_archivo}' excede el tamaño máximo de {self.max_tamano} bytes.")
+
+        self._hash.update(datos)
+        if self._archivo is None:
+            self._inicio += datos
+            if len(self._inicio) >= BYTES_FIRMA:
+                self._abrir()
+        else:
+            inicio = time.perf_counter()
+            self._archivo.write(datos)
+            self._duracion_escritura += time.perf_counter() - inicio
+        return len(datos)
+
+    def _abrir(self):
+        """Valida la firma con los bytes retenidos y los vuelca en el archivo temporal."""
+        self.codificacion = ValidationUtils.validar_firma(self.nombre_archivo, self.extension, bytes(self._inicio))
+
+        inicio = time.perf_counter()
+        self.ruta = PrintService.generar_ruta_temporal(self.extension)
+        self._archivo = open(self.ruta, "w+b")
+        self._archivo.write(self._inicio)
+        self._duracion_escritura += time.perf_counter() - inicio
+        self._inicio = None
+
+    def seek(self, posicion, desde=0):
+        # El parser vuelve al inicio al terminar la parte: es el momento de validar los archivos chicos
+        if self._archivo is None:
+            self._abrir()
+        return self._archivo.seek(posicion, desde)
+
+    def __getattr__(self, nombre):
+        # read, tell, readline, etc. se delegan al archivo temporal (ej. para leer un ZIP)
+        if nombre.startswith("_") or self.__dict__.get("_archivo") is None:
+            raise AttributeError(nombre)
+        return getattr(self._archivo, nombre)
+
+    def close(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+    def reclamar(self):
+        """
+        Entrega el archivo temporal al llamador, que pasa a ser responsable de eliminarlo.
+
+        Returns:
+            tuple: (ruta del archivo temporal, hash SHA-256 del contenido en hexadecimal)
+        """
+        if self._archivo is None:
+            self._abrir()
+        self._archivo.close()
+        self.reclamado = True
+        DURACION_ETAPA.observar(self._duracion_escritura, etapa="guardar")
+        registrar_etapa("guardar", self._duracion_escritura)
+        print(f"Archivo '{self.nombre_archivo}' recibido en: {self.ruta} ({self.tamano} bytes, codificación: {self.codificacion or '-'})")
+        return self.ruta, self._hash.hexdigest()
+
+    def descartar(self):
+        """Elimina el archivo temporal si nadie lo reclamó."""
+        if self.reclamado or self._archivo is None:
+            return
+        self._archivo.close()
+        limpiador_temporales.programar(self.ruta)
+        self._archivo = None
+        self.ruta = None
+
+
+class PeticionImpresion(Request):
+    """
+    Petición de Flask que recibe los archivos del formulario con ArchivoEntrante
+    y, al cerrarse, elimina los que no se usaron (petición rechazada o duplicada).
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename:
+            # Campo de archivo sin seleccionar: lo rechaza ValidationUtils.validar_archivo
+            return io.BytesIO()
+        entrante = ArchivoEntrante(filename, content_length)
+        self.__dict__.setdefault("_archivos_entrantes", []).append(entrante)
+        return entrante
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for entrante in self.__dict__.get("_archivos_entrantes", ()):
+                entrante.descartar()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""
+Arranque del servidor HTTP.
+En producción la aplicación se sirve con Waitress (servidor WSGI multihilo,
+compatible con Windows); el servidor de desarrollo de Flask con depurador y
+recarga automática solo se usa si se pide explícitamente.
+"""
+
+import signal
+
+from config import (
+    SERVIDOR_HILOS,
+    SERVIDOR_BACKLOG,
+    SERVIDOR_CONEXIONES_MAXIMAS,
+    SERVIDOR_KEEPALIVE,
+    MAX_TAMANO_PETICION,
+    TIMEOUT_DRENADO
+)
+from services import almacen_trabajos, cola_impresion, limpiador_temporales
+
+
+def _interrumpir(numero_senal, marco):
+    """Convierte las señales de terminación en KeyboardInterrupt para detener el servidor."""
+    # Solo la primera señal interrumpe; las repetidas no deben cortar el vaciado de la cola
+    signal.signal(numero_senal, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def servir_produccion(app, host, port):
+    """
+    Sirve la aplicación con Waitress hasta recibir CTRL+C o una señal de
+    terminación, y luego espera a que terminen los trabajos de impresión en curso.
+
+    Args:
+        app (Flask): Aplicación a servir
+        host (str): Dirección en la que escuchar
+        port (int): Puerto en el que escuchar
+    """
+    # Importación diferida: el modo de desarrollo no necesita Waitress
+    from waitress import create_server
+
+    servidor = create_server(
+        app,
+        host=host,
+        port=port,
+        threads=SERVIDOR_HILOS,
+        backlog=SERVIDOR_BACKLOG,
+        connection_limit=SERVIDOR_CONEXIONES_MAXIMAS,
+        channel_timeout=SERVIDOR_KEEPALIVE,
+        max_request_body_size=MAX_TAMANO_PETICION,
+        ident="middleware-impresion"
+    )
+
+    signal.signal(signal.SIGTERM, _interrumpir)
+    if hasattr(signal, "SIGBREAK"):
+        # CTRL+BREAK en la consola de Windows
+        signal.signal(signal.SIGBREAK, _interrumpir)
+
+    print(f"Servidor de producción (Waitress) con {SERVIDOR_HILOS} hilos.")
+    try:
+        # run() captura KeyboardInterrupt y cierra el servidor
+        servidor.run()
+    finally:
+        print("Servidor detenido. Esperando a que terminen los trabajos de impresión...")
+        cola_impresion.detener(TIMEOUT_DRENADO)
+        limpiador_temporales.ejecutar_pendientes()
+        almacen_trabajos.vaciar(TIMEOUT_DRENADO)
+
+
+def servir_desarrollo(app, host, port):
+    """
+    Sirve la aplicación con el servidor de desarrollo de Flask, con depurador y
+    recarga automática. No usar en los equipos de impresión.
+
+    Args:
+        app (Flask): Aplicación a servir
+        host (str): Dirección en la que escuchar
+        port (int): Puerto en el que escuchar
+    """
+    print("ADVERTENCIA: Modo de depuración activo (servidor de desarrollo de Flask).")
+    app.run(host=host, port=port, debug=True)
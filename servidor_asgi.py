@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+"""
+Servicio de la aplicación como ASGI.
+El cuerpo de cada petición se recibe con asyncio, por lo que un cliente lento
+no ocupa un hilo mientras sube el archivo; la vista de Flask corre luego en un
+pool de hilos acotado y la respuesta se devuelve por partes. Los trabajos de
+impresión se atienden con tareas de asyncio en el mismo bucle de eventos, y
+SumatraPDF/PowerShell se lanzan como subprocesos de asyncio. GET /events se
+atiende directamente en el bucle, sin ocupar un hilo por cliente conectado.
+"""
+
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.datastructures import Headers
+
+from config import (
+    SERVIDOR_HILOS,
+    SERVIDOR_BACKLOG,
+    SERVIDOR_KEEPALIVE,
+    ASGI_CONEXIONES_MAXIMAS,
+    MAX_TAMANO_PETICION,
+    MAX_SUSCRIPTORES_EVENTOS_ASGI,
+    TIMEOUT_DRENADO
+)
+from services import (
+    SaturacionServicio,
+    almacen_trabajos,
+    cola_impresion,
+    control_admision,
+    difusor_eventos,
+    identificar_cliente,
+    limpiador_temporales
+)
+from services.eventos import flujo_eventos_async
+
+# Los cuerpos más grandes se reciben en un archivo temporal en lugar de en memoria
+MAX_CUERPO_EN_MEMORIA = 1024 * 1024
+
+
+def es_ruta_impresion(metodo, ruta):
+    """
+    Returns:
+        bool: True si la petición encola un trabajo (se aplica el control de admisión)
+    """
+    return metodo == "POST" and (
+        ruta in ("/print-pdf", "/print-batch") or (ruta.startswith("/templates/") and ruta.endswith("/print"))
+    )
+
+
+class AplicacionAsgi:
+    """Adapta la aplicación Flask (WSGI) al protocolo ASGI."""
+
+    def __init__(self, app_wsgi, hilos=SERVIDOR_HILOS):
+        """
+        Args:
+            app_wsgi (Flask): Aplicación con las rutas
+            hilos (int): Vistas de Flask que se ejecutan a la vez
+        """
+        self.app_wsgi = app_wsgi
+        self._hilos = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="asgi")
+        self._bucle = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+        elif scope["type"] == "http":
+            self._preparar()
+            if scope["path"] == "/events" and scope["method"] == "GET":
+                await self._atender_eventos(scope, receive, send)
+            else:
+                await self._atender_http(scope, receive, send)
+        else:
+            raise Exception(f"Tipo de conexión ASGI no soportado: '{scope['type']}'.")
+
+    def _preparar(self):
+        """
+        Pasa la cola de impresión a trabajadores de asyncio en el bucle del servidor
+        y reencola los trabajos que quedaron sin terminar en la ejecución anterior.
+        """
+        if self._bucle is None:
+            self._bucle = asyncio.get_running_loop()
+            cola_impresion.usar_bucle(self._bucle)
+            cola_impresion.reencolar_recuperados()
+
+    async def _ciclo_de_vida(self, receive, send):
+        """Atiende el arranque y la detención del servidor (protocolo lifespan)."""
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                self._preparar()
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                print("Servidor detenido. Esperando a que terminen los trabajos de impresión...")
+                await self._bucle.run_in_executor(None, cola_impresion.detener, TIMEOUT_DRENADO)
+                limpiador_temporales.ejecutar_pendientes()
+                almacen_trabajos.vaciar(TIMEOUT_DRENADO)
+                self._hilos.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _atender_http(self, scope, receive, send):
+        """Recibe el cuerpo completo sin bloquear y ejecuta la vista en el pool de hilos."""
+        cabeceras = dict(scope["headers"])
+        try:
+            declarado = int(cabeceras.get(b"content-length", 0))
+        except ValueError:
+            declarado = 0
+        if declarado > MAX_TAMANO_PETICION:
+            await self._responder_texto(send, 413, "Error: La petición excede el tamaño máximo permitido.")
+            return
+        if es_ruta_impresion(scope["method"], scope["path"]):
+            # Rechazar al cliente saturado antes de recibir el archivo
+            cliente = identificar_cliente(
+                Headers([(nombre.decode("latin-1"), valor.decode("latin-1")) for nombre, valor in scope["headers"]]),
+                (scope.get("client") or ("",))[0]
+            )
+            try:
+                control_admision.verificar(cliente)
+            except SaturacionServicio as e:
+                await self._responder_texto(send, 429, f"Error: {str(e)}",
+                                            [(b"retry-after", str(e.reintentar_en).encode())])
+                return
+
+        cuerpo = tempfile.SpooledTemporaryFile(max_size=MAX_CUERPO_EN_MEMORIA)
+        tamano = 0
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "http.disconnect":
+                cuerpo.close()
+                return
+            datos = mensaje.get("body", b"")
+            tamano += len(datos)
+            if tamano > MAX_TAMANO_PETICION:
+                cuerpo.close()
+                await self._responder_texto(send, 413, "Error: La petición excede el tamaño máximo permitido.")
+                return
+            cuerpo.write(datos)
+            if not mensaje.get("more_body", False):
+                break
+        cuerpo.seek(0)
+
+        entorno = self._entorno_wsgi(scope, cuerpo, tamano)
+        await self._bucle.run_in_executor(self._hilos, self._ejecutar_wsgi, entorno, send)
+
+    async def _atender_eventos(self, scope, receive, send):
+        """Misma respuesta que la ruta /events de Flask, esperando los eventos con asyncio."""
+        parametros = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        job_id = parametros.get("job_id", [None])[0]
+        impresora = (parametros.get("printer") or parametros.get("impresora") or [None])[0]
+        try:
+            suscripcion = difusor_eventos.suscribir(
+                job_id, impresora,
+                maximo=MAX_SUSCRIPTORES_EVENTOS_ASGI, bucle=self._bucle
+            )
+        except Exception as e:
+            await self._responder_texto(send, 503, f"Error: {str(e)}")
+            return
+
+        inicial = cola_impresion.estado_trabajo(job_id) if job_id else None
+        if job_id and inicial is None:
+            suscripcion.cancelar()
+            await self._responder_texto(send, 404, f"Error: No existe el trabajo '{job_id}'.")
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache")]
+        })
+        desconexion = asyncio.ensure_future(self._esperar_desconexion(receive))
+        flujo = flujo_eventos_async(suscripcion, inicial)
+        try:
+            async for bloque in flujo:
+                # El cliente que se fue se detecta, a más tardar, con el siguiente latido
+                if desconexion.done():
+                    return
+                await send({"type": "http.response.body", "body": bloque, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            desconexion.cancel()
+            await flujo.aclose()
+
+    @staticmethod
+    async def _esperar_desconexion(receive):
+        # Antes de la desconexión puede llegar el cuerpo (vacío) de la petición
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    def _entorno_wsgi(scope, cuerpo, tamano):
+        """
+        Returns:
+            dict: Entorno WSGI equivalente a la petición ASGI
+        """
+        servidor = scope.get("server") or ("localhost", 80)
+        cliente = scope.get("client")
+        entorno = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": str(servidor[0]),
+            "SERVER_PORT": str(servidor[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": cliente[0] if cliente else "",
+            "CONTENT_LENGTH": str(tamano),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": cuerpo,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for nombre, valor in scope["headers"]:
+            clave = nombre.decode("latin-1").upper().replace("-", "_")
+            valor = valor.decode("latin-1")
+            if clave == "CONTENT_LENGTH":
+                continue
+            if clave != "CONTENT_TYPE":
+                clave = f"HTTP_{clave}"
+            entorno[clave] = f"{entorno[clave]},{valor}" if clave in entorno else valor
+        return entorno
+
+    def _ejecutar_wsgi(self, entorno, send):
+        """
+        Ejecuta la aplicación Flask (en un hilo del pool) y envía la respuesta por
+        partes a medida que la aplicación la produce.
+        """
+        respuesta = {"enviada": False}
+
+        def enviar(mensaje):
+            asyncio.run_coroutine_threadsafe(send(mensaje), self._bucle).result()
+
+        def enviar_inicio():
+            if not respuesta["enviada"]:
+                respuesta["enviada"] = True
+                enviar({"type": "http.response.start", "status": respuesta["estado"], "headers": respuesta["cabeceras"]})
+
+        def escribir(datos):
+            enviar_inicio()
+            enviar({"type": "http.response.body", "body": datos, "more_body": True})
+
+        def start_response(estado, cabeceras, exc_info=None):
+            if exc_info and respuesta["enviada"]:
+                raise exc_info[1].with_traceback(exc_info[2])
+            respuesta["estado"] = int(estado.split(" ", 1)[0])
+            respuesta["cabeceras"] = [
+                (nombre.lower().encode("latin-1"), valor.encode("latin-1")) for nombre, valor in cabeceras
+            ]
+            return escribir
+
+        resultado = self.app_wsgi(entorno, start_response)
+        try:
+            for bloque in resultado:
+                if bloque:
+                    escribir(bloque)
+        finally:
+            if hasattr(resultado, "close"):
+                resultado.close()
+            entorno["wsgi.input"].close()
+
+        enviar_inicio()
+        enviar({"type": "http.response.body", "body": b"", "more_body": False})
+
+    @staticmethod
+    async def _responder_texto(send, codigo, texto, cabeceras=()):
+        cuerpo = texto.encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": codigo,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                        (b"content-length", str(len(cuerpo)).encode())] + list(cabeceras)
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
+
+
+def servir_asgi(app, host, port):
+    """
+    Sirve la aplicación ASGI con uvicorn hasta recibir CTRL+C o una señal de
+    terminación; al detenerse espera a que terminen los trabajos de impresión.
+
+    Args:
+        app (AplicacionAsgi): Aplicación a servir
+        host (str): Dirección en la que escuchar
+        port (int): Puerto en el que escuchar
+    """
+    # Dependencia opcional: solo la necesita el modo ASGI
+    try:
+        import uvicorn
+    except ImportError:
+        raise Exception("El modo ASGI necesita uvicorn. Instálalo con 'pip install uvicorn'.")
+
+    print(f"Servidor ASGI (uvicorn) con {SERVIDOR_HILOS} hilos para las vistas.")
+    uvicorn.run(
+        app,
+        host=host,
+        port=port,
+        lifespan="on",
+        backlog=SERVIDOR_BACKLOG,
+        limit_concurrency=ASGI_CONEXIONES_MAXIMAS,
+        timeout_keep_alive=SERVIDOR_KEEPALIVE
+    )
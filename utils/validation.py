@@ -5,10 +5,28 @@ Utilidades de validación.
 Contiene funciones para validar archivos y peticiones.
 """
 
+import codecs
 import os
 import platform
 
-from config import EXTENSIONES_SOPORTADAS
+from config import (
+    EXTENSIONES_SOPORTADAS,
+    BACKEND_IMPRESION,
+    MAX_DOCUMENTOS_LOTE,
+    PRIORIDADES,
+    PRIORIDAD_PREDETERMINADA
+)
+
+
+# Firmas de formatos binarios que no deben llegar a la impresora como texto plano
+FIRMAS_BINARIAS = (b"%PDF-", b"PK\x03\x04", b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"MZ")
+
+# Marcas de orden de bytes y la codificación que indican
+MARCAS_CODIFICACION = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
 
 
 class ValidationUtils:
@@ -17,15 +35,15 @@ class ValidationUtils:
     @staticmethod
     def validar_sistema_operativo():
         """
-        Valida que el sistema operativo sea Windows.
+        Valida que el sistema operativo sea Windows cuando se usa el backend de Windows.
         
         Returns:
-            bool: True si es Windows
+            bool: True si es Windows o si el backend no depende del sistema operativo
             
         Raises:
-            Exception: Si no es Windows
+            Exception: Si no es Windows y el backend lo requiere
         """
-        if platform.system() != "Windows":
+        if BACKEND_IMPRESION == "windows" and platform.system() != "Windows":
             raise Exception("Este middleware solo es compatible con Windows.")
         return True
     
@@ -60,6 +78,67 @@ class ValidationUtils:
         
         return True
     
+    @staticmethod
+    def validar_firma(nombre_archivo, extension, inicio):
+        """
+        Valida que los primeros bytes de un archivo correspondan a su extensión.
+        
+        Args:
+            nombre_archivo (str): Nombre del archivo, para los mensajes
+            extension (str): Extensión del archivo (ej. '.pdf', '.txt', '.zip')
+            inicio (bytes): Primeros bytes del contenido (hasta BYTES_FIRMA)
+            
+        Returns:
+            str: Codificación detectada si es texto plano, None en otro caso
+            
+        Raises:
+            Exception: Si el archivo está vacío o su contenido no corresponde a la extensión
+        """
+        if not inicio:
+            raise Exception(f"El archivo '{nombre_archivo}' está vacío.")
+        
+        if extension == '.pdf':
+            # La especificación admite bytes previos a la cabecera dentro del primer kilobyte
+            if b"%PDF-" not in inicio[:1024]:
+                raise Exception(f"Contenido no soportado: '{nombre_archivo}' no es un PDF (falta la cabecera %PDF-).")
+            return None
+        
+        if extension == '.zip':
+            if not inicio.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+                raise Exception(f"Contenido no soportado: '{nombre_archivo}' no es un archivo ZIP.")
+            return None
+        
+        return ValidationUtils.detectar_codificacion(nombre_archivo, inicio)
+    
+    @staticmethod
+    def detectar_codificacion(nombre_archivo, inicio):
+        """
+        Detecta la codificación de un archivo de texto a partir de sus primeros bytes.
+        
+        Args:
+            nombre_archivo (str): Nombre del archivo, para los mensajes
+            inicio (bytes): Primeros bytes del contenido
+            
+        Returns:
+            str: 'utf-8-sig', 'utf-16', 'utf-8' o 'cp1252'
+            
+        Raises:
+            Exception: Si el contenido es binario
+        """
+        for marca, codificacion in MARCAS_CODIFICACION:
+            if inicio.startswith(marca):
+                return codificacion
+        
+        if inicio.startswith(FIRMAS_BINARIAS) or b"\x00" in inicio:
+            raise Exception(f"Contenido no soportado: '{nombre_archivo}' no es un archivo de texto.")
+        
+        # La muestra puede cortar un carácter multibyte al final: se decodifica sin cerrar
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(inicio, final=False)
+            return "utf-8"
+        except UnicodeDecodeError:
+            return "cp1252"
+    
     @staticmethod
     def validar_peticion(request):
         """
@@ -78,3 +157,58 @@ class ValidationUtils:
             raise Exception("La petición no contiene el campo 'file'.")
         
         return request.files['file']
+    
+    @staticmethod
+    def validar_peticion_lote(request):
+        """
+        Valida que la petición HTTP contenga los archivos de un lote.
+        Se aceptan varios archivos en el campo 'files' (o 'file'), o un único ZIP.
+        
+        Args:
+            request: Objeto request de Flask
+            
+        Returns:
+            list: Archivos de la petición, en el orden recibido
+            
+        Raises:
+            Exception: Si la petición no contiene archivos o excede el máximo del lote
+        """
+        archivos = request.files.getlist('files') + request.files.getlist('file')
+        archivos = [archivo for archivo in archivos if archivo.filename]
+        
+        if not archivos:
+            raise Exception("No se recibió ningún archivo. Envía los documentos en el campo 'files' o un ZIP.")
+        
+        if len(archivos) > MAX_DOCUMENTOS_LOTE:
+            raise Exception(f"El lote excede el máximo de {MAX_DOCUMENTOS_LOTE} documentos.")
+        
+        return archivos
+    
+    @staticmethod
+    def es_zip(archivo):
+        """
+        Args:
+            archivo: Archivo recibido de la petición Flask
+            
+        Returns:
+            bool: True si el archivo tiene extensión .zip
+        """
+        return os.path.splitext(archivo.filename)[1].lower() == '.zip'
+    
+    @staticmethod
+    def validar_prioridad(prioridad):
+        """
+        Args:
+            prioridad (str): Prioridad pedida por el cliente, o None
+            
+        Returns:
+            str: Prioridad del trabajo (PRIORIDAD_PREDETERMINADA si no se indicó)
+            
+        Raises:
+            Exception: Si no es una de PRIORIDADES
+        """
+        if not prioridad:
+            return PRIORIDAD_PREDETERMINADA
+        if prioridad not in PRIORIDADES:
+            raise Exception(f"La prioridad '{prioridad}' no es válida. Usa una de: {', '.join(PRIORIDADES)}.")
+        return prioridad